@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the sliced transfers of large objects (MB/s by number of parallel requests).
+
+It runs locally against a fake bucket that limits the throughput of each request, as a single connection to GCS is.
+Nothing is sent to Carol.
+
+    python examples/benchmark_sliced_transfer.py --size-mb 512 --connection-mbps 100
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from pycarol.utils.sliced_transfer import download_sliced, upload_composite
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    def _transfer(self, size):
+        time.sleep(size / self.bucket.bytes_per_sec)
+
+    def upload_from_filename(self, filename):
+        with open(filename, 'rb') as file:
+            self.upload_from_string(file.read())
+
+    def upload_from_string(self, data, if_generation_match=None, retry=None):
+        self._transfer(len(data))
+        self.bucket.objects[self.name] = bytes(data)
+
+    def compose(self, sources):
+        # server-side, no data is transferred.
+        self.bucket.objects[self.name] = b''.join(self.bucket.objects[s.name] for s in sources)
+
+    def download_to_filename(self, filename):
+        data = self.bucket.objects[self.name]
+        self._transfer(len(data))
+        with open(filename, 'wb') as file:
+            file.write(data)
+
+    def download_as_bytes(self, start, end, if_generation_match=None):
+        data = self.bucket.objects[self.name][start:end + 1]
+        self._transfer(len(data))
+        return data
+
+    def delete(self):
+        del self.bucket.objects[self.name]
+
+
+class FakeBucket:
+    def __init__(self, bytes_per_sec):
+        self.bytes_per_sec = bytes_per_sec
+        self.objects = {}
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+def run(size, workers, bytes_per_sec):
+    bucket = FakeBucket(bytes_per_sec)
+    blob = bucket.blob('model.bin')
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, 'model.bin')
+        with open(source, 'wb') as file:
+            file.write(os.urandom(size))
+
+        start = time.perf_counter()
+        if workers == 1:
+            blob.upload_from_filename(source)
+        else:
+            upload_composite(bucket, blob, source, workers=workers)
+        upload = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if workers == 1:
+            blob.download_to_filename(os.path.join(folder, 'copy.bin'))
+        else:
+            download_sliced(blob, os.path.join(folder, 'copy.bin'), size, workers=workers)
+        download = time.perf_counter() - start
+    return size / 1024 ** 2 / upload, size / 1024 ** 2 / download
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--connection-mbps', type=float, default=100, help='MB/s of each request.')
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'upload MB/s':>12} {'download MB/s':>14}")
+    for workers in args.workers:
+        upload, download = run(args.size_mb * 1024 ** 2, workers, args.connection_mbps * 1024 ** 2)
+        print(f'{workers:>7} {upload:>12,.1f} {download:>14,.1f}')
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the staging batches compression (records/sec by codec and level).
+
+It runs locally, nothing is sent to Carol.
+
+    python examples/benchmark_staging_compression.py --rows 200000 --workers 4
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from pycarol.utils.miscellaneous import stream_data
+
+
+def make_data(rows):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'branch': rng.choice(['north', 'south', 'east', 'west'], rows),
+        'value': rng.normal(size=rows),
+        'description': rng.choice(['lorem ipsum dolor sit amet', 'consectetur adipiscing elit'], rows),
+        'date': pd.date_range('2020-01-01', periods=rows, freq='min'),
+    })
+
+
+def run(data, codec, level, workers, step_size):
+    start = time.perf_counter()
+    size = 0
+    for payload, _ in stream_data(data, step_size=step_size, compress_gzip=True, codec=codec,
+                                  compresslevel=level, compress_workers=workers):
+        size += len(payload)
+    elapsed = time.perf_counter() - start
+    return len(data) / elapsed, size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--step-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--codecs', nargs='+', default=['gzip'])
+    args = parser.parse_args()
+
+    data = make_data(args.rows)
+    levels = {'gzip': [1, 3, 6, 9], 'zstd': [1, 3, 9, 19]}
+    print(f"{'codec':>6} {'level':>5} {'records/s':>12} {'MB':>8}")
+    for codec in args.codecs:
+        for level in levels[codec]:
+            records_sec, size = run(data, codec, level, args.workers, args.step_size)
+            print(f'{codec:>6} {level:>5} {records_sec:>12,.0f} {size / 1024 ** 2:>8.2f}')
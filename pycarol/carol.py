@@ -294,15 +294,18 @@ class Carol:
 
         __count = 0
         while True:
-            self.session = _retry_session(
+            # the session given is used even if another thread changed `self.session` meanwhile.
+            request_session = _retry_session(
                 retries=retries,
-                session=self.session,
+                session=session if session is not None else self.session,
                 backoff_factor=backoff_factor,
                 status_forcelist=status_forcelist,
                 method_whitelist=method_whitelist,
             )
+            if session is None:
+                self.session = request_session
 
-            response = self.session.request(
+            response = request_session.request(
                 method=method,
                 url=url,
                 data=data,
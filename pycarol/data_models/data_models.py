@@ -8,15 +8,16 @@ import asyncio
 from .data_models_fields import DataModelFields
 from .data_model_types import DataModelTypeIds
 
-from ..utils.importers import _import_dask, _import_pandas
+from ..utils.importers import _import_dask, _import_pandas, _import_pandas_iter, _drop_metadata, _from_pandas
 from ..verticals import Verticals
 from ..storage import Storage
 from ..query import delete_golden
 from ..connectors import Connectors
 from ..utils import async_helpers
-from ..utils.miscellaneous import stream_data
+from ..utils.miscellaneous import stream_data, compact_frame
 from .. import _CAROL_METADATA_GOLDEN, _NEEDED_FOR_MERGE, _REJECTED_DM_COLS, _CAROL_METADATA_UNTIE_GOLDEN
-from ..utils.miscellaneous import drop_duplicated_parquet, drop_duplicated_parquet_dask
+from ..utils.miscellaneous import drop_duplicated_parquet, drop_duplicated_parquet_dask, \
+    drop_duplicated_parquet_polars, import_polars
 from ..utils.deprecation_msgs import _deprecation_msgs
 from ..exceptions import CarolApiResponseException
 
@@ -107,7 +108,8 @@ class DataModel:
             return_dask_graph=False,
             columns=None, return_metadata=False, callback=None,
             max_hits=None, cds=True, max_workers=None, file_pattern=None,
-            return_callback_result=False
+            return_callback_result=False, filters=None, cache=False,
+            incremental=False, snapshot=None, compact=False
     ):
         """
         Fetch parquet from Golden.
@@ -118,8 +120,9 @@ class DataModel:
             merge_records: `bool`, default `True`
                 This will keep only the most recent record exported. Sometimes there are updates and/or deletions and
                 one should keep only the last records.
-            backend: ['dask','pandas'], default `dask`
-                if to use either dask or pandas to fetch the data
+            backend: ['dask','pandas','arrow','polars'], default `pandas`
+                if to use either dask or pandas to fetch the data. `arrow` returns a `pyarrow.Table` and `polars` a
+                polars DataFrame, without converting the data to pandas. Callbacks are only used with `pandas`.
             return_dask_graph: `bool`, default `false`
                 If to return the dask graph or the dataframe.
             columns: `list`, default `None`
@@ -140,18 +143,45 @@ class DataModel:
             return_callback_result `bool` default `False`
                 If a callback is used, it will return the result of the response of the callback. This will skip all the
                 operation to merge records and return selected columns.
+            filters: `list` or `pyarrow.compute.Expression`, default `None`
+                Row filters, e.g., `[('branch', '==', '01'), ('date', '>=', '2021-01-01')]`, or a list of these
+                lists for an OR of ANDs. Row groups whose statistics do not match are not downloaded. Filters are
+                applied before `merge_records`, so if the last version of a record does not match, an older version
+                that matches can be returned.
+            cache: `bool` or `pycarol.utils.file_cache.FileCache`, default `False`
+                Keep the downloaded files in a local cache, by bucket, name and generation, so the next fetches only
+                download new or changed files. `True` uses the default cache, of up to `PYCAROL_CDS_CACHE_SIZE` bytes
+                of disk. It is not used with `backend='dask'`.
+            incremental: `bool`, default `False`
+                Keep a local snapshot of the merged records in `snapshot` and, in the next calls, download only the
+                CDS files written after the last one merged into it. It is not available with `backend='dask'` and
+                always merges the records.
+            snapshot: `str`, default `None`
+                Path of the local parquet file used with `incremental=True`. A `<snapshot>.state.json` file keeps
+                the CDS files of the last second merged. Use a snapshot per data model/staging and set of `columns`,
+                `filters` and `file_pattern`.
+            compact: `bool`, default `False`
+                Reduce the memory of the returned DataFrame with `pycarol.utils.miscellaneous.compact_frame`, using
+                the field types to pick categoricals, downcast numbers and use Arrow backed strings. The memory before
+                and after is logged and kept in `d.attrs['memory_usage']`. It needs `backend='pandas'`.
             :return:
             """
 
-        if backend not in ('dask', 'pandas'):
-            raise ValueError(
-                f"Backend options are 'dask','pandas' {backend} was given")
+        if backend not in ('dask', 'pandas', 'arrow', 'polars'):
+            raise ValueError(f"Backend options are 'dask', 'pandas', 'arrow', 'polars' {backend} was given")
+
+        if callback and backend != 'pandas':
+            raise ValueError("`callback` is only available with `backend='pandas'`.")
+
+        if compact and backend != 'pandas':
+            raise ValueError("`compact=True` is only available with `backend='pandas'`.")
 
         if return_metadata:
             # It can be costly to get all meta from a golden. So er should alway ask for the info we want.
             _meta_cols = _CAROL_METADATA_GOLDEN
         else:
-            _meta_cols = _NEEDED_FOR_MERGE
+            # the same untie field is read by every backend, so they keep the same records.
+            _meta_cols = _NEEDED_FOR_MERGE + [_CAROL_METADATA_UNTIE_GOLDEN]
 
         if callback and not callable(callback):
             raise TypeError(f'"{callback}" object is not callable')
@@ -173,6 +203,13 @@ class DataModel:
             warnings.warn(
                 '`return_dask_graph` has no use when `backend!=dask`')
 
+        if incremental:
+            if snapshot is None:
+                raise ValueError('`snapshot` should be set when `incremental=True`.')
+            if backend == 'dask':
+                raise ValueError("`incremental=True` is not available with `backend='dask'`.")
+            merge_records = True
+
         if not cds:
             _deprecation_msgs("`cds` option will be removed from pycarol 3.33. Consider use `cds=True`"
                               " to avoid problems. ")
@@ -190,16 +227,20 @@ class DataModel:
                              import_type=import_type,
                              merge_records=merge_records,
                              return_dask_graph=return_dask_graph,
-                             columns=columns)
+                             columns=columns, filters=filters)
 
-        elif backend == 'pandas':
+        else:
             import pandas as pd
             d = _import_pandas(storage=storage, dm_name=dm_name,
                                import_type=import_type, columns=columns,
                                callback=callback, max_hits=max_hits,
                                max_workers=max_workers,
                                token_carolina=token_carolina,
-                               storage_space=storage_space, file_pattern=file_pattern)
+                               storage_space=storage_space, file_pattern=file_pattern,
+                               merge_records=merge_records and (backend != 'polars' or incremental),
+                               untie_field=_CAROL_METADATA_UNTIE_GOLDEN,
+                               filters=filters, cache=cache, snapshot=snapshot if incremental else None,
+                               to_pandas=backend == 'pandas')
             if d is None:
                 warnings.warn("No data to fetch!", UserWarning)
                 _field_types = self._get_name_type_DMs(
@@ -220,16 +261,18 @@ class DataModel:
                 if columns:
                     columns = list(set(columns))
                     d = d[list(set(columns))]
-                return d
-
-        else:
-            raise ValueError(
-                f'backend should be either "dask" or "pandas" you entered {backend}')
+                return _from_pandas(d, backend)
 
         if (return_callback_result) and (callback is not None):
             return d
 
-        if merge_records:
+        if backend == 'polars':
+            d = import_polars().from_arrow(d)
+            if merge_records and not incremental:
+                d = drop_duplicated_parquet_polars(d, untie_field=_CAROL_METADATA_UNTIE_GOLDEN)
+
+        # pandas and arrow backends merge the records while downloading the files, unless a callback changed them.
+        elif merge_records and (backend == 'dask' or callback is not None):
             if (not return_dask_graph) or (backend == 'pandas'):
                 d = drop_duplicated_parquet(
                     d, untie_field=_CAROL_METADATA_UNTIE_GOLDEN)
@@ -238,11 +281,71 @@ class DataModel:
                     d, untie_field=_CAROL_METADATA_UNTIE_GOLDEN)
 
         if not return_metadata:
-            to_drop = set(_meta_cols).intersection(set(d.columns))
-            d = d.drop(labels=to_drop, axis=1)
+            d = _drop_metadata(d, _meta_cols)
+
+        if compact:
+            d = compact_frame(d, types=self._get_python_types(dm_name))
 
         return d
 
+    def fetch_parquet_iter(
+            self, dm_name, columns=None, return_metadata=False, file_pattern=None, filters=None, cache=False,
+            prefetch=2, by_row_group=False, backend='pandas'
+    ):
+        """
+        Iterate over the parquet files of a data model, without loading all of them in memory.
+
+        Args:
+            dm_name: `str`
+                Data model name to be imported
+            columns: `list`, default `None`
+                List of columns to fetch.
+            return_metadata: `bool`, default `False`
+                To return or not the fields like ['mdmId', 'mdmCounterForEntity', etc.]
+            file_pattern: `str` default `None`
+                File pattern to filter data when fetching from CDS. e.g.
+                file_pattern='2019-11-25' will fetch only CDS files that start with `2019-11-25`.
+            filters: `list` or `pyarrow.compute.Expression`, default `None`
+                Row filters. See `fetch_parquet`.
+            cache: `bool` or `pycarol.utils.file_cache.FileCache`, default `False`
+                Keep the downloaded files in a local cache. See `fetch_parquet`.
+            prefetch: `int`, default `2`
+                Number of threads downloading the next files while the current one is processed.
+            by_row_group: `bool`, default `False`
+                Yield each row group of the files, instead of the whole file.
+            backend: ['pandas', 'arrow'], default `pandas`
+                Yield `pandas.DataFrame` or `pyarrow.Table`.
+
+        Returns: Generator of `pandas.DataFrame` or `pyarrow.Table`
+            The records are not merged, a record updated or deleted can be in more than one file. Use
+            `return_metadata=True` to get `mdmStagingCounter` and `mdmDeleted`.
+
+        Usage:
+
+        .. code:: python
+
+            from pycarol import Carol, DataModel
+            for df in DataModel(Carol()).fetch_parquet_iter('invoice', columns=['value'], by_row_group=True):
+                model.partial_fit(df[['value']])
+
+        """
+        if backend not in ('pandas', 'arrow'):
+            raise ValueError(f"Backend options are 'pandas','arrow' {backend} was given")
+
+        _meta_cols = _CAROL_METADATA_GOLDEN if return_metadata else _NEEDED_FOR_MERGE
+        if not columns:
+            columns = list(self._get_name_type_DMs(self.get_by_name(dm_name)['mdmFields']))
+        elif isinstance(columns, str):
+            columns = [columns]
+        columns = list(columns) + _meta_cols
+
+        for d in _import_pandas_iter(Storage(self.carol), import_type='golden_cds', dm_name=dm_name,
+                                     columns=columns, file_pattern=file_pattern, filters=filters, cache=cache,
+                                     prefetch=prefetch, by_row_group=by_row_group, to_pandas=backend == 'pandas'):
+            if not return_metadata:
+                d = _drop_metadata(d, _meta_cols)
+            yield d
+
     def get_all(self, offset=0, page_size=-1, sort_order='ASC',
                 sort_by=None, print_status=False,
                 save_file=None, only_published=False):
@@ -350,6 +453,12 @@ class DataModel:
 
         return self.carol.call_api(url, method='DELETE', params=querystring)
 
+    def _get_python_types(self, dm_name):
+        """Python type of each field of a data model, nested fields as `str`."""
+        return {
+            key: str if isinstance(value, dict) else _DATA_MODEL_TYPES_MAPPING.get(value.lower(), str)
+            for key, value in self._get_name_type_DMs(self.get_by_name(dm_name)['mdmFields']).items()}
+
     def _get_name_type_DMs(self, fields):
         f = {}
         for field in fields:
@@ -452,12 +561,11 @@ class DataModel:
         """
 
         self.gzip = gzip
-        extra_headers = {}
-        content_type = 'application/json'
+        # batches are sent as json bytes, so the content-type is set in the headers and not in `content_type`.
+        extra_headers = {'content-type': 'application/json'}
+        content_type = None
         if self.gzip:
-            content_type = None
             extra_headers["Content-Encoding"] = "gzip"
-            extra_headers['content-type'] = 'application/json'
 
         if dm_name:
             dm_id = self.get_by_name(dm_name)['mdmId']
@@ -525,8 +633,9 @@ class DataModel:
             Args:
                 dm_name: `str`
                     Data model name to be imported
-                backend: ['dask','pandas'], default `dask`
-                    if to use either dask or pandas to fetch the data
+                backend: ['dask','pandas','arrow','polars'], default `pandas`
+                    if to use either dask or pandas to fetch the data. `arrow` returns a `pyarrow.Table` and `polars`
+                    a polars DataFrame.
                 return_dask_graph: `bool`, default `false`
                     If to return the dask graph or the dataframe.
                 callback: `callable`, default `None`
@@ -546,9 +655,11 @@ class DataModel:
                     pd.DataFrame with rejected records.
                 """
 
-        if backend not in ('dask', 'pandas'):
-            raise ValueError(
-                f"Backend options are 'dask','pandas' {backend} was given")
+        if backend not in ('dask', 'pandas', 'arrow', 'polars'):
+            raise ValueError(f"Backend options are 'dask', 'pandas', 'arrow', 'polars' {backend} was given")
+
+        if callback and backend != 'pandas':
+            raise ValueError("`callback` is only available with `backend='pandas'`.")
 
         if callback and not callable(callback):
             raise TypeError(f'"{callback}" object is not callable')
@@ -572,7 +683,7 @@ class DataModel:
                 columns=None, file_pattern=file_pattern,
             )
 
-        elif backend == 'pandas':
+        else:
             import pandas as pd
             d = _import_pandas(
                 storage=storage, dm_name=dm_name,
@@ -580,7 +691,8 @@ class DataModel:
                 callback=callback, max_hits=max_hits,
                 max_workers=max_workers,
                 token_carolina=token_carolina,
-                storage_space=storage_space, file_pattern=file_pattern
+                storage_space=storage_space, file_pattern=file_pattern,
+                to_pandas=backend == 'pandas',
             )
             if d is None:
                 warnings.warn("No data to fetch!", UserWarning)
@@ -594,15 +706,14 @@ class DataModel:
                         value = "STRING"  # If nested we receive as a `STR`
                     d.loc[:, key] = d.loc[:, key].astype(
                         _DATA_MODEL_TYPES_MAPPING.get(value.lower(), str), copy=False)
-                return d
-
-        else:
-            raise ValueError(
-                f'backend should be either "dask" or "pandas" you entered {backend}')
+                return _from_pandas(d, backend)
 
         if (return_callback_result) and (callback is not None):
             return d
 
+        if backend == 'polars':
+            d = import_polars().from_arrow(d)
+
         return d
 
 
@@ -1,10 +1,17 @@
 """Contain all the classes to query data from RT layer in Carol."""
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
 import copy
 from datetime import datetime
 import json
 import itertools
+import math
+import random
+import threading
 import typing as T
+import warnings
 
+import requests
 from retry import retry
 
 from .connectors import Connectors
@@ -12,7 +19,12 @@ from .exceptions import NoScrollIdException, RepeatedMDMIdsException
 from .filter import Filter, MAXIMUM, MINIMUM, TYPE_FILTER, TERM_FILTER
 from .filter import RANGE_FILTER as RF
 from .named_query import NamedQuery
-from .utils.miscellaneous import ranges
+from .utils.miscellaneous import compact_frame, import_polars, ranges
+
+# Elasticsearch `index.max_result_window`: offset + page size limit without scroll.
+_MAX_RESULT_WINDOW = 10000
+# a sample is drawn from at least this many slices, when it has as many records.
+_SAMPLE_MIN_SLICES = 100
 
 
 def delete_golden(carol, dm_name, now=None):
@@ -130,6 +142,8 @@ class Query:
             Use the stram of data.
         get_times: `bool`, default `False`
             It will create a list of times that each pagination took.
+        max_workers: `int`, default 4
+            Number of pages fetched concurrently when `scrollable=False`.
         kwargs: `dict`
             Extra parameters to be passed to Carol.call_api
 
@@ -156,6 +170,7 @@ class Query:
         flush_result=False,
         use_stream=False,
         get_times=False,
+        max_workers=4,
         **kwargs,
     ):
         self.carol = carol
@@ -178,6 +193,7 @@ class Query:
         self.get_errors = get_errors
         self.flush_result = flush_result
         self.get_times = get_times
+        self.max_workers = max_workers
         self.named_query = None
         self.callback = None
         self.query_errors: T.Dict[str, T.Any] = {}
@@ -256,12 +272,7 @@ class Query:
         )
 
         if self.only_hits is True:
-            result = result["hits"]
-            return [
-                elem.get("mdmGoldenFieldAndValues", elem)
-                for elem in result
-                if elem.get("mdmGoldenFieldAndValues", None)
-            ]
+            return _golden_values(result["hits"])
 
         else:
             return result
@@ -283,21 +294,26 @@ class Query:
         self._build_return_fields()
         self._build_query_params()
 
-        if not self.offset == 0:
-            raise ValueError(
-                "It is not possible to use offset when using scroll for pagination"
-            )
-        self._scrollable_query_handler(callback)
+        if self.scrollable:
+            if not self.offset == 0:
+                raise ValueError(
+                    "It is not possible to use offset when using scroll for pagination"
+                )
+            self._scrollable_query_handler(callback)
+        else:
+            self._offset_query_handler(callback)
 
         return self
 
+    def _url_filter(self) -> str:
+        if self.named_query is None:
+            return "v2/queries/filter"
+        return f"v2/queries/named/{self.named_query}"
+
     def _scrollable_query_handler(
         self, callback: T.Optional[T.Callable] = None
     ) -> None:
-        if self.named_query is None:
-            url_filter = "v2/queries/filter"
-        else:
-            url_filter = f"v2/queries/named/{self.named_query}"
+        url_filter = self._url_filter()
 
         count = self.offset
         downloaded = 0
@@ -314,54 +330,119 @@ class Query:
                 set_param = False
 
             count += result["count"]
-            downloaded += result["count"]
             scroll_id = result.get("scrollId", None)
             url_filter = f"v2/queries/filter/{scroll_id}"
 
-            if self.get_times is True:
-                self.query_times.append(result.pop("took"))
-
-            if self.safe_check is True:
-                self.mdmId_list.extend([mdm_id["mdmId"] for mdm_id in result["hits"]])
-                if len(self.mdmId_list) > len(set(self.mdmId_list)):
-                    raise RepeatedMDMIdsException
-
-            if self.get_errors is True:
-                errors = {
-                    elem.get("mdmId", elem): elem.get("mdmErrors", elem)
-                    for elem in result["hits"]
-                    if "mdmErrors" in elem and elem["mdmErrors"]
-                }
-                self.query_errors.update(errors)
-
-            if self.only_hits is True:
-                result = result["hits"]
-                result = [
-                    elem.get("mdmGoldenFieldAndValues", elem)
-                    for elem in result
-                    if elem.get("mdmGoldenFieldAndValues", None)
-                ]  # get mdmGoldenFieldAndValues if not empty and if it exists
-
-                if self.flush_result is False:
-                    self.results.extend(result)
-            else:
-                result.pop("count")
-                result.pop("totalHits")
+            downloaded = self._handle_page(result, callback, downloaded, to_get)
 
-                if self.flush_result is False:
-                    self.results.append(result)
+            if self.get_aggs is True and self.only_hits is False:
+                break
 
-            if callback is not None:
-                callback(result)
+    def _offset_query_handler(self, callback: T.Optional[T.Callable] = None) -> None:
+        """Fetch the pages of a non scrollable query.
 
-            if self.print_status is True:
-                print(f"{downloaded}/{to_get}", end="\r")
+        The first page gives `totalHits`, so all the remaining offsets are known and
+        are requested concurrently. Pages are handled in offset order.
+        """
+        url_filter = self._url_filter()
 
-            if self.save_results is True:
-                _write_results(self.filename, result)
+        self.query_errors = {}
+        self.mdmId_list = []
+        result = self._page_request(url_filter, self.offset)
+        self.total_hits = result["totalHits"]
+        to_get = min(self.max_hits, max(self.total_hits - self.offset, 0))
+
+        last_offset = self.offset + to_get
+        if last_offset > _MAX_RESULT_WINDOW:
+            warnings.warn(
+                f"Only the first {_MAX_RESULT_WINDOW} records can be fetched without "
+                "scroll. Use `scrollable=True` to fetch all the records.",
+                UserWarning,
+            )
+            last_offset = _MAX_RESULT_WINDOW
 
-            if self.get_aggs is True and self.only_hits is False:
-                break
+        downloaded = self._handle_page(result, callback, 0, to_get)
+
+        if (self.get_aggs is True and self.only_hits is False) or self.page_size <= 0:
+            return
+
+        offsets = range(self.offset + self.page_size, last_offset, self.page_size)
+        with _thread_sessions() as thread_session:
+
+            def page_request(offset):
+                return self._page_request(url_filter, offset, session=thread_session())
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for result in executor.map(page_request, offsets):
+                    downloaded = self._handle_page(result, callback, downloaded, to_get)
+
+    def _handle_page(
+        self,
+        result: T.Dict,
+        callback: T.Optional[T.Callable],
+        downloaded: int,
+        to_get: float,
+    ) -> int:
+        downloaded += result["count"]
+
+        if self.get_times is True:
+            self.query_times.append(result.pop("took"))
+
+        if self.safe_check is True:
+            self.mdmId_list.extend([mdm_id["mdmId"] for mdm_id in result["hits"]])
+            if len(self.mdmId_list) > len(set(self.mdmId_list)):
+                raise RepeatedMDMIdsException
+
+        if self.get_errors is True:
+            errors = {
+                elem.get("mdmId", elem): elem.get("mdmErrors", elem)
+                for elem in result["hits"]
+                if "mdmErrors" in elem and elem["mdmErrors"]
+            }
+            self.query_errors.update(errors)
+
+        if self.only_hits is True:
+            result = _golden_values(result["hits"])
+
+            if self.flush_result is False:
+                self.results.extend(result)
+        else:
+            result.pop("count")
+            result.pop("totalHits")
+
+            if self.flush_result is False:
+                self.results.append(result)
+
+        if callback is not None:
+            callback(result)
+
+        if self.print_status is True:
+            print(f"{downloaded}/{to_get}", end="\r")
+
+        if self.save_results is True:
+            _write_results(self.filename, result)
+
+        return downloaded
+
+    def _page_request(
+        self, url: str, offset: int, session: T.Optional[requests.Session] = None
+    ) -> T.Dict:
+        params = dict(self.query_params, offset=offset)
+        if offset < _MAX_RESULT_WINDOW:
+            # offset + pageSize can not go over the window.
+            params["pageSize"] = min(self.page_size, _MAX_RESULT_WINDOW - offset)
+        if session is not None:
+            kwargs = dict(self.kwargs, session=session)
+        else:
+            kwargs = self.kwargs
+        return self.carol.call_api(
+            url,
+            data=self.json_query,
+            params=params,
+            timeout=240,
+            method_whitelist=frozenset(["POST"]),
+            **kwargs,
+        )
 
     @retry(exceptions=NoScrollIdException, tries=5)
     def _query_request(self, url: str) -> T.Dict:
@@ -379,6 +460,273 @@ class Query:
 
         return result
 
+    def aggs_to_frame(
+        self, fetch: bool = True, backend: str = "pandas"
+    ) -> T.Union["pd.DataFrame", "pa.Table", "pl.DataFrame"]:
+        """Flatten the aggregations of the query into a tidy table.
+
+        Each bucket of a bucket aggregation (`TERMS`, `DATE_HISTOGRAM`, `HISTOGRAM`,
+        `RANGE`, ...) becomes a row, with the bucket key in a column named after the
+        aggregation and the document count in `<name>_doc_count`. Metric
+        aggregations (`MINIMUM`, `STATS`, ...) become columns. Sub aggregations are
+        expanded recursively, one row per combination of nested buckets.
+
+        Sibling bucket aggregations are not crossed: their rows are stacked in long
+        format, with the aggregation name in `agg_name`, the bucket key (as returned
+        by Carol) in `key` and the document count in `doc_count`.
+
+        Args:
+            fetch: If `True`, run the query with `pageSize=0`, so only the
+                aggregations are returned and no hit is downloaded. If `False`, use
+                the aggregations already in `self.results` (`go()` must have been
+                called with `only_hits=False` and `get_aggs=True`).
+            backend: 'pandas' to return a `pandas.DataFrame`, 'arrow' to return a
+                `pyarrow.Table` or 'polars' to return a polars DataFrame.
+
+        Returns:
+            Table with one row per leaf bucket.
+
+        Usage:
+
+        .. code:: python
+
+            from pycarol import Carol, Query
+            from pycarol.filter import Filter, TERMS, STATS
+
+            json_query = Filter.Builder() \\
+                .type('invoiceGolden') \\
+                .aggregation(TERMS(name='branch', params=['mdmGoldenFieldAndValues.branch.raw'],
+                                   sub_aggregations=[STATS(name='total',
+                                                           params=['mdmGoldenFieldAndValues.total'])])) \\
+                .build().to_json()
+            df = Query(Carol()).query(json_query).aggs_to_frame()
+        """
+        _check_backend(backend)
+
+        if self.json_query is None:
+            raise ValueError(
+                "You must call query() or named() before calling aggs_to_frame()"
+            )
+
+        if fetch:
+            aggs = self._fetch_aggs()
+        else:
+            if not self.results or not isinstance(self.results[0], dict):
+                raise ValueError(
+                    "No aggregations found. Use `only_hits=False` and "
+                    "`get_aggs=True` before calling go()"
+                )
+            aggs = self.results[0].get("aggs")
+
+        agg_types = _aggregation_types(self.json_query.get("aggregationList", []))
+        columns = _rows_to_columns(_flatten_aggs(aggs or {}))
+        return _columns_to_table(columns, agg_types, backend)
+
+    def _field_types(self) -> T.Optional[T.Dict[str, type]]:
+        """Python type of each field of the data model queried, if it is only one."""
+        names = [
+            filter_["mdmValue"][: -len("Golden")]
+            for filter_ in (self.json_query or {}).get("mustList", [])
+            if filter_.get("mdmFilterType") == "TYPE_FILTER"
+            and str(filter_.get("mdmValue", "")).endswith("Golden")
+        ]
+        if len(names) != 1:
+            return None
+
+        from .data_models import DataModel
+
+        return DataModel(self.carol)._get_python_types(names[0])
+
+    def to_frame(
+        self, backend: str = "pandas", compact: bool = False
+    ) -> T.Union["pd.DataFrame", "pa.Table", "pl.DataFrame"]:
+        """Convert the hits in `self.results` into a table.
+
+        Args:
+            backend: 'pandas' to return a `pandas.DataFrame`, 'arrow' to return a
+                `pyarrow.Table` or 'polars' to return a polars DataFrame. The arrow and
+                polars tables are built from the records without going through pandas.
+            compact: If `True`, reduce the memory of the `pandas.DataFrame` with
+                `pycarol.utils.miscellaneous.compact_frame`, using the field types of the
+                data model queried. The memory before and after is logged and kept in
+                `df.attrs['memory_usage']`.
+
+        Returns:
+            Table with one row per record.
+
+        Usage:
+
+        .. code:: python
+
+            from pycarol import Carol, Query
+            table = Query(Carol()).all('invoice').go().to_frame(backend='arrow')
+        """
+        _check_backend(backend)
+
+        if not self.only_hits:
+            raise ValueError("`to_frame()` needs a query with `only_hits=True`.")
+
+        if compact and backend != "pandas":
+            raise ValueError("`compact=True` is only available with `backend='pandas'`.")
+
+        if backend == "pandas":
+            import pandas as pd
+
+            df = pd.DataFrame(self.results)
+            return compact_frame(df, types=self._field_types()) if compact else df
+
+        import pyarrow as pa
+
+        names = dict.fromkeys(name for record in self.results for name in record)
+        table = pa.Table.from_pydict(
+            {name: [record.get(name) for record in self.results] for name in names}
+        )
+        if backend == "polars":
+            return import_polars().from_arrow(table)
+        return table
+
+    def _fetch_aggs(self, json_query: T.Optional[T.Dict] = None) -> T.Dict:
+        url_filter = self._url_filter()
+        params = {
+            "offset": 0,
+            "pageSize": 0,
+            "sortOrder": self.sort_order,
+            "indexType": self.index_type,
+        }
+        result = self.carol.call_api(
+            url_filter,
+            data=json_query if json_query is not None else self.json_query,
+            params=params,
+            timeout=240,
+            method_whitelist=frozenset(["POST"]),
+            **self.kwargs,
+        )
+        self.total_hits = result.get("totalHits")
+        return result.get("aggs") or {}
+
+    def sample(
+        self, n: int, seed: T.Optional[int] = None, mdm_key: str = "mdmCounterForEntity"
+    ) -> "Query":
+        """Draw a random sample of the records matching the query.
+
+        The `[min, max]` interval of `mdm_key` is split in small slices (based on
+        `totalHits`), so the sample comes from about `n` or at least 100 slices
+        spread over the interval, each with up to `page_size` records expected.
+        Random slices are then fetched concurrently, with all their records, until
+        `n` records are collected, so dense slices are not truncated. If more than
+        `n` records were fetched, `n` of them are randomly kept.
+
+        Args:
+            n: Number of records in the sample.
+            seed: Seed for the random number generator.
+            mdm_key: Numeric field used to slice the records.
+
+        Returns: Query self, with the sample in `self.results`.
+
+        Usage:
+
+        .. code:: python
+
+            from pycarol import Carol, Query
+
+            query = Query(Carol(), page_size=1000).all('invoice').sample(100000, seed=42)
+            records = query.results
+        """
+        if self.json_query is None:
+            raise ValueError(
+                "You must call all() or query() before calling sample()"
+            )
+        if self.named_query is not None:
+            raise ValueError("sample() is not available for named queries.")
+
+        rng = random.Random(seed)
+        self._build_return_fields()
+        self._build_query_params()
+        self.results = []
+
+        json_query = copy.deepcopy(self.json_query)
+        json_query["aggregationList"] = [
+            MINIMUM(name="MINIMUM", params=mdm_key).to_json(),
+            MAXIMUM(name="MAXIMUM", params=mdm_key).to_json(),
+        ]
+        aggs = self._fetch_aggs(json_query)
+        if not self.total_hits:
+            return self
+
+        min_v = int(aggs["MINIMUM"]["value"])
+        max_v = int(aggs["MAXIMUM"]["value"])
+        per_slice = min(max(n // _SAMPLE_MIN_SLICES, 1), self.page_size)
+        width = max(math.ceil(per_slice * (max_v - min_v + 1) / self.total_hits), 1)
+        slices = list(range(min_v, max_v + 1, width))
+        rng.shuffle(slices)
+
+        records: T.List[T.Dict] = []
+        with _thread_sessions() as thread_session:
+
+            def fetch_slice(start):
+                return self._sample_slice(start, width, mdm_key, session=thread_session())
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while slices and len(records) < n:
+                    n_slices = math.ceil((n - len(records)) / per_slice)
+                    to_fetch, slices = slices[:n_slices], slices[n_slices:]
+                    for hits in executor.map(fetch_slice, to_fetch):
+                        records.extend(hits)
+
+                    if self.print_status is True:
+                        print(f"{min(len(records), n)}/{n}", end="\r")
+
+        if len(records) > n:
+            records = rng.sample(records, n)
+
+        self.results = records
+        return self
+
+    def _sample_slice(
+        self,
+        start: int,
+        width: int,
+        mdm_key: str,
+        session: T.Optional[requests.Session] = None,
+    ) -> T.List[T.Dict]:
+        """All the records of the slice `[start, start + width)`, paginated.
+
+        A slice with more records than the result window is split in halves.
+        """
+        json_query = copy.deepcopy(self.json_query)
+        json_query.setdefault("mustList", []).append(
+            RF(key=mdm_key, value=[start, start + width - 1]).to_json()
+        )
+        params = dict(self.query_params)
+        params.pop("scrollable", None)
+        kwargs = self.kwargs if session is None else dict(self.kwargs, session=session)
+
+        hits: T.List[T.Dict] = []
+        while True:
+            params["offset"] = len(hits)
+            params["pageSize"] = min(self.page_size, _MAX_RESULT_WINDOW - len(hits))
+            result = self.carol.call_api(
+                self._url_filter(),
+                data=json_query,
+                params=params,
+                timeout=240,
+                method_whitelist=frozenset(["POST"]),
+                **kwargs,
+            )
+            if result["totalHits"] > _MAX_RESULT_WINDOW and width > 1:
+                half = width // 2
+                return self._sample_slice(
+                    start, half, mdm_key, session=session
+                ) + self._sample_slice(start + half, width - half, mdm_key, session=session)
+
+            hits.extend(result["hits"])
+            if not result["hits"] or len(hits) >= min(result["totalHits"], _MAX_RESULT_WINDOW):
+                break
+
+        if self.only_hits is True:
+            return _golden_values(hits)
+        return hits
+
     def check_total_hits(self, json_query, index_type="MASTER"):
         """
         Check the total hits for a given query
@@ -879,7 +1227,193 @@ def _par_query(
     return query
 
 
+@contextlib.contextmanager
+def _thread_sessions() -> T.Iterator[T.Callable[[], requests.Session]]:
+    """Give one `requests.Session` per thread, `requests.Session` is not thread safe.
+
+    The sessions are closed on exit.
+    """
+    local = threading.local()
+    sessions: T.List[requests.Session] = []
+
+    def thread_session() -> requests.Session:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+            sessions.append(session)
+        return session
+
+    try:
+        yield thread_session
+    finally:
+        for session in sessions:
+            session.close()
+
+
+def _golden_values(hits: T.List[T.Dict]) -> T.List[T.Dict]:
+    """Get mdmGoldenFieldAndValues of each hit, if not empty and if it exists."""
+    return [
+        elem.get("mdmGoldenFieldAndValues", elem)
+        for elem in hits
+        if elem.get("mdmGoldenFieldAndValues", None)
+    ]
+
+
 def _write_results(filepath: str, results) -> None:
     with open(filepath, "a", encoding="utf8") as file:
         file.write(json.dumps(results, ensure_ascii=False))
         file.write("\n")
+
+
+_BUCKET_FIELDS = ("key", "keyAsString", "key_as_string", "docCount", "doc_count")
+
+
+def _aggregation_types(aggregation_list: T.List[T.Dict]) -> T.Dict[str, str]:
+    """Map each aggregation name, including sub aggregations, to its type."""
+    types = {}
+    for agg in aggregation_list:
+        types[agg["name"]] = agg["type"]
+        types.update(_aggregation_types(agg.get("subAggregations", [])))
+    return types
+
+
+def _flatten_aggs(aggs: T.Dict) -> T.List[T.Dict]:
+    """Expand the aggregations of one level into rows.
+
+    Metric aggregations are added as columns to every row. The buckets of a bucket
+    aggregation are crossed with their sub aggregations. Sibling bucket
+    aggregations are stacked in long format instead of crossed with each other,
+    see `_long_row`.
+    """
+    metrics: T.Dict = {}
+    bucket_rows: T.Dict[str, T.List[T.Dict]] = {}
+    for name, value in aggs.items():
+        rows = _flatten_agg(name, value)
+        if _is_bucket_agg(value):
+            bucket_rows[name] = rows
+        else:
+            metrics.update(rows[0])
+
+    if len(bucket_rows) <= 1:
+        rows = next(iter(bucket_rows.values()), [{}])
+    else:
+        rows = [
+            _long_row(name, row) for name, rows in bucket_rows.items() for row in rows
+        ]
+    return [dict(metrics, **row) for row in rows]
+
+
+def _is_bucket_agg(value: T.Any) -> bool:
+    return isinstance(value, dict) and (
+        "buckets" in value or "docCount" in value or "doc_count" in value
+    )
+
+
+def _long_row(name: str, row: T.Dict) -> T.Dict:
+    """Row of a sibling bucket aggregation in long format.
+
+    The aggregation name goes to `agg_name`, the bucket key to `key` and the
+    document count to `doc_count`. If the row is already in long format, from
+    siblings nested in the bucket, `agg_name` gets the path `<name>.<sibling>` and
+    the bucket key and count keep their `<name>` columns.
+    """
+    row = dict(row)
+    inner = row.pop("agg_name", None)
+    if inner is not None:
+        return dict({"agg_name": f"{name}.{inner}"}, **row)
+    return dict(
+        {
+            "agg_name": name,
+            "key": row.pop(name, None),
+            "doc_count": row.pop(f"{name}_doc_count", None),
+        },
+        **row,
+    )
+
+
+def _flatten_agg(name: str, value: T.Any) -> T.List[T.Dict]:
+    if not isinstance(value, dict):
+        return [{name: value}]
+
+    if "buckets" in value:
+        buckets = value["buckets"]
+        if isinstance(buckets, dict):  # keyed buckets.
+            buckets = [dict(bucket, key=key) for key, bucket in buckets.items()]
+        return [
+            dict({name: bucket.get("key")}, **row)
+            for bucket in buckets
+            for row in _flatten_bucket(name, bucket)
+        ]
+
+    if "docCount" in value or "doc_count" in value:  # single bucket, e.g. NESTED.
+        return _flatten_bucket(name, value)
+
+    if "value" in value:
+        return [{name: value["value"]}]
+
+    # multi value metrics, e.g. STATS.
+    return [
+        {f"{name}_{k}": v for k, v in value.items() if not isinstance(v, (dict, list))}
+    ]
+
+
+def _flatten_bucket(name: str, bucket: T.Dict) -> T.List[T.Dict]:
+    base = {f"{name}_doc_count": bucket.get("docCount", bucket.get("doc_count"))}
+    sub_aggs = bucket.get("aggs", bucket.get("subAggregations"))
+    if sub_aggs is None:
+        sub_aggs = {}
+        for key, value in bucket.items():
+            if key in _BUCKET_FIELDS:
+                continue
+            if isinstance(value, dict):
+                sub_aggs[key] = value
+            else:  # e.g. `from` and `to` of RANGE buckets.
+                base[f"{name}_{key}"] = value
+
+    return [dict(base, **row) for row in _flatten_aggs(sub_aggs)]
+
+
+def _rows_to_columns(rows: T.List[T.Dict]) -> T.Dict[str, T.List]:
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    return {name: [row.get(name) for row in rows] for name in names}
+
+
+def _check_backend(backend: str) -> None:
+    if backend not in ("pandas", "arrow", "polars"):
+        raise ValueError(
+            f"Backend options are 'pandas', 'arrow', 'polars'. {backend} was given"
+        )
+
+
+def _columns_to_table(columns: T.Dict[str, T.List], agg_types: T.Dict[str, str], backend: str):
+    date_columns = [
+        name
+        for name, agg_type in agg_types.items()
+        if agg_type == "DATE_HISTOGRAM" and name in columns
+    ]
+
+    if backend == "arrow":
+        import pyarrow as pa
+
+        arrays = {}
+        for name, values in columns.items():
+            if name in date_columns and all(
+                isinstance(v, int) or v is None for v in values
+            ):
+                arrays[name] = pa.array(values, type=pa.timestamp("ms"))
+            else:
+                arrays[name] = pa.array(values)
+        return pa.Table.from_pydict(arrays)
+
+    if backend == "polars":
+        return import_polars().from_arrow(
+            _columns_to_table(columns, agg_types, "arrow")
+        )
+
+    import pandas as pd
+
+    df = pd.DataFrame(columns)
+    for name in date_columns:
+        if pd.api.types.is_numeric_dtype(df[name]):
+            df[name] = pd.to_datetime(df[name], unit="ms")
+    return df
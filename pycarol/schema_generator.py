@@ -52,11 +52,13 @@ class Type(object):
             dict: ObjectType,
             np.float64: DoubleType,
             np.float32: DoubleType,
-            np.float: DoubleType,
+            np.float16: DoubleType,
             np.int64: IntType,
             np.int32: IntType,
-            np.int: IntType,
+            np.int16: IntType,
+            np.int8: IntType,
             np.bool_: BooleanType,
+            np.datetime64: DateType,
             datetime: DateType,
             pd.Timestamp:DateType
         }
@@ -74,16 +76,40 @@ class JsonSchemaTypeNotFound(Exception):
 
 
 class carolSchemaGenerator(object):
-    def __init__(self, base_object):
+    def __init__(self, base_object, properties=None):
         self.base_object = base_object
+        self.properties = properties
         self.schema_dict = None
 
     @classmethod
     def from_json(cls, base_json):
         base_object = json.loads(base_json)
+        if isinstance(base_object, list):
+            return cls.from_data(base_object)
         obj = cls(base_object)
         return obj
 
+    @classmethod
+    def from_data(cls, data, sample_size=1000):
+        """
+        Infer the schema from the column types of a sample of the records.
+
+        Typed columns use only their dtype. Object columns (e.g., nested dicts and lists) are inferred by Arrow from
+        the first `sample_size` records, merging the keys and types found in all of them, so a null or incomplete
+        first record does not define the schema.
+
+        Args:
+            data: `pandas.DataFrame`, `list of dict`, `pyarrow.Table` or `pyarrow.RecordBatch`
+                Records to infer the schema from.
+            sample_size: `int`, default `1000`
+                Number of records used to infer the type of object columns.
+
+        Returns: `carolSchemaGenerator`
+        """
+        schema = _infer_arrow_schema(data, sample_size)
+        properties = {field.name: _arrow_type_constructor(field.type) for field in schema}
+        return cls({name: None for name in properties}, properties=properties)
+
     def to_dict(self, mdmStagingType='stagingName', mdmFlexible=False, crosswalkname=None,
                 crosswalkList=None, export_data=False):
 
@@ -93,7 +119,7 @@ class carolSchemaGenerator(object):
         assert isinstance(crosswalkList, list)
 
 
-        fields = set(self.base_object.keys())
+        fields = set(self.properties.keys() if self.properties is not None else self.base_object.keys())
         for key_field in crosswalkList:
             if key_field not in fields:
                 raise Exception('Your key field %s is not in your fields!' % (key_field))
@@ -114,8 +140,11 @@ class carolSchemaGenerator(object):
         schema_dict.update({"mdmFlexible": mdmFlexible})
         schema_dict.update({"mdmExportData": export_data})
 
-        for prop, value in base_object.items():
-            schema_dict["mdmStagingMapping"]["properties"].update({prop: _dictConstructor(base_object=value)})
+        if self.properties is not None:
+            schema_dict["mdmStagingMapping"]["properties"].update(self.properties)
+        else:
+            for prop, value in base_object.items():
+                schema_dict["mdmStagingMapping"]["properties"].update({prop: _dictConstructor(base_object=value)})
 
         self.schema_dict = schema_dict
         return schema_dict
@@ -167,3 +196,64 @@ def _dictConstructor(base_object):
                 schema_dict['properties'].append(_dictConstructor(base_object=item))
 
     return schema_dict
+
+
+def _infer_arrow_schema(data, sample_size=1000):
+    import pyarrow as pa
+    import pandas as pd
+
+    if isinstance(data, (pa.Table, pa.RecordBatch)):
+        return data.schema
+    if isinstance(data, list):
+        data = pd.DataFrame(data[:sample_size])
+    else:
+        data = data.head(sample_size)
+
+    try:
+        return pa.Schema.from_pandas(data, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+    # Columns with values of incompatible types are sent as strings.
+    fields = []
+    for name in data.columns:
+        try:
+            fields.append(pa.field(str(name), pa.Array.from_pandas(data[name]).type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            fields.append(pa.field(str(name), pa.string()))
+    return pa.schema(fields)
+
+
+def _arrow_type_constructor(arrow_type):
+    """Same as `_dictConstructor`, from an Arrow type."""
+    import pyarrow as pa
+
+    if pa.types.is_dictionary(arrow_type):
+        return _arrow_type_constructor(arrow_type.value_type)
+
+    if pa.types.is_struct(arrow_type):
+        schema_dict = {"type": ObjectType.json_type}
+        if arrow_type.num_fields > 0:
+            schema_dict["properties"] = {
+                arrow_type.field(i).name: _arrow_type_constructor(arrow_type.field(i).type)
+                for i in range(arrow_type.num_fields)
+            }
+        return schema_dict
+
+    if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type) or \
+            pa.types.is_fixed_size_list(arrow_type):
+        if pa.types.is_null(arrow_type.value_type):
+            return {"type": ArrayType.json_type}
+        return _arrow_type_constructor(arrow_type.value_type)
+
+    if pa.types.is_boolean(arrow_type):
+        schema_type = BooleanType
+    elif pa.types.is_integer(arrow_type):
+        schema_type = IntType
+    elif pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type):
+        schema_type = DoubleType
+    elif pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type):
+        schema_type = DateType
+    else:
+        schema_type = StringType
+    return {"type": schema_type.json_type}
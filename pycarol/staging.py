@@ -1,15 +1,20 @@
 import json
+import itertools
 import warnings
 import asyncio
+from collections.abc import Iterable
 
 from .schema_generator import carolSchemaGenerator
 from .connectors import Connectors
 from .storage import Storage
-from .utils.importers import _import_dask, _import_pandas
+from .utils.importers import _import_dask, _import_pandas, _import_pandas_iter, _drop_metadata, _from_pandas
 from .utils import async_helpers
-from .utils.miscellaneous import stream_data
+from .utils.miscellaneous import stream_data, iter_chunks, is_data_file, read_data_file, CrosswalkIndex, \
+    compact_frame
+from .utils.send_journal import SendJournal
 from . import _CAROL_METADATA_STAGING, _NEEDED_FOR_MERGE, _CAROL_METADATA_UNTIE_STAGING
-from .utils.miscellaneous import drop_duplicated_parquet, drop_duplicated_parquet_dask
+from .utils.miscellaneous import drop_duplicated_parquet, drop_duplicated_parquet_dask, \
+    drop_duplicated_parquet_polars, import_polars
 from .utils.deprecation_msgs import _deprecation_msgs
 
 _SCHEMA_TYPES_MAPPING = {
@@ -38,15 +43,21 @@ class Staging:
     def send_data(self, staging_name, data=None, connector_name=None, connector_id=None, step_size=500,
                   print_stats=True, gzip=True, auto_create_schema=False, crosswalk_auto_create=None,
                   flexible_schema=False, force=False,  max_workers=2,  dm_to_delete=None,
-                  async_send=False, carol_data_storage=False, storage_only=True, carol_sync=False):
+                  async_send=False, carol_data_storage=False, storage_only=True, carol_sync=False,
+                  batch_bytes=None, batch_bytes_compressed=False, compression_codec='gzip', compression_level=9,
+                  compression_workers=None, queue_size=None, journal=None, mode='api', file_rows=100000,
+                  process_cds=False, drop_duplicates=False, crosswalk_window=100000):
         """
         Send data to a staging table in Carol.
 
         Args:
             staging_name:  `str`,
                 Staging name to send the data.
-            data: pandas data frame, json. default `None`
-                Data to be send to Carol
+            data: pandas data frame, json, iterable, `pyarrow.RecordBatchReader` or `str`. default `None`
+                Data to be send to Carol. Besides a data frame or a list of dicts, it can be any iterable of
+                records (or of data frames/record batches), e.g., a generator or a `pyarrow.RecordBatchReader`,
+                or the path of a `.csv` or `.parquet` file. These are read while the batches are sent, so
+                the memory used does not depend on the data size.
             connector_name: `str`, default `None`
                 Connector name where the staging should be. Either `connector_name` or `connector_id` need to be set.
             connector_id: `str`, default `None`
@@ -56,7 +67,7 @@ class Staging:
             print_stats:`bool`, default `True`
                 If print the number of records sent
             gzip:`bool`, default `True`
-                If send each batch as a gzip file.
+                If send each batch compressed. See `compression_codec`.
             auto_create_schema:`bool`, default `False`
                 If to auto create the schema for the data being sent.
             crosswalk_auto_create: `list`, default `None`
@@ -66,6 +77,17 @@ class Staging:
             force: `bool`, default `False`
                 pycarol will check for duplicated values given the crosswalk.
                 If `force=True` it will not check. If `False` it will check for duplicates and raise an error.
+                Streams are checked while they are sent, so the error can be raised after some batches were sent.
+                Each chunk of a stream is checked against the records of the previous chunks in `crosswalk_window`.
+            drop_duplicates: `bool`, default `False`
+                If `force=False`, drop the records with a duplicated crosswalk keeping the last one, instead of
+                raising an error. In streams, only the repetitions inside a chunk are dropped, since a later record
+                updates the one already sent.
+            crosswalk_window: `int`, default `100000`
+                With `force=False`, check each chunk of a stream against the crosswalks of about the last
+                `crosswalk_window` records already sent too. Their hashes are kept in memory, about 100 bytes each,
+                so the memory of a stream stays bounded. Repetitions further apart are not found. Use `None` to keep
+                all of them, or `0` to check each chunk only against itself.
             max_workers: `int`, default `2`
                 To be used with `async_send=True`. Number of threads to use when sending.
             dm_to_delete: `str`, default `None` DEPRECATED.
@@ -85,6 +107,44 @@ class Staging:
                 Send data only to CDS.
             carol_sync: `bool`, default `False`
                 Send and wait data to be processed in Carol
+            batch_bytes: `int`, default `None`
+                If set, each batch is packed with as many records as fit in `batch_bytes` bytes, instead of
+                `step_size` records. Use it to keep requests close to the 10MB API limit, e.g.,
+                `batch_bytes=9 * 1024 * 1024`.
+            batch_bytes_compressed: `bool`, default `False`
+                If `batch_bytes` limits the gzip compressed batch instead of the json one. Batches whose compressed
+                size is over the limit are split.
+            compression_codec: `str`, default `gzip`
+                Codec used when `gzip=True`. Either `gzip` or `zstd`. Use `zstd` only if the endpoint accepts
+                `Content-Encoding: zstd`. It needs the `zstandard` package.
+            compression_level: `int`, default `9`
+                Compression level. Lower levels are much faster, e.g., `compression_level=1`, and the payload is
+                only slightly bigger.
+            compression_workers: `int`, default `None`
+                Number of threads used to compress the batches. The batches are compressed while the previous ones
+                are being sent.
+            queue_size: `int`, default `None`
+                To be used with `async_send=True`. Max number of batches ready to be sent. Memory usage is
+                proportional to it. If `None`, `2 * max_workers`.
+            journal: `str` or `pycarol.utils.send_journal.SendJournal`, default `None`
+                Path of a local journal of the batches sent. Batches already acknowledged in the journal are
+                skipped, so a failed send can be resumed by calling `send_data` again with the same data and
+                journal. Batches that fail after all the retries do not stop the send: they are saved in
+                `<journal>.dead` and can be sent again with `replay_dead_letters`.
+            mode: `str`, default `api`
+                How to send the data.
+
+                    1. `api`: JSON batches of `step_size` records to the staging API.
+                    2. `cds_parquet`: Parquet files of `file_rows` records written directly in the staging intake
+                    of CDS (`staging_cds`), `max_workers` files at a time. It is much faster for big loads. The data
+                    is only in Carol after it is processed, see `process_cds`.
+            file_rows: `int`, default `100000`
+                To be used with `mode='cds_parquet'`. Number of records in each parquet file.
+            process_cds: `bool`, default `False`
+                To be used with `mode='cds_parquet'`. Start `CDSStaging.process_data` for the files sent.
+
+        Returns: `dict` or `None`
+            With `mode='cds_parquet'` and `process_cds=True`, the task created to process the data.
 
         """
 
@@ -99,12 +159,11 @@ class Staging:
 
 
         self.gzip = gzip
-        extra_headers = {}
-        content_type = 'application/json'
+        # batches are sent as json bytes, so the content-type is set in the headers and not in `content_type`.
+        extra_headers = {'content-type': 'application/json'}
+        content_type = None
         if self.gzip:
-            content_type = None
-            extra_headers["Content-Encoding"] = "gzip"
-            extra_headers['content-type'] = 'application/json'
+            extra_headers["Content-Encoding"] = compression_codec
 
         if connector_name:
             connector_id = self._connector_by_name(connector_name)
@@ -114,30 +173,41 @@ class Staging:
 
         is_df = False
         _crosswalk = None
+        # records are read from streams in chunks of the size of a batch (or a file in CDS).
+        chunk_size = file_rows if mode == 'cds_parquet' else step_size
+        if is_data_file(data):
+            data = read_data_file(data, step_size=chunk_size)
+
         if isinstance(data, str):
             data = json.loads(data)
             data_size = len(data)
-            _sample_json = data[0]
+            _schema_sample = data
         elif isinstance(data, list):
             data_size = len(data)
-            _sample_json = data[0]
+            _schema_sample = data
         elif isinstance(data, dict):
             data = [data]
             data_size = len(data)
-            _sample_json = data[0]
+            _schema_sample = data
         else:
             import pandas as pd
             if isinstance(data, pd.DataFrame):
                 is_df = True
                 data_size = data.shape[0]
-                _sample_json = data.iloc[0].to_json(date_format='iso')
+                _schema_sample = data
+            elif isinstance(data, Iterable) or hasattr(data, 'to_batches'):
+                # Streams are read one chunk at a time, their size is not known in advance.
+                data = iter_chunks(data, chunk_size)
+                first_chunk = next(data, None)
+                if first_chunk is None:
+                    raise ValueError('`data` is empty.')
+                data = itertools.chain([first_chunk], data)
+                data_size = None
+                _schema_sample = first_chunk
             else:
-                raise ValueError('`data` should be either a stringfied json, a list of dictionaries, a dictionary or a pd.DataGrame ')
-
-
-        if (not isinstance(data, list)) and (not is_df):
-            data = [data]
-            data_size = len(data)
+                raise ValueError('`data` should be either a stringfied json, a list of dictionaries, a dictionary, '
+                                 'a pd.DataFrame, an iterable of records, a pyarrow.RecordBatchReader or the path '
+                                 'of a CSV or Parquet file.')
 
         if auto_create_schema:
 
@@ -149,20 +219,29 @@ class Staging:
                 overwrite = False
             else:
                 overwrite = True
-            self.create_schema(_sample_json, staging_name, connector_id=connector_id, export_data=carol_data_storage,
+            self.create_schema(_schema_sample, staging_name, connector_id=connector_id, export_data=carol_data_storage,
                                crosswalk_list=crosswalk_auto_create, overwrite=overwrite, mdm_flexible=flexible_schema)
             _crosswalk = crosswalk_auto_create
             print('provided crosswalk ', _crosswalk)
 
-        if is_df and not force:
+        if not force:
             if _crosswalk is None:
                 schema = self.get_schema(staging_name, connector_id=connector_id)
                 _crosswalk = schema["mdmCrosswalkTemplate"]["mdmCrossreference"].values()
                 _crosswalk = list(_crosswalk)[0]
                 print('fetched crosswalk ', _crosswalk)
 
-            if data.duplicated(subset=_crosswalk).sum() >= 1:
-                raise Exception("crosswalk is not unique on data frame. set force=True to send it anyway.")
+            if is_df or isinstance(data, list):
+                # a single chunk, nothing to remember.
+                crosswalk_index = CrosswalkIndex(_crosswalk, drop_duplicates=drop_duplicates, max_seen=0)
+                data = crosswalk_index.filter(data)
+                data_size = len(data)
+            else:
+                crosswalk_index = CrosswalkIndex(_crosswalk, drop_duplicates=drop_duplicates,
+                                                 max_seen=crosswalk_window)
+                data = crosswalk_index.filter_chunks(data)
+            if crosswalk_index.dropped:
+                print(f'{crosswalk_index.dropped} records with duplicated crosswalk dropped')
 
         if not storage_only and not carol_sync:
             url = f'v2/staging/tables/{staging_name}&returnData=false&connectorId={connector_id}'
@@ -172,6 +251,15 @@ class Staging:
         else:
             url = f'v2/staging/intake/{staging_name}?returnData=false&connectorId={connector_id}'
         
+        if mode == 'cds_parquet':
+            return self._send_cds_parquet(staging_name, data, connector_id=connector_id, file_rows=file_rows,
+                                          max_workers=max_workers, process=process_cds, print_stats=print_stats)
+        elif mode != 'api':
+            raise ValueError(f"mode should be either 'api' or 'cds_parquet'. {mode} was given.")
+
+        if journal is not None and not isinstance(journal, SendJournal):
+            journal = SendJournal(journal)
+
         self.cont = 0
         if async_send:
             loop = asyncio.get_event_loop()
@@ -182,20 +270,118 @@ class Staging:
                                                                                 extra_headers=extra_headers,
                                                                                 content_type=content_type,
                                                                                 max_workers=max_workers,
-                                                                                compress_gzip=self.gzip))
+                                                                                compress_gzip=self.gzip,
+                                                                                batch_bytes=batch_bytes,
+                                                                                batch_bytes_compressed=batch_bytes_compressed,
+                                                                                codec=compression_codec,
+                                                                                compresslevel=compression_level,
+                                                                                compress_workers=compression_workers,
+                                                                                queue_size=queue_size,
+                                                                                print_stats=print_stats,
+                                                                                journal=journal))
             loop.run_until_complete(future)
 
         else:
+            def _send(data_json):
+                self.carol.call_api(url, data=data_json, extra_headers=extra_headers, content_type=content_type,
+                                    status_forcelist=[502, 429, 524, 408, 504, 598, 520, 503, 500],
+                                    method_whitelist=frozenset(['POST'])
+                                    )
+
+            sent = 0
             for data_json, cont in stream_data(data=data,
                                                step_size=step_size,
-                                               compress_gzip=self.gzip):
+                                               compress_gzip=self.gzip,
+                                               batch_bytes=batch_bytes,
+                                               batch_bytes_compressed=batch_bytes_compressed,
+                                               codec=compression_codec,
+                                               compresslevel=compression_level,
+                                               compress_workers=compression_workers):
+
+                if journal is None:
+                    _send(data_json)
+                else:
+                    journal.send(_send, data_json, offset=sent, count=cont - sent, url=url, headers=extra_headers)
+                sent = cont
+                if print_stats:
+                    print('{}/{} sent'.format(cont, data_size or '?'), end='\r')
 
-                self.carol.call_api(url, data=data_json, extra_headers=extra_headers, content_type=content_type,
+        if journal is not None and journal.failed:
+            warnings.warn(f'{journal.failed} records could not be sent. Their batches are in '
+                          f'{journal.dead_letter_path}. Send the same data with the same journal to retry only '
+                          f'them, or use `Staging.replay_dead_letters`.', UserWarning)
+
+    def _send_cds_parquet(self, staging_name, data, connector_id, file_rows=100000, max_workers=2, process=False,
+                          print_stats=True):
+        """
+        Write `data` as parquet files in the staging intake of CDS.
+
+        Files are named `YYYY-MM-DDTHH_mm_ss-<uuid>-<n>.parquet`, so the files of this send can be processed with
+        `file_pattern='YYYY-MM-DDTHH_mm_ss-<uuid>-*'`.
+        """
+        import os
+        import uuid
+        import tempfile
+        from datetime import datetime
+        import pandas as pd
+        from .utils.miscellaneous import _map_ordered
+
+        storage = Storage(self.carol)
+        prefix = f"{datetime.utcnow().strftime('%Y-%m-%dT%H_%M_%S')}-{uuid.uuid4().hex[:8]}"
+        storage_space_params = {'connector_id': connector_id, 'staging_type': staging_name}
+
+        def upload(item):
+            i, chunk = item
+            if isinstance(chunk, list):
+                chunk = pd.DataFrame(chunk)
+            file_name = f'{prefix}-{i:05d}.parquet'
+            fd, local_file = tempfile.mkstemp(suffix='.parquet')
+            os.close(fd)
+            try:
+                chunk.to_parquet(local_file, index=False)
+                storage.save(file_name, local_file, format='file', storage_space='staging_cds',
+                             storage_space_params=dict(storage_space_params))
+            finally:
+                os.remove(local_file)
+            return len(chunk)
+
+        cont = 0
+        for n_records in _map_ordered(upload, enumerate(iter_chunks(data, file_rows)), workers=max_workers):
+            cont += n_records
+            if print_stats:
+                print(f'{cont} records written to CDS', end='\r')
+
+        if process:
+            from .cds import CDSStaging
+            return CDSStaging(self.carol).process_data(staging_name, connector_id=connector_id,
+                                                       file_pattern=f'{prefix}-*')
+
+    def replay_dead_letters(self, journal):
+        """
+        Send again the batches of the dead-letter file of a journal.
+
+        Args:
+            journal: `str` or `pycarol.utils.send_journal.SendJournal`
+                Journal used in `send_data`.
+
+        Returns: `SendJournal`
+            The journal. `journal.failed` has the number of records that failed again.
+
+        """
+        if not isinstance(journal, SendJournal):
+            journal = SendJournal(journal)
+
+        dead_letters = list(journal.dead_letters())
+        journal.failed = 0
+        for entry in dead_letters:
+            def _send(data_json):
+                self.carol.call_api(entry['url'], data=data_json, extra_headers=entry['headers'], content_type=None,
                                     status_forcelist=[502, 429, 524, 408, 504, 598, 520, 503, 500],
                                     method_whitelist=frozenset(['POST'])
                                     )
-                if print_stats:
-                    print('{}/{} sent'.format(cont, data_size), end='\r')
+            journal.send(_send, entry['payload'], offset=entry['offset'], count=entry['count'],
+                         url=entry['url'], headers=entry['headers'])
+        return journal
 
     def get_schema(self, staging_name, connector_name=None, connector_id=None):
 
@@ -230,7 +416,7 @@ class Staging:
 
     def create_schema(self, fields_dict=None, staging_name=None, connector_id=None, connector_name=None,
                       mdm_flexible=False,  crosswalk_name=None, crosswalk_list=None, overwrite=False, auto_send=True,
-                      export_data=False, data=None):
+                      export_data=False, data=None, sample_size=1000):
         """
 
         Args:
@@ -254,8 +440,11 @@ class Staging:
                 Send the schema after creating.
             export_data: `bool`, default `False`
                 Export data to CDS for this staging. This is a manual export.
-            data: `json`, `list of dicts`, `pandas.DataFrame`, default `None`
-                Data to create schema from.
+            data: `json`, `list of dicts`, `pandas.DataFrame`, `pyarrow.Table`, default `None`
+                Data to create schema from. The schema of a data frame, a list or a table is inferred from the
+                column types and, for object columns such as nested dicts, from the first `sample_size` records.
+            sample_size: `int`, default `1000`
+                Number of records used to infer the schema.
 
         """
         import pandas as pd
@@ -277,14 +466,11 @@ class Staging:
         else:
             assert connector_id, f'connector_id or connector name should be set.'
 
-        if data is not None:
-            if isinstance(data, pd.DataFrame):
-                data = data.iloc[0].to_dict()
-
-        if isinstance(data, list):
-            data = data[0]
-
-        if isinstance(data, dict):
+        if isinstance(data, pd.DataFrame) or isinstance(data, list) or hasattr(data, 'schema'):
+            schema = carolSchemaGenerator.from_data(data, sample_size=sample_size)
+            schema = schema.to_dict(mdmStagingType=staging_name, mdmFlexible=mdm_flexible,
+                                    crosswalkname=crosswalk_name, crosswalkList=crosswalk_list)
+        elif isinstance(data, dict):
             schema = carolSchemaGenerator(data)
             schema = schema.to_dict(mdmStagingType=staging_name, mdmFlexible=mdm_flexible,
                                     crosswalkname=crosswalk_name, crosswalkList=crosswalk_list)
@@ -388,6 +574,87 @@ class Staging:
         if all(name in _sample_json for name in crosswalk):
             pass
 
+    def _parquet_columns(self, staging_name, connector_id, columns, meta_cols):
+        """Parquet column names to read and their mapping to the staging field names."""
+        if columns:
+            mapping_columns = columns
+            columns = [i.replace("-", "_") for i in columns]
+        else:
+            _staging = self.get_schema(staging_name=staging_name, connector_id=connector_id)
+            if not _staging:
+                raise ValueError(f"{staging_name} does not exist for connector ID {connector_id}")
+            mapping_columns = list(_staging['mdmStagingMapping']['properties'].keys())
+            columns = [i.replace("-", "_") for i in mapping_columns]
+
+        columns.extend(meta_cols)
+        mapping_columns = dict(zip([i.replace("-", "_") for i in columns], mapping_columns))
+        return columns, mapping_columns
+
+    def fetch_parquet_iter(self, staging_name, connector_id=None, connector_name=None, columns=None,
+                           return_metadata=False, file_pattern=None, filters=None, cache=False, prefetch=2,
+                           by_row_group=False, backend='pandas'):
+        """
+
+        Iterate over the parquet files of a staging table, without loading all of them in memory.
+
+        Args:
+            staging_name: `str`,
+                Staging name to fetch parquet of
+            connector_id: `str`, default `None`
+                Connector id to fetch parquet of
+            connector_name: `str`, default `None`
+                Connector name to fetch parquet of
+            columns: `list`, default `None`
+                List of columns to fetch.
+            return_metadata: `bool`, default `False`
+                To return or not the fields like ['mdmId', 'mdmCounterForEntity', etc.]
+            file_pattern: `str` default `None`
+                File pattern to filter data when fetching from CDS. e.g.
+                file_pattern='2019-11-25' will fetch only CDS files that start with `2019-11-25`.
+            filters: `list` or `pyarrow.compute.Expression`, default `None`
+                Row filters. See `fetch_parquet`.
+            cache: `bool` or `pycarol.utils.file_cache.FileCache`, default `False`
+                Keep the downloaded files in a local cache. See `fetch_parquet`.
+            prefetch: `int`, default `2`
+                Number of threads downloading the next files while the current one is processed.
+            by_row_group: `bool`, default `False`
+                Yield each row group of the files, instead of the whole file.
+            backend: ['pandas', 'arrow'], default `pandas`
+                Yield `pandas.DataFrame` or `pyarrow.Table`.
+
+        Returns: Generator of `pandas.DataFrame` or `pyarrow.Table`
+            The records are not merged, a record updated or deleted can be in more than one file. Use
+            `return_metadata=True` to get `mdmCounterForEntity` and `mdmDeleted`.
+
+        Usage:
+
+        .. code:: python
+
+            from pycarol import Carol, Staging
+            total = 0
+            for df in Staging(Carol()).fetch_parquet_iter('invoice', connector_name='erp'):
+                total += df['value'].sum()
+
+        """
+        if backend not in ('pandas', 'arrow'):
+            raise ValueError(f"Backend options are 'pandas','arrow' {backend} was given")
+
+        if connector_name:
+            connector_id = self._connector_by_name(connector_name)
+        else:
+            assert connector_id
+
+        _meta_cols = _CAROL_METADATA_STAGING if return_metadata else _NEEDED_FOR_MERGE
+        columns, mapping_columns = self._parquet_columns(staging_name, connector_id, columns, _meta_cols)
+
+        for d in _import_pandas_iter(Storage(self.carol), import_type='staging_cds', connector_id=connector_id,
+                                     staging_name=staging_name, columns=columns, mapping_columns=mapping_columns,
+                                     file_pattern=file_pattern, filters=filters, cache=cache, prefetch=prefetch,
+                                     by_row_group=by_row_group, to_pandas=backend == 'pandas'):
+            if not return_metadata:
+                d = _drop_metadata(d, _meta_cols)
+            yield d
+
     def _connector_by_name(self, connector_name):
         """
         Get connector id given connector name
@@ -402,7 +669,8 @@ class Staging:
     def fetch_parquet(self, staging_name, connector_id=None, connector_name=None, backend='pandas',
                       merge_records=True, return_dask_graph=False, columns=None, max_hits=None,
                       return_metadata=False, callback=None, cds=True, max_workers=None, file_pattern=None,
-                      return_callback_result=False):
+                      return_callback_result=False, filters=None, cache=False,
+                      incremental=False, snapshot=None, compact=False):
         """
 
         Fetch parquet from a staging table.
@@ -414,8 +682,9 @@ class Staging:
                 Connector id to fetch parquet of
             connector_name: `str`, default `None`
                 Connector name to fetch parquet of
-            backend: ['dask','pandas'], default `dask`
-                if to use either dask or pandas to fetch the data
+            backend: ['dask','pandas','arrow','polars'], default `pandas`
+                if to use either dask or pandas to fetch the data. `arrow` returns a `pyarrow.Table` and `polars` a
+                polars DataFrame, without converting the data to pandas. Callbacks are only used with `pandas`.
             merge_records: `bool`, default `True`
                 This will keep only the most recent record exported. Sometimes there are updates and/or deletions and
                 one should keep only the last records.
@@ -439,8 +708,29 @@ class Staging:
             return_callback_result `bool` default `False`
                 If a callback is used, it will return the result of the response of the callback. This will skip all the
                 operation to merge records and return selected columns.
-
-        Returns: `pandas.DataFrame`
+            filters: `list` or `pyarrow.compute.Expression`, default `None`
+                Row filters, e.g., `[('branch', '==', '01'), ('date', '>=', '2021-01-01')]`, or a list of these
+                lists for an OR of ANDs. Row groups whose statistics do not match are not downloaded. Filters are
+                applied before `merge_records`, so if the last version of a record does not match, an older version
+                that matches can be returned.
+            cache: `bool` or `pycarol.utils.file_cache.FileCache`, default `False`
+                Keep the downloaded files in a local cache, by bucket, name and generation, so the next fetches only
+                download new or changed files. `True` uses the default cache, of up to `PYCAROL_CDS_CACHE_SIZE` bytes
+                of disk. It is not used with `backend='dask'`.
+            incremental: `bool`, default `False`
+                Keep a local snapshot of the merged records in `snapshot` and, in the next calls, download only the
+                CDS files written after the last one merged into it. It is not available with `backend='dask'` and
+                always merges the records.
+            snapshot: `str`, default `None`
+                Path of the local parquet file used with `incremental=True`. A `<snapshot>.state.json` file keeps
+                the CDS files of the last second merged. Use a snapshot per data model/staging and set of `columns`,
+                `filters` and `file_pattern`.
+            compact: `bool`, default `False`
+                Reduce the memory of the returned DataFrame with `pycarol.utils.miscellaneous.compact_frame`, using
+                the field types to pick categoricals, downcast numbers and use Arrow backed strings. The memory before
+                and after is logged and kept in `d.attrs['memory_usage']`. It needs `backend='pandas'`.
+
+        Returns: `pandas.DataFrame`, `pyarrow.Table` or polars DataFrame
             DataFrame with the staging data.
 
         """
@@ -452,29 +742,31 @@ class Staging:
         if callback and not callable(callback):
             raise TypeError(f'"{callback}" object is not callable')
 
-        if backend not in ('dask','pandas'):
-            raise ValueError(f"Backend options are 'dask','pandas' {backend} was given")
+        if backend not in ('dask', 'pandas', 'arrow', 'polars'):
+            raise ValueError(f"Backend options are 'dask', 'pandas', 'arrow', 'polars' {backend} was given")
+
+        if callback and backend != 'pandas':
+            raise ValueError("`callback` is only available with `backend='pandas'`.")
+
+        if compact and backend != 'pandas':
+            raise ValueError("`compact=True` is only available with `backend='pandas'`.")
 
         if return_dask_graph and backend != 'dask':
             warnings.warn('`return_dask_graph` has no use when `backend!=dask`')
 
+        if incremental:
+            if snapshot is None:
+                raise ValueError('`snapshot` should be set when `incremental=True`.')
+            if backend == 'dask':
+                raise ValueError("`incremental=True` is not available with `backend='dask'`.")
+            merge_records = True
+
         if connector_name:
             connector_id = self._connector_by_name(connector_name)
         else:
             assert connector_id
 
-        if columns:
-            mapping_columns = columns
-            columns = [i.replace("-", "_") for i in columns]
-        else:
-            _staging = self.get_schema(staging_name=staging_name, connector_id=connector_id)
-            if not _staging:
-                raise ValueError(f"{staging_name} does not exist for connector ID {connector_id}")
-            mapping_columns = list(_staging['mdmStagingMapping']['properties'].keys())
-            columns = [i.replace("-", "_") for i in mapping_columns]
-
-        columns.extend(_meta_cols)
-        mapping_columns = dict(zip([i.replace("-", "_") for i in columns], mapping_columns))
+        columns, mapping_columns = self._parquet_columns(staging_name, connector_id, columns, _meta_cols)
 
         # validate export
         if not cds:
@@ -489,15 +781,18 @@ class Staging:
             d = _import_dask(storage=storage, connector_id=connector_id, staging_name=staging_name,
                              merge_records=merge_records, import_type=import_type, return_dask_graph=return_dask_graph,
                              mapping_columns=mapping_columns,
-                             columns=columns, max_hits=max_hits)
+                             columns=columns, max_hits=max_hits, filters=filters)
 
-        elif backend == 'pandas':
+        else:
             import pandas as pd
             d = _import_pandas(storage=storage, connector_id=connector_id, max_workers=max_workers,
                                token_carolina=token_carolina, storage_space=storage_space,
                                staging_name=staging_name, import_type=import_type,  columns=columns,
                                max_hits=max_hits, callback=callback, mapping_columns=mapping_columns,
-                               file_pattern=file_pattern)
+                               file_pattern=file_pattern,
+                               merge_records=merge_records and (backend != 'polars' or incremental),
+                               untie_field=_CAROL_METADATA_UNTIE_STAGING, filters=filters, cache=cache,
+                               snapshot=snapshot if incremental else None, to_pandas=backend == 'pandas')
 
             # TODO: Do the same for dask backend
             if d is None:
@@ -522,21 +817,30 @@ class Staging:
                 if columns:
                     columns = list(set(columns))
                     d = d[list(set(columns))]
-                return d.rename(columns=mapping_columns)
-        else:
-            raise ValueError(f'backend should be either "dask" or "pandas" you entered {backend}')
+                return _from_pandas(d.rename(columns=mapping_columns), backend)
 
         if (return_callback_result) and (callback is not None):
             return d
 
-        if merge_records:
+        if backend == 'polars':
+            d = import_polars().from_arrow(d)
+            if merge_records and not incremental:
+                d = drop_duplicated_parquet_polars(d, untie_field=_CAROL_METADATA_UNTIE_STAGING)
+
+        # pandas and arrow backends merge the records while downloading the files, unless a callback changed them.
+        elif merge_records and (backend == 'dask' or callback is not None):
             if (not return_dask_graph) or (backend == 'pandas'):
                 d = drop_duplicated_parquet(d, untie_field=_CAROL_METADATA_UNTIE_STAGING)
             else:
                 d = drop_duplicated_parquet_dask(d, untie_field=_CAROL_METADATA_UNTIE_STAGING)
 
         if not return_metadata:
-            to_drop = set(_meta_cols).intersection(set(d.columns))
-            d = d.drop(labels=to_drop, axis=1)
+            d = _drop_metadata(d, _meta_cols)
+
+        if compact:
+            properties = self.get_schema(staging_name=staging_name,
+                                         connector_id=connector_id)['mdmStagingMapping']['properties']
+            d = compact_frame(d, types={key: _SCHEMA_TYPES_MAPPING.get(value['type'], str)
+                                        for key, value in properties.items()})
 
         return d
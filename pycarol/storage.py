@@ -248,6 +248,25 @@ class Storage:
         """
         return self.backend.files_storage_list(prefix=prefix, print_paths=print_paths)
 
+    def open(self, name, storage_space, chunk_size=None):
+        """
+
+        Open a file of a storage space for reading, e.g., to read only some row groups of a parquet file.
+
+        Args:
+
+            name: `str`
+                Full name of the file, as given by the `get_*_file_paths` methods.
+            storage_space: `str`
+                Storage space of the file, e.g., `staging_cds`.
+            chunk_size: `int` default `None`
+                Minimum number of bytes of each request.
+
+        Returns: seekable file object.
+
+        """
+        return self.backend.open(name, storage_space=storage_space, chunk_size=chunk_size)
+
     def exists(self, name,  storage_space='app'):
         """
 
@@ -314,8 +333,9 @@ class Storage:
     def get_golden_rejected_cds_file_paths(self, dm_name, file_pattern=None):
         return self.backend.get_golden_rejected_cds_file_paths(dm_name, file_pattern=file_pattern)
 
-    def get_staging_cds_file_paths(self, staging_name, connector_id, file_pattern=None):
-        return self.backend.get_staging_cds_file_paths(staging_name, connector_id, file_pattern=file_pattern)
+    def get_staging_cds_file_paths(self, staging_name, connector_id, file_pattern=None, start_offset=None):
+        return self.backend.get_staging_cds_file_paths(staging_name, connector_id, file_pattern=file_pattern,
+                                                       start_offset=start_offset)
 
-    def get_golden_cds_file_paths(self, dm_name, file_pattern=None):
-        return self.backend.get_golden_cds_file_paths(dm_name, file_pattern=file_pattern)
+    def get_golden_cds_file_paths(self, dm_name, file_pattern=None, start_offset=None):
+        return self.backend.get_golden_cds_file_paths(dm_name, file_pattern=file_pattern, start_offset=start_offset)
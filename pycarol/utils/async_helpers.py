@@ -1,74 +1,109 @@
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import threading
+import time
 
 from ..carol import _retry_session
 from .miscellaneous import stream_data
 
 
-class AtomicCounter:
-    """An atomic, thread-safe incrementing counter.
+class SendStats:
+    """Thread-safe throughput stats of a send: records/s, MB/s and requests in flight.
 
     Args:
         initial: `int` default `0`
             Initial value for the counter.
         total: `int` default `None`
-            If exists, the max value that will be reached.
+            If exists, the number of records that will be sent.
 
     """
 
     def __init__(self, initial=0, total=None):
-        """Initialize a new atomic counter to given initial value.
-        """
         self.value = initial
         self.total = total
         self._lock = threading.Lock()
+        self.bytes_sent = 0
+        self.in_flight = 0
+        self.start_time = time.monotonic()
 
-    def increment(self, num=1):
-        """Atomically increment the counter by num (default 1) and return the
-        new value.
-        """
+    def start_request(self):
         with self._lock:
+            self.in_flight += 1
+
+    def finish_request(self, num, num_bytes):
+        with self._lock:
+            self.in_flight -= 1
             self.value += num
+            self.bytes_sent += num_bytes
             return self.value
 
     def print(self):
-        # Guarantee to print only one thread each time.
         with self._lock:
-            print(f'{self.value}/{self.total} sent', end='\r')
+            elapsed = max(time.monotonic() - self.start_time, 1e-9)
+            sent = f'{self.value}/{self.total}' if self.total is not None else f'{self.value}'
+            print(f'{sent} sent | {self.value / elapsed:,.0f} records/s | '
+                  f'{self.bytes_sent / elapsed / 1024 ** 2:,.2f} MB/s | {self.in_flight} in flight', end='\r')
 
 
-def send_a(carol, session, url, data_json, extra_headers, content_type, counter):
+def send_batch(carol, session, url, data_json, extra_headers, content_type, stats, n_records, print_stats=True,
+               journal=None, offset=None):
     """
-    Helper function to be used when sending data async.
+    Send one batch, updating the send stats.
 
     Args:
-        carol: requests.Session
+        carol: `pycarol.carol.Carol`.
             Carol object
         session: `requests.Session`
             Session object to handle multiple API calls.
         url: `str`
             end point to be called.
-        data_json: `dict`
+        data_json: `bytes`
             The json to be send.
         extra_headers: `dict`
             Extra headers to be used in the API call
         content_type: `dict`
             Content type of the call.
+        stats: `SendStats`
+            Stats of the send.
+        n_records: `int`
+            Number of records in `data_json`.
+        print_stats: `bool`, default `True`
+            Print the stats after sending.
+        journal: `SendJournal`, default `None`
+            If set, the batch is skipped if already acknowledged and saved as a dead letter if it fails.
+        offset: `int`, default `None`
+            Number of records before this batch. Used with `journal`.
         :return: None
     """
-    carol.call_api(url, data=data_json, extra_headers=extra_headers,
-                   content_type=content_type, session=session)
-
-    counter.increment(len(data_json))
-    counter.print()
+    def _send(payload):
+        carol.call_api(url, data=payload, extra_headers=extra_headers,
+                       content_type=content_type, session=session)
+
+    stats.start_request()
+    try:
+        if journal is None:
+            _send(data_json)
+        else:
+            journal.send(_send, data_json, offset=offset, count=n_records, url=url, headers=extra_headers)
+    except Exception:
+        stats.finish_request(0, 0)
+        raise
+    stats.finish_request(n_records, len(data_json))
+    if print_stats:
+        stats.print()
 
 
 async def send_data_asynchronous(carol, data, step_size, url, extra_headers,
-                                 content_type, max_workers, compress_gzip):
+                                 content_type, max_workers, compress_gzip, batch_bytes=None,
+                                 batch_bytes_compressed=False, codec='gzip', compresslevel=9,
+                                 compress_workers=None, queue_size=None, print_stats=True, journal=None):
     """
     Helper function to send data asynchronous.
 
+    Batches are serialized and compressed by a producer that runs in its own thread and feeds a queue of at most
+    `queue_size` batches, consumed by `max_workers` senders. Only the batches in the queue or in flight are kept in
+    memory.
+
     Args:
         carol: `pycarol.carol.Carol`.
             Carol object
@@ -86,26 +121,78 @@ async def send_data_asynchronous(carol, data, step_size, url, extra_headers,
             Max number of workers of the async job
         compress_gzip: 'bool'
             If to compress the data to send
-        :return:
+        batch_bytes: 'int', default `None`
+            If set, max size in bytes of each batch instead of `step_size` records.
+        batch_bytes_compressed: 'bool', default `False`
+            If `batch_bytes` is the limit of the compressed batch.
+        codec: 'str', default `gzip`
+            Compression codec, `gzip` or `zstd`.
+        compresslevel: 'int', default `9`
+            Compression level.
+        compress_workers: 'int', default `None`
+            Number of threads to compress the batches. If `None`, `max_workers` is used, so the
+            compression does not run in the event loop thread.
+        queue_size: 'int', default `None`
+            Max number of batches waiting to be sent. If `None`, `2 * max_workers`.
+        print_stats: 'bool', default `True`
+            Print records/s, MB/s and the number of requests in flight.
+        journal: `SendJournal`, default `None`
+            Journal to skip acknowledged batches and keep the failed ones.
+        :return: `SendStats`
     """
 
-    counter = AtomicCounter(total=len(data))
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        session = _retry_session(status_forcelist=[502, 429, 524, 408, 504, 598, 520, 503, 500],
-                                 method_whitelist=frozenset(['POST']))
-        # Set any session parameters here before calling `send_a`
-        loop = asyncio.get_event_loop()
-        tasks = [
-            loop.run_in_executor(
-                executor,
-                send_a,
-                *(carol, session, url, data_json, extra_headers, content_type, counter)
-                # Allows us to pass in multiple arguments to `send_a`
-            )
-            for data_json, _ in stream_data(data=data,
-                                            step_size=step_size,
-                                            compress_gzip=compress_gzip)
-        ]
-
-        for _ in await asyncio.gather(*tasks):
-            pass
+    queue_size = queue_size or 2 * max_workers
+    stats = SendStats(total=len(data) if hasattr(data, '__len__') else None)
+    queue = asyncio.Queue(maxsize=queue_size)
+    loop = asyncio.get_event_loop()
+    batches = stream_data(data=data,
+                          step_size=step_size,
+                          compress_gzip=compress_gzip,
+                          batch_bytes=batch_bytes,
+                          batch_bytes_compressed=batch_bytes_compressed,
+                          codec=codec,
+                          compresslevel=compresslevel,
+                          compress_workers=compress_workers or max_workers)
+    session = _retry_session(status_forcelist=[502, 429, 524, 408, 504, 598, 520, 503, 500],
+                             method_whitelist=frozenset(['POST']))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                ThreadPoolExecutor(max_workers=1) as producer_executor:
+
+            async def produce():
+                sent = 0
+                while True:
+                    batch = await loop.run_in_executor(producer_executor, next, batches, None)
+                    if batch is None:
+                        break
+                    data_json, cont = batch
+                    await queue.put((data_json, sent, cont - sent))
+                    sent = cont
+                for _ in range(max_workers):
+                    await queue.put(None)
+
+            async def consume():
+                while True:
+                    batch = await queue.get()
+                    if batch is None:
+                        return
+                    data_json, offset, n_records = batch
+                    await loop.run_in_executor(
+                        executor, send_batch,
+                        *(carol, session, url, data_json, extra_headers, content_type, stats, n_records, print_stats,
+                          journal, offset)
+                    )
+
+            tasks = [asyncio.ensure_future(produce())] + [asyncio.ensure_future(consume()) for _ in range(max_workers)]
+            try:
+                await asyncio.gather(*tasks)
+            except Exception:
+                for task in tasks:
+                    task.cancel()
+                raise
+    finally:
+        # stop the producer of the batches, e.g., its compression threads, if a send failed.
+        batches.close()
+
+    return stats
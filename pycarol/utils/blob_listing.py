@@ -0,0 +1,169 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_DEFAULT_TTL = 60
+_MAX_CHAR = '\U0010ffff'
+_MAX_ASCII = 0x7f
+
+_default_cache = None
+
+
+class ListingCache:
+    """Short lived cache of blob listings.
+
+    Listing a prefix with tens of thousands of blobs takes minutes, and `fetch_parquet` and the `get_*_file_paths`
+    methods list the same prefixes again and again. Listings are kept for `ttl` seconds. Writes and deletes done by
+    pycarol call `invalidate`, so our own writes are always listed. Writes done by Carol show up after the TTL.
+
+    Args:
+        ttl: `float`, default `None`
+            Seconds a listing is kept. If `None`, the `PYCAROL_LISTING_TTL` environment variable or 60. Use `0` to
+            disable the cache.
+
+    """
+
+    def __init__(self, ttl=None):
+        if ttl is None:
+            ttl = float(os.environ.get('PYCAROL_LISTING_TTL', _DEFAULT_TTL))
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls):
+        """Cache shared by the `Storage` objects."""
+        global _default_cache
+        if _default_cache is None:
+            _default_cache = cls()
+        return _default_cache
+
+    def get(self, bucket, prefix, start_offset=None):
+        """
+        Listed items of `prefix`, or `None` if it is not in the cache or it expired.
+        """
+        with self._lock:
+            entry = self._entries.get((bucket, prefix, start_offset))
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, bucket, prefix, start_offset, items):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[(bucket, prefix, start_offset)] = (time.monotonic(), list(items))
+
+    def invalidate(self, bucket, name=None):
+        """
+        Drop the listings of `bucket` that include the blob `name`, or all of them if `name` is `None`.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == bucket and (name is None or name.startswith(key[1])):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def list_blobs(listings, workers=8, page_size=1000, splits=8):
+    """
+    List blobs of several prefixes concurrently, yielding them in order as they are listed.
+
+    Each listing is split in key ranges: when a page is full, the rest of its range is split in up to `splits` ranges
+    of increasing size, listed in parallel. Blobs are yielded in the order of `listings` and, in each one, in
+    name order, so the consumer can start working on the first blobs while the others are listed.
+
+    Args:
+        listings: `list` of `tuple`
+            `(bucket, prefix, start_offset)` to list. `bucket` is a `google.cloud.storage.Bucket` and
+            `start_offset` can be `None`.
+        workers: `int`, default `8`
+            Number of concurrent list requests.
+        page_size: `int`, default `1000`
+            Blobs of each list request.
+        splits: `int`, default `8`
+            Ranges the rest of a listing is split in when a page is full.
+
+    Yields: `tuple`
+        Index of the listing in `listings` and the blob.
+    """
+    executor = ThreadPoolExecutor(max_workers=workers)
+    # set when the consumer stops, so the ranges still queued are not listed and do not spawn others.
+    stopped = threading.Event()
+
+    def list_range(bucket, prefix, start, end):
+        if stopped.is_set():
+            return [], []
+        blobs = list(bucket.list_blobs(prefix=prefix, start_offset=start, end_offset=end, max_results=page_size))
+        children = []
+        if len(blobs) == page_size and not stopped.is_set():
+            # `start_offset` is inclusive.
+            start = blobs[-1].name + '\x00'
+            keys = [start] + [key for key in _split_keys(blobs[0].name, blobs[-1].name, end, parts=splits)
+                              if key > start] + [end]
+            children = [executor.submit(list_range, bucket, prefix, a, b) for a, b in zip(keys, keys[1:])]
+        return blobs, children
+
+    try:
+        roots = []
+        for bucket, prefix, start_offset in listings:
+            # names out of the printable ASCII are rare, they are listed in a range of their own that is not split.
+            start = max(start_offset or prefix, prefix)
+            ascii_end = prefix + chr(_MAX_ASCII)
+            roots.append([executor.submit(list_range, bucket, prefix, start, ascii_end),
+                          executor.submit(list_range, bucket, prefix, max(start, ascii_end), prefix + _MAX_CHAR)])
+        for i, ranges in enumerate(roots):
+            # in-order walk of the ranges, they are disjoint and sorted.
+            stack = list(reversed(ranges))
+            while stack:
+                blobs, children = stack.pop().result()
+                for blob in blobs:
+                    yield i, blob
+                stack.extend(reversed(children))
+    finally:
+        stopped.set()
+        if sys.version_info >= (3, 9):
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            executor.shutdown(wait=False)
+
+
+def _split_keys(first, last, end, parts):
+    """
+    Keys after `last` and before `end` to split the rest of a listing in `parts` ranges.
+
+    Names are read as base 128 numbers. The ranges double in size, starting with the size of the one from `first` to
+    `last`, so they have about as many names as the page if the next names are as dense as the ones listed, and
+    about the same number of requests if they are sparse. The last range, up to `end`, takes all the rest.
+    """
+    width = max(len(first), len(last))
+
+    def to_int(key):
+        key = key[:width].ljust(width, '\x00')
+        value = 0
+        for char in key:
+            value = value * 128 + min(ord(char), _MAX_ASCII)
+        return value
+
+    def to_key(value):
+        chars = []
+        for _ in range(width):
+            value, char = divmod(value, 128)
+            chars.append(chr(char))
+        return ''.join(reversed(chars)).rstrip('\x00')
+
+    low, high, step = to_int(last), to_int(end), max(to_int(last) - to_int(first), 1)
+    keys = []
+    for i in range(1, parts):
+        value = low + (2 ** i - 1) * step
+        if value >= high or value >= 128 ** width:
+            break
+        key = to_key(value)
+        if last < key < end and (not keys or keys[-1] < key):
+            keys.append(key)
+    return keys
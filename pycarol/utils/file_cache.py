@@ -0,0 +1,178 @@
+import hashlib
+import os
+import threading
+import uuid
+
+from .. import __TEMP_STORAGE__
+
+_DEFAULT_MAX_SIZE = 5 * 1024 ** 3
+# eviction goes below the max size, so the cache is not scanned again on the next put.
+_EVICT_RATIO = 0.9
+
+
+_default_cache = None
+
+
+class FileCache:
+    """Size bounded local cache of CDS files.
+
+    CDS parquet files are immutable once written, so a file is identified by its bucket, name and generation. A new
+    generation of the same name is a different entry and the old one is evicted when the cache is full. The least
+    recently used files are removed first.
+
+    A file can be evicted by another thread or process right after `get` returns its path. Readers should use
+    `open`, which returns the file already opened, or `None` as a miss.
+
+    Args:
+        path: `str`, default `None`
+            Cache folder. If `None`, `cds_parquet` inside the pycarol temp storage.
+        max_size: `int`, default `None`
+            Max size of the cache in bytes. If `None`, the `PYCAROL_CDS_CACHE_SIZE` environment variable or 5GB.
+
+    Usage:
+
+    .. code:: python
+
+        from pycarol.utils.file_cache import FileCache
+        cache = FileCache(max_size=20 * 1024 ** 3)
+        df = DataModel(Carol()).fetch_parquet('invoice', cache=cache)
+        print(cache.stats())
+
+    """
+
+    def __init__(self, path=None, max_size=None):
+        self.path = path or os.path.join(__TEMP_STORAGE__, 'cds_parquet')
+        if max_size is None:
+            max_size = int(os.environ.get('PYCAROL_CDS_CACHE_SIZE', _DEFAULT_MAX_SIZE))
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._files())
+
+    @classmethod
+    def default(cls):
+        """Cache shared by the `fetch_parquet` calls that do not give one."""
+        global _default_cache
+        if _default_cache is None:
+            _default_cache = cls()
+        return _default_cache
+
+    @staticmethod
+    def key(bucket, name, generation):
+        return hashlib.sha1(f'{bucket}/{name}#{generation}'.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Path of the cached file, or `None` if it is not in the cache.
+        """
+        file_path = os.path.join(self.path, key)
+        try:
+            # the modification time is the last use, for the LRU.
+            os.utime(file_path, None)
+            size = os.path.getsize(file_path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += size
+        return file_path
+
+    def open(self, key):
+        """
+        Cached file opened for reading, or `None` if it is not in the cache.
+
+        The open file can still be read if it is evicted while it is read.
+        """
+        file_path = os.path.join(self.path, key)
+        try:
+            file = open(file_path, 'rb')
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(file_path, None)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += os.fstat(file.fileno()).st_size
+        return file
+
+    def put(self, key, data):
+        """
+        Save `data` (`bytes`) in the cache and evict the least recently used files over `max_size`.
+
+        Returns: `str`
+            Path of the cached file.
+        """
+        file_path = os.path.join(self.path, key)
+        tmp_path = f'{file_path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        try:
+            replaced = os.path.getsize(file_path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, file_path)
+        with self._lock:
+            self._size += len(data) - replaced
+            full = self._size > self.max_size
+        if full:
+            self._evict(keep=file_path)
+        return file_path
+
+    def stats(self):
+        """
+        Hits, misses, bytes not downloaded because of hits and the current size of the cache.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'bytes_saved': self.bytes_saved,
+                'size': sum(size for _, size, _ in self._files())}
+
+    def clear(self):
+        with self._lock:
+            for file_path, _, _ in self._files():
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+            self._size = 0
+
+    def _files(self):
+        files = []
+        for entry in os.scandir(self.path):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # removed by another process.
+                    continue
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _evict(self, keep=None):
+        with self._lock:
+            # other processes can share the folder, so the size is taken again from the files.
+            files = sorted(self._files(), key=lambda f: f[2])
+            size = sum(f[1] for f in files)
+            for file_path, file_size, _ in files:
+                if size <= self.max_size * _EVICT_RATIO:
+                    break
+                if file_path == keep:
+                    continue
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    # e.g., open on Windows.
+                    continue
+                size -= file_size
+            self._size = size
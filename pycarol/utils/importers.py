@@ -1,11 +1,19 @@
-import multiprocessing
 import functools
+import os
 import warnings
 import gzip
 import json
+import re
 
 from tqdm import tqdm
 
+from .miscellaneous import _map_ordered, concat_tables, RecordMerger, import_polars
+from .file_cache import FileCache
+
+_FOOTER_CHUNK_SIZE = 256 * 1024
+# CDS files are named `YYYY-MM-DDTHH_mm_ss...`.
+_CDS_FILE_TIMESTAMP = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}_\d{2}_\d{2}')
+
 __STAGING_FIELDS = ['mdmCounterForEntity', 'mdmId']
 __DM_FIELDS = ['mdmCounterForEntity', 'mdmId']
 
@@ -14,8 +22,11 @@ def _import_dask(
         storage, merge_records=False,
         dm_name=None, import_type='staging', return_dask_graph=False,
         connector_id=None, staging_name=None, view_name=None, columns=None,
-        max_hits=None, mapping_columns=None, engine='pyarrow', file_pattern=None,
+        max_hits=None, mapping_columns=None, engine='pyarrow', file_pattern=None, filters=None,
 ):
+    """
+    Read the parquet files of a storage space with dask.
+    """
     file_pattern = file_pattern if file_pattern else ''
     from dask import dataframe as dd
     mapping_columns = mapping_columns or {}  # dask does not accepet None. Need to send a valid mapping.
@@ -52,7 +63,8 @@ def _import_dask(
                        '`golden_rejected`')
 
     url = url + file_pattern + "*.parquet"
-    d = dd.read_parquet(url, storage_options=storage.get_dask_options(), columns=columns, engine=engine)
+    d = dd.read_parquet(url, storage_options=storage.get_dask_options(), columns=columns, engine=engine,
+                        filters=_parquet_filters(filters))
     d = d.rename(columns=mapping_columns)
     if return_dask_graph:
         return d
@@ -62,7 +74,29 @@ def _import_dask(
 
 def _import_pandas(storage, dm_name=None, connector_id=None, columns=None, mapping_columns=None, max_workers=None,
                    staging_name=None, view_name=None, import_type='staging', golden=False, max_hits=None, callback=None,
-                   token_carolina=None, storage_space=None, file_pattern=None):
+                   token_carolina=None, storage_space=None, file_pattern=None, merge_records=False,
+                   untie_field='mdmCounterForEntity', filters=None, cache=None, snapshot=None, to_pandas=True):
+    """
+    Download the parquet files of a storage space as a `pandas.DataFrame`.
+
+    With `merge_records=True` (and no `callback`), files are merged by `mdmId` while they are downloaded, keeping
+    only the last record of each `mdmId` by `untie_field`, without the deleted ones. See `RecordMerger`.
+
+    `filters` are given to `pyarrow.parquet.read_table`. The files are then read with ranged requests and the row
+    groups whose statistics do not match the filters are not downloaded.
+
+    `cache` is a `FileCache`, or `True` for the default one. Files already in the cache with the same generation are
+    not downloaded again.
+
+    With `max_hits` (and no `filters`), the row counts are read from the parquet footers first and only the files,
+    and the row groups of the last one, with the first `max_hits` rows are downloaded.
+
+    `snapshot` is the path of a local parquet file with the records merged in the last call. Only the CDS files
+    written after the last second merged into it, and the ones of that second not merged yet, are downloaded,
+    merged into it and the snapshot is updated.
+
+    With `to_pandas=False`, a `pyarrow.Table` is returned.
+    """
     import pandas as pd
 
     if callback is not None and not callable(callback):
@@ -73,85 +107,330 @@ def _import_pandas(storage, dm_name=None, connector_id=None, columns=None, mappi
         columns += __DM_FIELDS
         columns = list(set(columns))
 
+    start_offset = None
+    if snapshot is not None:
+        if import_type not in ('staging_cds', 'golden_cds'):
+            raise ValueError('`snapshot` can only be used with `staging_cds` and `golden_cds`.')
+        if callback is not None or max_hits is not None:
+            raise ValueError('`snapshot` can not be used with `callback` or `max_hits`.')
+        merge_records = True
+        snapshot_options = {'columns': sorted(columns) if columns else None, 'filters': repr(filters),
+                            'untie_field': untie_field, 'file_pattern': file_pattern}
+        snapshot_state = _snapshot_state(snapshot, snapshot_options)
+        if snapshot_state is not None:
+            start_offset = snapshot_state['start_offset']
+
+    file_paths = _list_files(storage, import_type, dm_name=dm_name, connector_id=connector_id,
+                             staging_name=staging_name, view_name=view_name, file_pattern=file_pattern,
+                             start_offset=start_offset)
+
+    if max_workers is not None:
+        assert max_workers > 0, f"max_workers must be greater than zero, you passed {max_workers}"
+    else:
+        max_workers = 1
+
+    if cache is True:
+        cache = FileCache.default()
+    download = functools.partial(_read_file, storage=storage, columns=columns, mapping_columns=mapping_columns,
+                                 to_pandas=callback is not None, filters=_parquet_filters(filters),
+                                 cache=cache or None)
+
+    if max_hits is not None and filters is None:
+        file_paths = _max_hits_plan(file_paths, storage, cache or None, max_hits, workers=max_workers)
+
+    merge_records = merge_records and callback is None
+    merger = RecordMerger(untie_field=untie_field) if merge_records else None
+    if start_offset is not None:
+        # the files of the last second merged are listed again, the ones already merged are skipped.
+        merged_files = snapshot_state['files']
+        file_paths = (file for file in file_paths
+                      if file['name'] not in merged_files or merged_files[file['name']] != file.get('generation'))
+        import pyarrow.parquet as pq
+        merger.add(pq.read_table(snapshot))
+
+    # The files are downloaded while they are listed, the names are kept for the snapshot.
+    listed = {}
+
+    def _listed(files):
+        for file in files:
+            listed[file['name']] = file.get('generation')
+            yield file
+
+    file_paths = _listed(file_paths)
+    results = []
+    count = 0
+    # Files are downloaded in a thread pool, keeping the order, and read as Arrow tables.
+    for result in tqdm(_map_ordered(download, file_paths, workers=max_workers)):
+        if callback:
+            result = callback(result)
+
+        stop = False
+        if max_hits is not None:
+            count_old = count
+            count += len(result)
+            if count >= max_hits:
+                result = result[:max_hits - count_old]
+                stop = True
+
+        if merger is not None:
+            merger.add(result)
+        else:
+            results.append(result)
+        if stop:
+            break
+
+    if merger is not None:
+        merged = merger.result()
+        results = [merged] if merged is not None else []
+        if snapshot is not None and listed:
+            if start_offset is not None:
+                listed = dict(snapshot_state['files'], **listed)
+            _save_snapshot(snapshot, merged, listed, snapshot_options)
+    if not results:
+        return None
+    if callback:
+        return pd.concat(results, ignore_index=True, sort=True)
+    table = results[0] if merge_records else concat_tables(results)
+    return table.to_pandas() if to_pandas else table
+
+
+def _import_pandas_iter(storage, import_type, dm_name=None, connector_id=None, staging_name=None,
+                        view_name=None, columns=None, mapping_columns=None, file_pattern=None, filters=None,
+                        cache=None, prefetch=2, by_row_group=False, to_pandas=True):
+    """
+    Yield the parquet files of a storage space one by one, as `pandas.DataFrame` or `pyarrow.Table`.
+
+    The next `prefetch` files are downloaded in background threads while the current one is consumed. With
+    `by_row_group=True`, each row group of a file is yielded, so only one row group is decoded at a time. Records are
+    not merged.
+    """
+    import pyarrow.parquet as pq
+
+    if by_row_group and filters is not None:
+        raise ValueError('`filters` can not be used with `by_row_group=True`.')
+
+    if columns:
+        columns = list(set(columns) | set(__DM_FIELDS))
+    if cache is True:
+        cache = FileCache.default()
+    cache = cache or None
+
+    file_paths = _list_files(storage, import_type, dm_name=dm_name, connector_id=connector_id,
+                             staging_name=staging_name, view_name=view_name, file_pattern=file_pattern)
+
+    if by_row_group:
+        def download(file):
+            return _cached_file(file, cache) or _download_file(file, storage, cache)
+
+        for source in _map_ordered(download, file_paths, workers=prefetch):
+            with source:
+                parquet_file = pq.ParquetFile(source)
+                for i in range(parquet_file.num_row_groups):
+                    table = _rename_columns(parquet_file.read_row_group(i, columns=columns), mapping_columns)
+                    yield table.to_pandas() if to_pandas else table
+        return
+
+    download = functools.partial(_read_file, storage=storage, columns=columns, mapping_columns=mapping_columns,
+                                 to_pandas=to_pandas, filters=_parquet_filters(filters), cache=cache)
+    yield from _map_ordered(download, file_paths, workers=prefetch)
+
+
+def _from_pandas(d, backend):
+    """Convert a `pandas.DataFrame` to the type returned by `backend`."""
+    if backend == 'arrow':
+        import pyarrow as pa
+        return pa.Table.from_pandas(d, preserve_index=False)
+    if backend == 'polars':
+        return import_polars().from_pandas(d)
+    return d
+
+
+def _drop_metadata(d, meta_cols):
+    """Drop the metadata columns of a `pandas.DataFrame`, a `pyarrow.Table` or a polars DataFrame."""
+    if hasattr(d, 'column_names'):
+        return d.select([name for name in d.column_names if name not in meta_cols])
+    to_drop = [name for name in d.columns if name in meta_cols]
+    if hasattr(d, 'lazy'):
+        # polars
+        return d.drop(to_drop)
+    return d.drop(columns=to_drop)
+
+
+def _read_file(file, storage, columns=None, mapping_columns=None, to_pandas=False, filters=None, cache=None):
+    """Download a parquet file from CDS and read it as a `pyarrow.Table`."""
+    import pyarrow.parquet as pq
+
+    if not file['name'].endswith('.parquet'):
+        raise ValueError('Supported files are `parquet`')
+
+    row_groups = file.get('row_groups')
+    source = _cached_file(file, cache)
+    if source is None and (filters is not None or row_groups is not None):
+        # only the footer and the row groups that can match the filters, or the ones asked, are downloaded.
+        with storage.open(file['name'], storage_space=file['storage_space']) as buffer:
+            table = _read_parquet(buffer, columns, filters, row_groups)
+    else:
+        if source is None:
+            source = _download_file(file, storage, cache)
+        with source:
+            table = _read_parquet(source, columns, filters, row_groups)
+
+    table = _rename_columns(table, mapping_columns)
+    if to_pandas:
+        return table.to_pandas()
+    return table
+
+
+def _read_parquet(source, columns, filters, row_groups):
+    import pyarrow.parquet as pq
+
+    if row_groups is None:
+        return pq.read_table(source, columns=columns, filters=filters)
+    return pq.ParquetFile(source).read_row_groups(row_groups, columns=columns)
+
+
+def _read_metadata(file, storage, cache=None):
+    """Parquet footer of `file`, read from the cache or with a ranged request."""
+    import pyarrow.parquet as pq
+
+    source = _cached_file(file, cache)
+    if source is not None:
+        with source:
+            return pq.read_metadata(source)
+    with storage.open(file['name'], storage_space=file['storage_space'], chunk_size=_FOOTER_CHUNK_SIZE) as buffer:
+        return pq.read_metadata(buffer)
+
+
+def _max_hits_plan(file_paths, storage, cache, max_hits, workers=None):
+    """
+    Files with the first `max_hits` rows, by the row counts in their footers.
+
+    The last file gets the `row_groups` needed, if not all of them. Footers are read in `workers` threads, and the
+    files are yielded as soon as they are known to be needed.
+    """
+    def read(file):
+        return file, _read_metadata(file, storage, cache)
+
+    count = 0
+    for file, metadata in _map_ordered(read, file_paths, workers=workers):
+        if metadata.num_rows == 0:
+            continue
+        if count + metadata.num_rows < max_hits:
+            count += metadata.num_rows
+            yield file
+            continue
+
+        row_groups = []
+        for i in range(metadata.num_row_groups):
+            row_groups.append(i)
+            count += metadata.row_group(i).num_rows
+            if count >= max_hits:
+                break
+        yield file if len(row_groups) == metadata.num_row_groups else dict(file, row_groups=row_groups)
+        return
+
+
+def _cached_file(file, cache):
+    """`file` opened from the cache, or `None`. It is opened, so it is still read if it is evicted meanwhile."""
+    if cache is None or file.get('generation') is None:
+        return None
+    return cache.open(cache.key(file.get('bucket', file['storage_space']), file['name'], file['generation']))
+
+
+def _download_file(file, storage, cache=None):
+    """Download `file` to a buffer, saving it in the cache."""
+    buffer = storage.load(file['name'], format='raw', cache=False, storage_space=file['storage_space'])
+    if cache is not None and file.get('generation') is not None:
+        cache.put(cache.key(file.get('bucket', file['storage_space']), file['name'], file['generation']),
+                  buffer.getvalue())
+    buffer.seek(0)
+    return buffer
+
+
+def _rename_columns(table, mapping_columns):
+    if mapping_columns is not None:
+        # fix columns names (we replace `-` for `_` due to parquet limitations.
+        table = table.rename_columns([mapping_columns.get(name, name) for name in table.column_names])
+    return table
+
+
+def _list_files(storage, import_type, dm_name=None, connector_id=None, staging_name=None, view_name=None,
+                file_pattern=None, start_offset=None):
+    """Parquet files of a storage space, as given by the `get_*_file_paths` methods of `Storage`."""
     if import_type == 'golden':
-        file_paths = storage.get_golden_file_paths(dm_name=dm_name)
+        return storage.get_golden_file_paths(dm_name=dm_name)
     elif import_type == 'staging':
-        file_paths = storage.get_staging_file_paths(staging_name=staging_name, connector_id=connector_id)
+        return storage.get_staging_file_paths(staging_name=staging_name, connector_id=connector_id)
     elif import_type == 'view':
-        file_paths = storage.get_view_file_paths(view_name=view_name)
+        return storage.get_view_file_paths(view_name=view_name)
     elif import_type == 'staging_cds':
-        file_paths = storage.get_staging_cds_file_paths(staging_name=staging_name, connector_id=connector_id,
-                                                        file_pattern=file_pattern)
+        return storage.get_staging_cds_file_paths(staging_name=staging_name, connector_id=connector_id,
+                                                        file_pattern=file_pattern, start_offset=start_offset)
     elif import_type == 'golden_cds':
-        file_paths = storage.get_golden_cds_file_paths(dm_name=dm_name,
-                                                       file_pattern=file_pattern)
+        return storage.get_golden_cds_file_paths(dm_name=dm_name,
+                                                       file_pattern=file_pattern, start_offset=start_offset)
     elif import_type == 'view_cds':
-        file_paths = storage.get_view_cds_file_paths(dm_name=view_name)
+        return storage.get_view_cds_file_paths(dm_name=view_name)
     elif import_type == 'golden_rejected':
-        file_paths = storage.get_golden_rejected_cds_file_paths(dm_name=dm_name, file_pattern=file_pattern)
+        return storage.get_golden_rejected_cds_file_paths(dm_name=dm_name, file_pattern=file_pattern)
     else:
         raise KeyError('import_type should be `golden`,`staging`, `view`, `staging_cds`, `golden_cds`, `view_cds`',
                        'golden_rejected')
 
-    df_list = []
-    count = 0
 
-    if max_workers is not None:
-        assert max_workers > 0, f"max_workers must be greater than zero, you passed {max_workers}"
-    else:
-        max_workers = 1
+def _parquet_filters(filters):
+    """
+    Use the parquet column names (`-` is replaced by `_`) in filters in the `[(column, op, value), ...]` form.
 
-    if max_workers > 1:
-        client = _load_client(token_carolina)
-        if max_hits:
-            warnings.warn("max_hits does not work when max_hits>1", DeprecationWarning)
-        partial_download = functools.partial(_download_files, storage=client, storage_space=storage_space,
-                                             columns=columns,
-                                             mapping_columns=mapping_columns, callback=callback)
-        with multiprocessing.Pool(processes=max_workers) as pool:
-            df_list = pool.map(partial_download, file_paths)
-    else:
-        for i, file in enumerate(tqdm(list(file_paths))):  # need list to be able to track the counts.
-            buffer = storage.load(file['name'], format='raw', cache=False, storage_space=file['storage_space'])
-            if file['name'].endswith('.parquet'):
-                result = pd.read_parquet(buffer, columns=columns)
-            else:
-                ValueError('Supported files are `parquet`')
-
-            if mapping_columns is not None:
-                # fix columns names (we replace `-` for `_` due to parquet limitations.
-                result.rename(columns=mapping_columns, inplace=True)
-            if callback:
-                result = callback(result)
-
-            df_list.append(result)
-            if max_hits is not None:
-                count_old = count
-                count += len(df_list[i])
-                if count >= max_hits:
-                    df_list[i] = df_list[i].iloc[:max_hits - count_old]
-                    break
-    if not df_list:
+    Filters given as `pyarrow.compute.Expression` are returned as they are.
+    """
+    if not isinstance(filters, list):
+        return filters
+
+    def _fix(condition):
+        if isinstance(condition, tuple):
+            return (condition[0].replace('-', '_'),) + tuple(condition[1:])
+        return [_fix(c) for c in condition]
+
+    return [_fix(c) for c in filters]
+
+
+def _snapshot_state(snapshot, options):
+    """
+    Listing offset and files of the last second merged in the snapshot, or `None` if it must be built from scratch.
+    """
+    state_path = snapshot + '.state.json'
+    if not (os.path.isfile(snapshot) and os.path.isfile(state_path)):
+        return None
+    with open(state_path, 'r') as file:
+        state = json.load(file)
+    if state.get('options') != options or 'files' not in state:
+        warnings.warn(f'{snapshot} was created with other columns, filters or file pattern. It will be created again.',
+                      UserWarning)
         return None
-    return pd.concat(df_list, ignore_index=True, sort=True)
+    return state
 
 
-def _download_files(file, storage, storage_space, columns, mapping_columns, callback):
-    import pandas as pd
-    filename = storage_space + '/' + file['name']
-    buffer = storage.open(filename)
-    if file['name'].endswith('.parquet'):
-        result = pd.read_parquet(buffer, columns=columns)
-    else:
-        ValueError('Supported files are `parquet`')
-    if mapping_columns is not None:
-        result.rename(columns=mapping_columns, inplace=True)
-    if callback:
-        result = callback(result)
-    return result
+def _snapshot_offset(name):
+    """`name` up to the second it was written, so files written in the same second are listed again."""
+    folder, _, file_name = name.rpartition('/')
+    match = _CDS_FILE_TIMESTAMP.match(file_name)
+    if match is None:
+        return name
+    return name[:len(folder) + 1 + match.end()] if folder else match.group()
+
 
+def _save_snapshot(snapshot, table, files, options):
+    """Save the merged records and the files of the last second merged, `{name: generation}` of `files`."""
+    import pyarrow.parquet as pq
 
-def _load_client(token):
-    import gcsfs
-    client = gcsfs.GCSFileSystem(token=token)
-    return client
+    start_offset = _snapshot_offset(max(files))
+    state = {'start_offset': start_offset, 'files': {name: generation for name, generation in files.items()
+                                                     if name >= start_offset},
+             'options': options}
+    # the snapshot and its state are replaced only after both are written.
+    pq.write_table(table, snapshot + '.tmp')
+    with open(snapshot + '.state.json.tmp', 'w') as file:
+        json.dump(state, file)
+    os.replace(snapshot + '.tmp', snapshot)
+    os.replace(snapshot + '.state.json.tmp', snapshot + '.state.json')
@@ -1,32 +1,46 @@
 import json
+import datetime
+import functools
 import gzip, io, zipfile, os
-from collections import defaultdict
+import logging
+import math
+import warnings
+from collections import defaultdict, deque
 from pathlib import Path
 _FILE_MARKER = '<files>'
 
+logger = logging.getLogger(__name__)
 
-def drop_duplicated_parquet_dask(d, untie_field='mdmCounterForEntity'):
+
+def drop_duplicated_parquet_dask(d, untie_field='mdmCounterForEntity', npartitions=None):
     """
     Merge updates and delete records from the parquet files in CDS.
 
+    The records are hash partitioned by `mdmId` with a shuffle, so all the versions of a `mdmId` are in the same
+    partition, and each partition keeps the last one. As in `drop_duplicated_parquet`, ties in `untie_field` are won
+    by the record that comes last in `d`.
+
     Args:
         d: dask DataFrame
         untie_field: str
-            Field to be used to untie records with the same `mdmId`. 
+            Field to be used to untie records with the same `mdmId`. It can be the index of `d`.
+        npartitions: int
+            Number of partitions after the shuffle. If `None`, the ones of `d`.
 
     Returns:
         dask DataFrame
 
     """
-
+    if d.index.name == untie_field:
+        d = d.reset_index()
     if untie_field not in d.columns:
         #Use the standard one. 
         untie_field = 'mdmCounterForEntity'
 
-
-    d = d.set_index(untie_field, ) \
-        .drop_duplicates(subset='mdmId', keep='last') \
-        .reset_index()
+    # position of each record in `d`, to untie after the shuffle.
+    d = d.map_partitions(_tag_positions)
+    d = d.shuffle('mdmId', npartitions=npartitions or d.npartitions)
+    d = d.map_partitions(_keep_last_versions, untie_field)
     if 'mdmDeleted' in d.columns:
         d['mdmDeleted'] = d['mdmDeleted'].fillna(False)
         d = d[~d['mdmDeleted']]
@@ -34,6 +48,20 @@ def drop_duplicated_parquet_dask(d, untie_field='mdmCounterForEntity'):
     return d
 
 
+def _tag_positions(df, partition_info=None):
+    """Add the partition number and the row of each record, as `_partition` and `_row`."""
+    import numpy as np
+
+    partition = partition_info['number'] if partition_info else 0
+    return df.assign(_partition=partition, _row=np.arange(len(df)))
+
+
+def _keep_last_versions(df, untie_field):
+    """Last version of each `mdmId` in a partition tagged by `_tag_positions`."""
+    df = df.sort_values([untie_field, '_partition', '_row'], kind='stable')
+    return df.drop_duplicates(subset='mdmId', keep='last').drop(columns=['_partition', '_row'])
+
+
 def drop_duplicated_parquet(d, untie_field='mdmCounterForEntity'):
     """
     Merge updates and delete records from the parquet files in CDS.
@@ -60,23 +88,395 @@ def drop_duplicated_parquet(d, untie_field='mdmCounterForEntity'):
     return d
 
 
+def drop_duplicated_parquet_polars(d, untie_field='mdmCounterForEntity'):
+    """
+    Merge updates and delete records from the parquet files in CDS.
+
+    Args:
+        d: polars DataFrame or LazyFrame
+        untie_field: str
+            Field to be used to untie records with the same `mdmId`.
+
+    Returns:
+        polars DataFrame or LazyFrame, the same type of `d`.
+
+    """
+    pl = import_polars()
+
+    # the schema of a LazyFrame, without resolving it through `LazyFrame.columns`.
+    columns = d.collect_schema().names()
+    if untie_field not in columns:
+        untie_field = 'mdmCounterForEntity'
+
+    lazy = d.lazy().sort(untie_field, maintain_order=True) \
+        .unique(subset=['mdmId'], keep='last', maintain_order=True)
+    if 'mdmDeleted' in columns:
+        lazy = lazy.filter(~pl.col('mdmDeleted').fill_null(False))
+    return lazy if isinstance(d, pl.LazyFrame) else lazy.collect()
+
+
+def import_polars():
+    try:
+        import polars
+    except ImportError:
+        raise ImportError("`backend='polars'` needs the polars package. Use `pip install polars`.")
+    return polars
+
+
+class RecordMerger:
+    """
+    Incremental keep-last merge of CDS records by `mdmId`.
+
+    Tables are added one file at a time. Pending rows are merged with the current winners as soon as they are as many
+    as the winners, so the memory used is about the size of the merged result instead of all the files, and only the
+    key columns are sorted, with `pyarrow.compute`.
+
+    Args:
+        untie_field: `str`, default `mdmCounterForEntity`
+            Field to be used to untie records with the same `mdmId`. The last one wins.
+        min_rows: `int`, default `100000`
+            Minimum number of pending rows before merging them.
+
+    Usage:
+
+    .. code:: python
+
+        merger = RecordMerger(untie_field='mdmCounterForEntity')
+        for table in tables:
+            merger.add(table)
+        df = merger.result().to_pandas()
+
+    """
+
+    def __init__(self, untie_field='mdmCounterForEntity', min_rows=100000):
+        self.untie_field = untie_field
+        self.min_rows = min_rows
+        self._table = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def add(self, table):
+        """Add a `pyarrow.Table` with the records of a file."""
+        self._pending.append(table)
+        self._pending_rows += table.num_rows
+        winners = self._table.num_rows if self._table is not None else 0
+        if self._pending_rows >= max(winners, self.min_rows):
+            self._merge()
+
+    def result(self):
+        """
+        Winning record of each `mdmId`, sorted by the untie field, without the deleted ones.
+
+        Returns: `pyarrow.Table` or `None` if no table was added.
+        """
+        import pyarrow.compute as pc
+
+        self._merge()
+        table = self._table
+        if table is not None and 'mdmDeleted' in table.column_names:
+            # tombstones are kept up to the end, since they must win over older records of other files.
+            table = table.filter(pc.invert(pc.fill_null(table['mdmDeleted'], False)))
+        return table
+
+    def _merge(self):
+        if not self._pending:
+            return
+
+        tables = [self._table] + self._pending if self._table is not None else self._pending
+        table = concat_tables(tables)
+        self._pending = []
+        self._pending_rows = 0
+
+        import numpy as np
+        import pyarrow.compute as pc
+
+        if table.num_rows == 0:
+            self._table = table
+            return
+
+        untie_field = self.untie_field if self.untie_field in table.column_names else 'mdmCounterForEntity'
+        # stable sorts, so for the same untie value the record of the last file wins.
+        order = pc.sort_indices(table, sort_keys=[(untie_field, 'ascending')])
+        ids = pc.take(table['mdmId'], order)
+        by_id = pc.sort_indices(ids)
+        ids = pc.take(ids, by_id)
+        # the untie order is kept inside each mdmId, so the winner is the last one of its run.
+        is_last = pc.fill_null(pc.not_equal(ids[1:], ids[:-1]), True).to_numpy(zero_copy_only=False)
+        winners = np.sort(by_id.to_numpy()[np.append(is_last, True)])
+        self._table = table.take(pc.take(order, winners))
+
+
+def concat_tables(tables):
+    """Concatenate `pyarrow.Table`s with different columns, as `pd.concat(sort=True)` does."""
+    import pyarrow as pa
+
+    try:
+        table = pa.concat_tables(tables, promote_options='permissive')
+    except TypeError:
+        # pyarrow < 14
+        table = pa.concat_tables(tables, promote=True)
+    return table.select(sorted(table.column_names))
+
+
+def compact_frame(d, types=None, max_category_ratio=0.5):
+    """
+    Reduce the memory of a DataFrame fetched from Carol.
+
+    Low cardinality strings become categoricals, the other strings Arrow backed strings, integers are downcast to
+    the smallest signed type that holds them and floats to `float32` when no value changes. Columns with other objects,
+    e.g., nested fields, are kept.
+
+    Args:
+        d: `pandas.DataFrame`
+            DataFrame to compact.
+        types: `dict`, default `None`
+            Python type of each column, e.g., `{'total': float}`, as in `_DATA_MODEL_TYPES_MAPPING`. Columns not
+            in it are compacted by their dtype.
+        max_category_ratio: `float`, default `0.5`
+            Strings with less unique values than this fraction of the rows become categoricals.
+
+    Returns: `pandas.DataFrame`
+        Compacted DataFrame. `d.attrs['memory_usage']` has the bytes before and after.
+
+    """
+    types = types or {}
+    before = int(d.memory_usage(deep=True).sum())
+    d = d.copy()
+    for column in d.columns:
+        d[column] = _compact_series(d[column], types.get(column), max_category_ratio)
+
+    after = int(d.memory_usage(deep=True).sum())
+    d.attrs['memory_usage'] = {'before': before, 'after': after}
+    logger.info('compact: %.2f MB -> %.2f MB', before / 1024 ** 2, after / 1024 ** 2)
+    return d
+
+
+def _compact_series(s, python_type, max_category_ratio):
+    import pandas as pd
+
+    if isinstance(s.dtype, pd.CategoricalDtype) or len(s) == 0:
+        return s
+
+    if python_type in (int, float) and (s.dtype == object or pd.api.types.is_string_dtype(s.dtype)):
+        converted = pd.to_numeric(s, errors='coerce')
+        if converted.isna().sum() == s.isna().sum():
+            s = converted
+
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return s
+    if python_type is bool and s.dtype == object:
+        if pd.api.types.infer_dtype(s, skipna=True) == 'boolean':
+            return s.astype('boolean')
+        return s
+
+    if pd.api.types.is_integer_dtype(s.dtype):
+        # only signed types, `a - b` of unsigned columns would wrap around.
+        return pd.to_numeric(s, downcast='integer')
+
+    if pd.api.types.is_float_dtype(s.dtype):
+        if python_type is int and s.notna().all() and (s % 1 == 0).all():
+            return pd.to_numeric(s.astype('int64'), downcast='integer')
+        s32 = s.astype('float32')
+        if (s32.astype(s.dtype) == s)[s.notna()].all():
+            return s32
+        return s
+
+    if s.dtype == object or pd.api.types.is_string_dtype(s.dtype):
+        if pd.api.types.infer_dtype(s, skipna=True) not in ('string', 'empty'):
+            return s
+        if s.nunique(dropna=True) <= max_category_ratio * len(s):
+            return s.astype('category')
+        return s.astype('string[pyarrow]')
+
+    return s
+
+
+class CrosswalkIndex:
+    """
+    Incremental uniqueness check of the crosswalk of the records sent to a staging table.
+
+    Crosswalk values are hashed column-wise with `pandas.util.hash_array` and the hashes of the records
+    already seen are kept, so the check works across the chunks of a stream without keeping the records. Values are
+    hashed by their text, with integral floats as integers, so `1`, `1.0` (e.g., an int column with `NaN`) and `'1'`
+    are the same crosswalk, as they are for Carol.
+
+    Args:
+        crosswalk: `list`
+            Crosswalk fields.
+        drop_duplicates: `bool`, default `False`
+            If `True`, records with a repeated crosswalk are dropped keeping the last one. Otherwise an exception
+            is raised.
+        max_seen: `int`, default `None`
+            About how many hashes of the previous chunks are kept, the ones of the most recent chunks. If `None` all
+            of them are kept. Use `0` to check each chunk only against itself, in constant memory.
+
+    """
+
+    def __init__(self, crosswalk, drop_duplicates=False, max_seen=None):
+        self.crosswalk = list(crosswalk)
+        self.drop_duplicates = drop_duplicates
+        self.max_seen = max_seen
+        self.dropped = 0
+        # hash -> number of the last chunk it was seen in, and the hashes of the chunks in the window.
+        self._seen = {}
+        self._chunks = deque()
+        self._chunk_number = 0
+        self._window_size = 0
+
+    def hashes(self, data):
+        """Hash of the crosswalk of each record of `data`, a `pandas.DataFrame` or a `list of dict`."""
+        import pandas as pd
+        if isinstance(data, list):
+            data = pd.DataFrame([[record.get(field) for field in self.crosswalk] for record in data],
+                                columns=self.crosswalk)
+        import numpy as np
+
+        hashes = np.zeros(len(data), dtype=np.uint64)
+        for field in self.crosswalk:
+            hashes = hashes * np.uint64(1099511628211) ^ _crosswalk_hashes(data[field])
+        return hashes
+
+    def filter(self, data):
+        """
+        Check `data` against itself and the records seen before.
+
+        With `drop_duplicates=True`, it returns `data` without the repeated records inside it, keeping the last
+        one. A record repeating one of a previous chunk is kept, since it updates the record already sent.
+        """
+        import pandas as pd
+        hashes = self.hashes(data)
+        repeated = pd.Series(hashes).duplicated(keep='last').values
+        if self.drop_duplicates:
+            if repeated.any():
+                self.dropped += int(repeated.sum())
+                keep = ~repeated
+                data = [r for r, k in zip(data, keep) if k] if isinstance(data, list) else data[keep]
+                hashes = hashes[keep]
+        elif repeated.any() or not self._seen.keys().isdisjoint(hashes.tolist()):
+            raise Exception("crosswalk is not unique on data frame. set force=True to send it anyway.")
+
+        self._remember(hashes.tolist())
+        return data
+
+    def _remember(self, hashes):
+        if self.max_seen == 0:
+            return
+        self._chunk_number += 1
+        self._seen.update(dict.fromkeys(hashes, self._chunk_number))
+        if self.max_seen is None:
+            return
+        self._chunks.append((self._chunk_number, hashes))
+        self._window_size += len(hashes)
+        # the oldest chunks leave the window, the hashes seen again in a newer chunk are kept.
+        while self._window_size > self.max_seen and len(self._chunks) > 1:
+            number, old = self._chunks.popleft()
+            self._window_size -= len(old)
+            for value in old:
+                if self._seen.get(value) == number:
+                    del self._seen[value]
+
+    def filter_chunks(self, chunks):
+        """Lazy `filter` of each chunk of a stream."""
+        for chunk in chunks:
+            chunk = self.filter(chunk)
+            if len(chunk):
+                yield chunk
+
+
+def _crosswalk_hashes(series):
+    """
+    Hash of each crosswalk value of `series`.
+
+    Integers, integral floats and their text, e.g., `1`, `1.0` and `'1'`, are hashed as the same integer. Other values
+    are hashed by their text and missing values as `None`.
+    """
+    import numpy as np
+    import pandas as pd
+
+    kind = series.dtype.kind if isinstance(series.dtype, np.dtype) else None
+    if kind in ('i', 'u'):
+        return pd.util.hash_array(series.values.astype(np.int64), categorize=False)
+
+    missing = series.isna().values
+    integers = np.zeros(len(series), dtype=np.int64)
+    is_integer = np.zeros(len(series), dtype=bool)
+    if kind == 'f':
+        values = series.values
+        with np.errstate(invalid='ignore'):
+            is_integer = ~missing & (np.floor(values) == values) & (np.abs(values) < 2 ** 53)
+        integers[is_integer] = values[is_integer]
+        # formatting floats is slow, only the ones with decimals are formatted.
+        text = np.empty(len(series), dtype=object)
+        decimals = ~is_integer & ~missing
+        text[decimals] = series[decimals].astype(str).values
+    else:
+        text = series.astype(str)
+        if series.dtype == object:
+            # integral floats mixed with other types, only the values whose text ends with `.0` are checked.
+            for i in np.flatnonzero(text.str.endswith('.0').values & ~missing):
+                value = series.iat[i]
+                if isinstance(value, (float, np.floating)) and float(value).is_integer():
+                    text.iat[i] = str(int(value))
+        is_integer = ~missing & text.str.fullmatch(r'-?(?:0|[1-9][0-9]{0,17})').fillna(False).values.astype(bool)
+        text = text.values
+        integers[is_integer] = text[is_integer].astype(np.int64)
+
+    others = ~is_integer & ~missing
+    hashes = np.empty(len(series), dtype=np.uint64)
+    hashes[is_integer] = pd.util.hash_array(integers[is_integer], categorize=False)
+    hashes[others] = pd.util.hash_array(text[others].astype(object), categorize=False)
+    hashes[missing] = pd.util.hash_array(np.array([None], dtype=object), categorize=False)[0]
+    return hashes
+
+
 class NumpyEncoder(json.JSONEncoder):
     """ Special json encoder for numpy types """
 
     def default(self, obj):
         import numpy as np
-        if isinstance(obj, (np.int_, np.intc, np.intp, np.int8,
-                            np.int16, np.int32, np.int64, np.uint8,
-                            np.uint16, np.uint32, np.uint64)):
+        if isinstance(obj, np.integer):
             return int(obj)
-        elif isinstance(obj, (np.float_, np.float16, np.float32,
-                              np.float64)):
-            return float(obj)
+        elif isinstance(obj, np.floating):
+            return float(obj) if np.isfinite(obj) else None
+        elif isinstance(obj, np.bool_):
+            return bool(obj)
         elif isinstance(obj, (np.ndarray,)):
             return obj.tolist()
+        elif isinstance(obj, np.datetime64):
+            return None if np.isnat(obj) else str(obj)
+        elif isinstance(obj, (datetime.datetime, datetime.date)):
+            # NaT is a datetime and it is the only one not equal to itself.
+            return None if obj != obj else obj.isoformat()
         return json.JSONEncoder.default(self, obj)
 
 
+def _dumps_json(obj):
+    """
+    `json.dumps` with `NumpyEncoder`, writing NaN and infinities as `null` as `DataFrame.to_json` does.
+
+    Python floats and `np.float64` never reach `NumpyEncoder.default`, so they are replaced before encoding, only
+    when there is one.
+    """
+    try:
+        return json.dumps(obj, cls=NumpyEncoder, allow_nan=False)
+    except ValueError:
+        return json.dumps(_finite(obj), cls=NumpyEncoder, allow_nan=False)
+
+
+def _finite(obj):
+    """Copy of `obj` with the NaN and infinite floats in its dicts and lists as `None`."""
+    import numpy as np
+    if isinstance(obj, (float, np.floating)):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if isinstance(obj, np.ndarray):
+        return _finite(obj.tolist())
+    return obj
+
+
 def _attach_path(branch, trunk):
     '''
     Insert a branch of directories on its trunk.
@@ -123,54 +523,260 @@ def ranges(min_v, max_v, nb):
     return step
 
 
-def stream_data(data, step_size, compress_gzip):
+def stream_data(data, step_size, compress_gzip, batch_bytes=None, batch_bytes_compressed=False,
+                codec='gzip', compresslevel=9, compress_workers=None):
     """
 
-    :param data:  `pandas.DataFrame` or `list of dict`,
-        Data to be sliced.
+    :param data:  `pandas.DataFrame`, `list of dict` or an iterable accepted by `iter_chunks`,
+        Data to be sliced. Iterables are read as the batches are consumed.
     :param step_size: 'int'
         Number of records per slice.
     :param compress_gzip: 'bool'
         If to compress the data to send
+    :param batch_bytes: 'int', default `None`
+        If set, records are packed in batches of at most `batch_bytes` bytes instead of `step_size` records.
+    :param batch_bytes_compressed: 'bool', default `False`
+        If `batch_bytes` is the limit of the compressed batch instead of the json one.
+    :param codec: 'str', default `gzip`
+        Compression codec, `gzip` or `zstd`.
+    :param compresslevel: 'int', default `9`
+        Compression level.
+    :param compress_workers: 'int', default `None`
+        If greater than 1, batches are compressed in a thread pool while the previous ones are consumed.
     :return: Generator, cont
-        Return a slice of `data` and the count of records until that moment.
+        Return a slice of `data`, encoded as json bytes (compressed if `compress_gzip`), and the count of
+        records until that moment. Each slice is serialized only once, so it should be sent as the raw request
+        body.
     """
-    if isinstance(data, list):
-        is_df = False
+    if not compress_gzip:
+        batches = _json_batches(data, step_size, batch_bytes)
+    elif batch_bytes is not None and batch_bytes_compressed:
+        compress = functools.partial(compress_payload, codec=codec, compresslevel=compresslevel)
+        batches = _compressed_batches_by_size(_encode_records(data, step_size), batch_bytes, compress,
+                                              workers=compress_workers)
     else:
-        import pandas as pd
-        if isinstance(data, pd.DataFrame):
-            is_df = True
+        compress = functools.partial(compress_payload, codec=codec, compresslevel=compresslevel)
+        batches = _map_ordered(lambda batch: (compress(batch[0]), batch[1]),
+                               _json_batches(data, step_size, batch_bytes), workers=compress_workers)
 
-    data_size = len(data)
     cont = 0
-    for i in range(0, data_size, step_size):
-        if is_df:
-            data_to_send = data.iloc[i:i + step_size]
-            cont += len(data_to_send)
-            # print('Sending {}/{}'.format(cont, data_size), end='\r')
-            data_to_send = data_to_send.to_json(orient='records', date_format='iso', lines=False)
-            if compress_gzip:
-                out = io.BytesIO()
-                with gzip.GzipFile(fileobj=out, mode="w", compresslevel=9) as f:
-                    f.write(data_to_send.encode('utf-8'))
-                yield out.getvalue(), cont
-            else:
-                yield json.loads(data_to_send), cont
-        else:
-            data_to_send = data[i:i + step_size]
-            cont += len(data_to_send)
-            # print('Sending {}/{}'.format(cont, data_size), end='\r')
-            if compress_gzip:
-                out = io.BytesIO()
-                with gzip.GzipFile(fileobj=out, mode="w", compresslevel=9) as f:
-                    f.write(json.dumps(data_to_send, cls=NumpyEncoder).encode('utf-8'))
-                yield out.getvalue(), cont
-            else:
-                yield data_to_send, cont
+    for data_to_send, count in batches:
+        cont += count
+        yield data_to_send, cont
     return None, None
 
 
+def compress_payload(data, codec='gzip', compresslevel=9):
+    """
+    Compress a request body.
+
+    :param data: `bytes`
+        Data to compress.
+    :param codec: `str`, default `gzip`
+        `gzip` or `zstd`. `zstd` needs the `zstandard` package.
+    :param compresslevel: `int`, default `9`
+        Compression level. From 1 to 9 for gzip and from 1 to 22 for zstd.
+    :return: `bytes`
+    """
+    if codec == 'gzip':
+        return _gzip_bytes(data, compresslevel=compresslevel)
+    elif codec == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("`codec='zstd'` needs the zstandard package. Use `pip install zstandard`.")
+        return zstandard.ZstdCompressor(level=compresslevel).compress(data)
+    raise ValueError(f"codec should be either 'gzip' or 'zstd'. {codec} was given.")
+
+
+def _gzip_bytes(data, compresslevel=9):
+    out = io.BytesIO()
+    # mtime=0 so the same batch always gives the same payload.
+    with gzip.GzipFile(fileobj=out, mode="w", compresslevel=compresslevel, mtime=0) as f:
+        f.write(data)
+    return out.getvalue()
+
+
+def _map_ordered(func, iterable, workers=None):
+    """
+    Lazy `map` that runs `func` in a thread pool of `workers` threads, keeping the order of `iterable`.
+
+    At most `2 * workers` items are processed ahead of the consumer. If the consumer stops, the items not started
+    yet are cancelled.
+    """
+    if not workers or workers <= 1:
+        yield from map(func, iterable)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in iterable:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def read_data_file(path, step_size=500):
+    """
+    Read a CSV or Parquet file in chunks, without loading it all in memory.
+
+    :param path: `str` or `os.PathLike`
+        Path of a `.csv` or `.parquet` file.
+    :param step_size: `int`, default `500`
+        Number of records per chunk.
+    :return: Generator of `pandas.DataFrame`
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == '.parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=step_size):
+            yield batch.to_pandas()
+    elif suffix == '.csv':
+        import pandas as pd
+        with pd.read_csv(path, chunksize=step_size) as reader:
+            yield from reader
+    else:
+        raise ValueError(f'Only `.csv` and `.parquet` files are supported. {path} was given.')
+
+
+def is_data_file(data):
+    """If `data` is the path of a file that can be read by `read_data_file`."""
+    return isinstance(data, (str, os.PathLike)) and Path(data).suffix.lower() in ('.csv', '.parquet')
+
+
+def iter_chunks(data, step_size):
+    """
+    Yield `data` in chunks of at most `step_size` records.
+
+    :param data: `pandas.DataFrame`, `list of dict`, `pyarrow.Table` or any iterable of dicts, lists of dicts,
+        DataFrames or `pyarrow.RecordBatch`, e.g., a `pyarrow.RecordBatchReader` or a generator.
+    :param step_size: `int`
+        Max number of records per chunk.
+    :return: Generator of `list of dict` or `pandas.DataFrame`
+        Iterables are consumed lazily, only one chunk is kept in memory.
+    """
+    if isinstance(data, list):
+        for i in range(0, len(data), step_size):
+            yield data[i:i + step_size]
+        return
+    if hasattr(data, 'iloc'):
+        for i in range(0, len(data), step_size):
+            yield data.iloc[i:i + step_size]
+        return
+    if hasattr(data, 'to_batches'):
+        data = data.to_batches(max_chunksize=step_size)
+
+    records = []
+    for item in data:
+        if isinstance(item, dict):
+            records.append(item)
+            if len(records) == step_size:
+                yield records
+                records = []
+            continue
+
+        if records:
+            yield records
+            records = []
+        if hasattr(item, 'to_pandas'):
+            item = item.to_pandas()
+        yield from iter_chunks(item, step_size)
+    if records:
+        yield records
+
+
+def _encode_records(data, step_size):
+    """Yield each record of `data` encoded as json bytes.
+
+    DataFrames are encoded `step_size` rows at a time with `to_json(lines=True)`.
+    """
+    for chunk in iter_chunks(data, step_size):
+        if isinstance(chunk, list):
+            for record in chunk:
+                yield _dumps_json(record).encode('utf-8')
+            continue
+
+        lines = chunk.to_json(orient='records', date_format='iso', lines=True)
+        # `to_json` escapes line breaks inside values, so "\n" only splits records.
+        for line in lines.split('\n'):
+            if line:
+                yield line.encode('utf-8')
+
+
+def _json_batches(data, step_size, batch_bytes=None):
+    """
+    Yield each batch of `data` as a json array (bytes) with its number of records.
+
+    DataFrames are encoded by `DataFrame.to_json`, a column-wise C encoder that writes NaN and NaT as `null` and
+    handles the numpy dtypes. Lists of dicts are encoded with `NumpyEncoder`, NaN and infinities as `null` too.
+    """
+    if batch_bytes is not None:
+        yield from _pack_records(_encode_records(data, step_size), batch_bytes)
+        return
+
+    for chunk in iter_chunks(data, step_size):
+        if isinstance(chunk, list):
+            yield _dumps_json(chunk).encode('utf-8'), len(chunk)
+        else:
+            yield chunk.to_json(orient='records', date_format='iso', lines=False).encode('utf-8'), len(chunk)
+
+
+def _pack_records(parts, batch_bytes, ratio=lambda: 1.0):
+    """
+    Pack encoded records greedily in json arrays of at most `batch_bytes / ratio()` bytes.
+
+    A record larger than the limit is sent alone.
+    """
+    batch, size = [], 2  # 2 bytes for the brackets.
+    for part in parts:
+        limit = batch_bytes / ratio()
+        if batch and size + len(part) + 1 > limit:
+            yield b'[' + b','.join(batch) + b']', len(batch)
+            batch, size = [], 2
+
+        if len(part) + 2 > batch_bytes:
+            warnings.warn(f'There is a record of {len(part)} bytes. It is larger than `batch_bytes` and it will '
+                          f'be sent alone.', UserWarning)
+        batch.append(part)
+        size += len(part) + 1
+
+    if batch:
+        yield b'[' + b','.join(batch) + b']', len(batch)
+
+
+def _compressed_batches_by_size(parts, batch_bytes, compress, workers=None):
+    """
+    Pack records so each compressed batch has at most `batch_bytes` bytes.
+
+    Records are packed up to the limit divided by the compression ratio of the last batch compressed, and batches
+    whose compressed size is over the limit are split in two. With `workers`, batches are compressed in a thread
+    pool, so the ratio used to pack a batch can be the one of a few batches before.
+    """
+    ratio = 1.0
+
+    def _compress(body, count):
+        nonlocal ratio
+        payload = compress(body)
+        ratio = max(len(payload) / len(body), 0.01)
+        if len(payload) > batch_bytes and count > 1:
+            records = json.loads(body)
+            half = count // 2
+            return [batch for split in (records[:half], records[half:])
+                    for batch in _compress(json.dumps(split).encode('utf-8'), len(split))]
+        return [(payload, count)]
+
+    batches = _pack_records(parts, batch_bytes, ratio=lambda: ratio)
+    for payloads in _map_ordered(lambda batch: _compress(*batch), batches, workers=workers):
+        yield from payloads
+
+
 class Hashabledict(dict):
     def __hash__(self):
         return hash(frozenset(self))
@@ -0,0 +1,127 @@
+import base64
+import hashlib
+import json
+from pathlib import Path
+import threading
+
+
+class SendJournal:
+    """Local journal of the batches sent to Carol.
+
+    Each batch is identified by its offset (number of records before it) and a digest of its payload. Acknowledged
+    batches are appended to the journal file, so sending the same data again with the same journal skips them.
+    Batches that fail after all the retries are appended to a dead-letter file, `<path>.dead`, to be replayed later.
+
+    Args:
+        path: `str`
+            Path of the journal file. It is created if it does not exist.
+
+    Usage:
+
+    .. code:: python
+
+        from pycarol import Carol, Staging
+        stag = Staging(Carol())
+        stag.send_data('my_staging', data=df, connector_name='my_connector', journal='my_staging.journal')
+        # If some batches fail, running it again sends only the batches not acknowledged.
+        stag.send_data('my_staging', data=df, connector_name='my_connector', journal='my_staging.journal')
+
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.dead_letter_path = self.path.with_name(self.path.name + '.dead')
+        self._lock = threading.Lock()
+        self._acked = {}
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+
+        if self.path.is_file():
+            with open(self.path, 'r', encoding='utf8') as file:
+                for line in file:
+                    entry = json.loads(line)
+                    if entry['status'] == 'ok':
+                        self._acked[entry['offset']] = entry['digest']
+
+    @staticmethod
+    def digest(payload):
+        return hashlib.sha1(payload).hexdigest()
+
+    def is_acked(self, offset, digest):
+        return self._acked.get(offset) == digest
+
+    def send(self, send, payload, offset, count, **context):
+        """
+        Send a batch with `send(payload)`, unless it was already acknowledged.
+
+        Args:
+            send: `callable`
+                Function that sends the payload. It should raise if the batch was not accepted.
+            payload: `bytes`
+                Batch to send.
+            offset: `int`
+                Number of records before this batch.
+            count: `int`
+                Number of records in this batch.
+            context: `dict`
+                Information needed to replay the batch, e.g., `url` and `headers`. It is saved in the dead-letter
+                file if the batch fails.
+
+        Returns: `bool`
+            `False` if the batch failed and was sent to the dead-letter file.
+        """
+        digest = self.digest(payload)
+        if self.is_acked(offset, digest):
+            with self._lock:
+                self.skipped += count
+            return True
+
+        try:
+            send(payload)
+        except Exception as e:
+            self._dead_letter(offset, count, digest, payload, error=str(e), **context)
+            return False
+
+        self._write(self.path, {'offset': offset, 'count': count, 'digest': digest, 'status': 'ok'})
+        with self._lock:
+            self._acked[offset] = digest
+            self.sent += count
+        return True
+
+    def dead_letters(self):
+        """
+        Batches in the dead-letter file that were not acknowledged yet.
+
+        Yields: `dict`
+            The batch `offset`, `count`, `payload` and the saved context.
+        """
+        if not self.dead_letter_path.is_file():
+            return
+
+        # A batch replayed and failed again is appended twice, keep the last entry.
+        entries = {}
+        with open(self.dead_letter_path, 'r', encoding='utf8') as file:
+            for line in file:
+                entry = json.loads(line)
+                entries[(entry['offset'], entry['digest'])] = entry
+
+        for (offset, digest), entry in entries.items():
+            if self.is_acked(offset, digest):
+                continue
+            entry['payload'] = base64.b64decode(entry['payload'])
+            yield entry
+
+    def _dead_letter(self, offset, count, digest, payload, error, **context):
+        entry = {'offset': offset, 'count': count, 'digest': digest, 'status': 'failed', 'error': error}
+        self._write(self.path, entry)
+        entry = dict(entry, payload=base64.b64encode(payload).decode('ascii'), **context)
+        self._write(self.dead_letter_path, entry)
+        with self._lock:
+            self.failed += count
+
+    def _write(self, path, entry):
+        with self._lock:
+            with open(path, 'a', encoding='utf8') as file:
+                file.write(json.dumps(entry))
+                file.write('\n')
@@ -0,0 +1,134 @@
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from google.api_core.exceptions import PreconditionFailed
+from google.cloud.storage.retry import DEFAULT_RETRY
+
+# GCS composes at most 32 objects per request.
+_MAX_COMPOSE = 32
+_MIN_SLICE_SIZE = 8 * 1024 ** 2
+# each slice is held in memory while it is transferred.
+_MAX_SLICE_SIZE = 64 * 1024 ** 2
+
+
+def sliced_threshold():
+    """Size, in bytes, from which blobs are transferred in slices. `PYCAROL_SLICED_THRESHOLD`, default 256MB."""
+    return int(os.environ.get('PYCAROL_SLICED_THRESHOLD', 256 * 1024 ** 2))
+
+
+def sliced_workers():
+    """Parallel requests of a sliced transfer. `PYCAROL_SLICED_WORKERS`, default 8."""
+    return int(os.environ.get('PYCAROL_SLICED_WORKERS', 8))
+
+
+def _slices(size, workers):
+    slice_size = min(max(-(-size // workers), _MIN_SLICE_SIZE), _MAX_SLICE_SIZE)
+    return [(start, min(start + slice_size, size)) for start in range(0, size, slice_size)]
+
+
+def download_sliced(blob, file_name, size, generation=None, workers=None):
+    """
+    Download `blob` as parallel byte ranges into `file_name`.
+
+    The file is allocated with its final size and each range is written in place, so the ranges are never held in
+    memory together.
+
+    Args:
+        blob: `google.cloud.storage.Blob`
+            Blob to download.
+        file_name: `str`
+            Local file. It is overwritten.
+        size: `int`
+            Size of the blob.
+        generation: `int`, default `None`
+            If given, every range is read from this generation, so a blob replaced during the download fails with
+            `PreconditionFailed` instead of mixing generations.
+        workers: `int`, default `None`
+            Parallel range requests. If `None`, `sliced_workers()`.
+    """
+    workers = workers or sliced_workers()
+    tmp_file_name = f'{file_name}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_file_name, 'wb') as file:
+        file.truncate(size)
+
+    def download(byte_range):
+        start, end = byte_range
+        # `end` is inclusive.
+        data = blob.download_as_bytes(start=start, end=end - 1, if_generation_match=generation)
+        with open(tmp_file_name, 'r+b') as file:
+            file.seek(start)
+            file.write(data)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(download, _slices(size, workers)))
+    except BaseException:
+        os.remove(tmp_file_name)
+        raise
+    os.replace(tmp_file_name, file_name)
+
+
+def upload_composite(bucket, blob, file_name, workers=None):
+    """
+    Upload `file_name` as parallel parts composed server-side into `blob`.
+
+    The parts are temporary blobs next to `blob`. They are uploaded only if they do not exist, so they can be
+    retried, and all of them, including the ones whose upload failed, are deleted after the compose or if the upload
+    fails.
+
+    Args:
+        bucket: `google.cloud.storage.Bucket`
+            Bucket of `blob`.
+        blob: `google.cloud.storage.Blob`
+            Destination blob. Its properties, e.g., `generation`, are updated by the compose.
+        file_name: `str`
+            Local file to upload.
+        workers: `int`, default `None`
+            Parallel part uploads. If `None`, `sliced_workers()`.
+    """
+    workers = workers or sliced_workers()
+    prefix = f'{blob.name}.part-{uuid.uuid4().hex}-'
+    parts = []
+
+    def upload(part, start, end):
+        with open(file_name, 'rb') as file:
+            file.seek(start)
+            data = file.read(end - start)
+        try:
+            part.upload_from_string(data, if_generation_match=0, retry=DEFAULT_RETRY)
+        except PreconditionFailed:
+            # a retry of an upload that reached the server, the part names are unique.
+            pass
+
+    try:
+        sources = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for i, (start, end) in enumerate(_slices(os.path.getsize(file_name), workers)):
+                part = bucket.blob(f'{prefix}{i:05d}')
+                # recorded before its upload, so it is deleted even if the upload fails.
+                parts.append(part)
+                sources.append(part)
+                futures.append(executor.submit(upload, part, start, end))
+        for future in futures:
+            future.result()
+
+        level = 0
+        while len(sources) > _MAX_COMPOSE:
+            # compose in a tree, the intermediate blobs are deleted with the parts.
+            level += 1
+            groups = [sources[i:i + _MAX_COMPOSE] for i in range(0, len(sources), _MAX_COMPOSE)]
+            sources = []
+            for i, group in enumerate(groups):
+                composed = bucket.blob(f'{prefix}l{level}-{i:05d}')
+                parts.append(composed)
+                composed.compose(group)
+                sources.append(composed)
+        blob.compose(sources)
+    finally:
+        for part in parts:
+            try:
+                part.delete()
+            except Exception:
+                pass
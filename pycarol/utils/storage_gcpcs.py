@@ -1,22 +1,99 @@
 import os
 import pickle
 import gzip
+import threading
+import time
 from .. import __TEMP_STORAGE__
 from collections import defaultdict
 from ..utils.miscellaneous import prettify_path, _attach_path, _FILE_MARKER
+from .blob_listing import ListingCache, list_blobs
+from .sliced_transfer import download_sliced, upload_composite, sliced_threshold, sliced_workers
 from retry import retry
 from google.resumable_media import DataCorruption
-from google.api_core.exceptions import GatewayTimeout, ServiceUnavailable
+from google.api_core.exceptions import GatewayTimeout, ServiceUnavailable, NotFound, PreconditionFailed
 from google.api_core.retry import Retry
 
 CDS_RETRY_LIST = (GatewayTimeout, DataCorruption, ServiceUnavailable)
+# downloads of a blob replaced while it is read, before giving up.
+_LOAD_ATTEMPTS = 3
+
+
+class BlobMetadataCache:
+    """Short lived cache of the size, generation and update time of blobs.
+
+    `load` and `exists` get the metadata of a blob in one request and keep it for `ttl` seconds, so a luigi target
+    checked with `exists` and then loaded does not ask for it again. `save` and `delete` drop the entry.
+
+    Args:
+        ttl: `float`, default `None`
+            Seconds the metadata is kept. If `None`, the `PYCAROL_BLOB_METADATA_TTL` environment variable or 10.
+
+    """
+
+    def __init__(self, ttl=None):
+        if ttl is None:
+            ttl = float(os.environ.get('PYCAROL_BLOB_METADATA_TTL', 10))
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, bucket, name):
+        """
+        Metadata of the blob, with `size`, `generation` and `updated`, or `None` if it does not exist.
+        """
+        key = (bucket.name, name)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+            return entry[1]
+
+        blob = bucket.get_blob(name)
+        if blob is None:
+            # not cached, the blob can be written by someone else right after.
+            return None
+        metadata = {'size': blob.size, 'generation': blob.generation, 'updated': blob.updated}
+        with self._lock:
+            self._entries[key] = (time.monotonic(), metadata)
+        return metadata
+
+    def invalidate(self, bucket_name, name):
+        with self._lock:
+            self._entries.pop((bucket_name, name), None)
+
+
+_metadata_cache = BlobMetadataCache()
+
+
+def _local_generation(local_file_name):
+    """Generation of the blob saved in `local_file_name`, or `None` if it is not known."""
+    try:
+        with open(local_file_name + '.generation', 'r') as file:
+            return int(file.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _file_path(storage_space, blob):
+    """File description returned by the `get_*_file_paths` methods."""
+    return {'storage_space': storage_space, 'name': blob.name, 'bucket': blob.bucket.name,
+            'generation': blob.generation, 'size': blob.size}
 
 
 class StorageGCPCS:
+    """
+    Carol storage in Google Cloud Storage.
+
+    Files from `sliced_threshold` bytes are uploaded and downloaded in slices of `sliced_workers` parallel requests,
+    see `pycarol.utils.sliced_transfer`. Both can be changed in the object, or with the `PYCAROL_SLICED_THRESHOLD`
+    and `PYCAROL_SLICED_WORKERS` environment variables.
+    """
+
     def __init__(self, carol, carolina):
         import pandas as pd
         self.carol = carol
         self.carolina = carolina
+        self.sliced_threshold = sliced_threshold()
+        self.sliced_workers = sliced_workers()
         os.makedirs(__TEMP_STORAGE__, exist_ok=True)
 
     def _get_app_storage_bucket(self, storage_space='app'):
@@ -87,6 +164,8 @@ class StorageGCPCS:
                     joblib.dump(obj, buffer)
                     buffer.seek(0)
                     blob.upload_from_file(buffer, retry=retry_policy)
+                ListingCache.default().invalidate(bucket.name, remote_file_name)
+                _metadata_cache.invalidate(bucket.name, remote_file_name)
                 return
             joblib.dump(obj, local_file_name)
         elif format == 'pickle':
@@ -97,8 +176,17 @@ class StorageGCPCS:
         else:
             raise ValueError("Supported formats are pickle, joblib or file")
 
-        blob.upload_from_filename(filename=local_file_name, retry=retry_policy, )
+        if os.path.getsize(local_file_name) >= self.sliced_threshold:
+            upload_composite(bucket, blob, local_file_name, workers=self.sliced_workers)
+        else:
+            blob.upload_from_filename(filename=local_file_name, retry=retry_policy, )
+        ListingCache.default().invalidate(bucket.name, remote_file_name)
+        _metadata_cache.invalidate(bucket.name, remote_file_name)
         os.utime(local_file_name, None)
+        if format != 'file' or parquet:
+            # the local copy is the blob just uploaded.
+            with open(local_file_name + '.generation', 'w') as file:
+                file.write(str(blob.generation))
 
     @retry(CDS_RETRY_LIST, tries=5)
     def load(self, name, format='pickle', parquet=False, cache=True, storage_space='app_storage', columns=None,
@@ -155,37 +243,53 @@ class StorageGCPCS:
         local_file_name = os.path.join(
             __TEMP_STORAGE__, remote_file_name.replace("/", "-"))
 
-        has_cache = cache and os.path.isfile(local_file_name)
-
-        if has_cache:
-            localts = os.stat(local_file_name).st_mtime
-        else:
-            localts = 0
-
         blob = bucket.blob(remote_file_name, chunk_size=chunk_size)
-        if not blob.exists():
-            return None
 
-        blob.reload()
-        remote_ts = blob.updated.timestamp()
-
-        if not cache and format == 'raw':
-            import joblib
+        if not cache and format in ('raw', 'joblib'):
+            # a single request, the download fails if the blob does not exist.
             from io import BytesIO
             buffer = BytesIO()
-            blob.download_to_file(buffer)
-            return buffer
-
-        elif not cache and format == 'joblib':
-            import joblib
-            from io import BytesIO
-            with BytesIO() as buffer:
+            try:
                 blob.download_to_file(buffer)
+            except NotFound:
+                return None
+            buffer.seek(0)
+            if format == 'raw':
+                return buffer
+            import joblib
+            with buffer:
                 return joblib.load(buffer)
 
-        # Local cache is outdated
-        if localts < remote_ts:
-            blob.download_to_filename(local_file_name)
+        for attempt in range(_LOAD_ATTEMPTS):
+            metadata = _metadata_cache.get(bucket, remote_file_name)
+            if metadata is None:
+                return None
+
+            has_cache = cache and os.path.isfile(local_file_name)
+            local_generation = _local_generation(local_file_name) if has_cache else None
+            if local_generation is not None:
+                outdated = local_generation != metadata['generation']
+            else:
+                outdated = not has_cache or os.stat(local_file_name).st_mtime < metadata['updated'].timestamp()
+
+            # Local cache is up to date
+            if not outdated:
+                break
+            try:
+                if metadata['size'] is not None and metadata['size'] >= self.sliced_threshold:
+                    download_sliced(blob, local_file_name, metadata['size'], generation=metadata['generation'],
+                                    workers=self.sliced_workers)
+                else:
+                    blob.download_to_filename(local_file_name, if_generation_match=metadata['generation'])
+            except (NotFound, PreconditionFailed):
+                # the blob changed after its metadata was cached.
+                _metadata_cache.invalidate(bucket.name, remote_file_name)
+                if attempt == _LOAD_ATTEMPTS - 1:
+                    raise
+                continue
+            with open(local_file_name + '.generation', 'w') as file:
+                file.write(str(metadata['generation']))
+            break
 
         if os.path.isfile(local_file_name):
             if parquet:
@@ -205,23 +309,84 @@ class StorageGCPCS:
         else:
             return None
 
+    def open(self, name, storage_space, chunk_size=None):
+        """
+        Open a file of a storage space for reading. Reads are ranged requests, so only the bytes read are
+        downloaded.
+
+        Args:
+            name: `str`
+                Full name of the blob, as given by the `get_*_file_paths` methods.
+            storage_space: `str`
+                Storage space of the file, e.g., `staging_cds`.
+            chunk_size: `int` default `None`
+                Minimum number of bytes of each request.
+
+        Returns: seekable file object.
+        """
+        bucket = self.carolina.get_client().bucket(self.carolina.get_bucket_name(storage_space))
+        return bucket.blob(name).open('rb', chunk_size=chunk_size)
+
+    def _list_files(self, listings):
+        """
+        Files of several prefixes, listed concurrently and yielded as they are listed.
+
+        Args:
+            listings: `list` of `tuple`
+                `(storage_space, prefix, start_offset)` to list.
+
+        Yields: `dict`
+            File description, as given by `_file_path`, in the order of `listings`.
+        """
+        cache = ListingCache.default()
+        client = self.carolina.get_client()
+        cached, to_list = [], []
+        for storage_space, prefix, start_offset in listings:
+            bucket_name = self.carolina.get_bucket_name(storage_space)
+            files = cache.get(bucket_name, prefix, start_offset)
+            cached.append(files)
+            if files is None:
+                to_list.append((client.bucket(bucket_name), prefix, start_offset))
+
+        listed = list_blobs(to_list)
+        # the next listed blob, the listing of all prefixes starts here.
+        pending = next(listed, None) if to_list else None
+        index = 0
+        for (storage_space, prefix, start_offset), files in zip(listings, cached):
+            if files is not None:
+                yield from files
+                continue
+
+            files = []
+            while pending is not None and pending[0] == index:
+                file = _file_path(storage_space, pending[1])
+                files.append(file)
+                yield file
+                pending = next(listed, None)
+            cache.put(self.carolina.get_bucket_name(storage_space), prefix, start_offset, files)
+            index += 1
+
     def exists(self, name, storage_space='app'):
         remote_file_name = f"{self.carolina.get_path(storage_space, {})}{name}"
 
-        blob = self._get_app_storage_bucket(storage_space=storage_space).blob(remote_file_name)
-        return blob.exists()
+        bucket = self._get_app_storage_bucket(storage_space=storage_space)
+        return _metadata_cache.get(bucket, remote_file_name) is not None
 
     def delete(self, name):
         remote_file_name = f"{self.carolina.get_path('app', {})}{name}"
 
-        blob = self._get_app_storage_bucket().blob(remote_file_name)
+        bucket = self._get_app_storage_bucket()
+        blob = bucket.blob(remote_file_name)
         if blob.exists():
             blob.delete()
+            ListingCache.default().invalidate(bucket.name, remote_file_name)
+        _metadata_cache.invalidate(bucket.name, remote_file_name)
 
         local_file_name = os.path.join(
             __TEMP_STORAGE__, remote_file_name.replace("/", "-"))
-        if os.path.isfile(local_file_name):
-            os.remove(local_file_name)
+        for file_name in (local_file_name, local_file_name + '.generation'):
+            if os.path.isfile(file_name):
+                os.remove(file_name)
 
     def build_url_parquet_golden(self, dm_name):
         path = self.carolina.get_path("golden", {'dm_name': dm_name})
@@ -298,99 +463,61 @@ class StorageGCPCS:
 
     # TODO All of these could be a single function.
     def get_golden_file_paths(self, dm_name):
-        bucket = self.carolina.get_client().bucket(
-            self.carolina.get_bucket_name('golden'))
         path = self.carolina.get_path('golden', {'dm_name': dm_name})
-        blobs = bucket.list_blobs(prefix=path, delimiter=None)
-        return ({'storage_space': 'golden', 'name': i.name} for i in blobs if i.name.endswith('.parquet'))
+        files = self._list_files([('golden', path, None)])
+        return (i for i in files if i['name'].endswith('.parquet'))
 
-    def get_golden_cds_file_paths(self, dm_name, file_pattern=None):
-        bucket = self.carolina.get_client().bucket(
-            self.carolina.get_bucket_name('golden_cds'))
+    def get_golden_cds_file_paths(self, dm_name, file_pattern=None, start_offset=None):
         path = self.carolina.get_path('golden_cds', {'dm_name': dm_name})
         if file_pattern is not None:
             path = path + file_pattern
 
-        blobs = bucket.list_blobs(prefix=path, delimiter=None)
-        return ({'storage_space': 'golden_cds', 'name': i.name} for i in blobs if i.name.endswith('.parquet'))
+        # files are named `YYYY-MM-DDTHH_mm_ss...`, so `start_offset` lists only the files written after it.
+        files = self._list_files([('golden_cds', path, start_offset)])
+        return (i for i in files if i['name'].endswith('.parquet'))
 
     def get_view_cds_file_paths(self, dm_name):
-        bucket = self.carolina.get_client().bucket(
-            self.carolina.get_bucket_name('view_cds'))
         path = self.carolina.get_path('view_cds', {'dm_name': dm_name})
-        blobs = bucket.list_blobs(prefix=path, delimiter=None)
-        return ({'storage_space': 'view_cds', 'name': i.name} for i in blobs if i.name.endswith('.parquet'))
+        files = self._list_files([('view_cds', path, None)])
+        return (i for i in files if i['name'].endswith('.parquet'))
 
     def get_view_file_paths(self, view_name):
-        bucket = self.carolina.get_client().bucket(
-            self.carolina.get_bucket_name('view'))
         path = self.carolina.get_path(
             'view', {'relationship_view_name': view_name})
-        blobs = bucket.list_blobs(prefix=path, delimiter=None)
-        return ({'storage_space': 'view', 'name': i.name} for i in blobs if i.name.endswith('.parquet'))
+        files = self._list_files([('view', path, None)])
+        return (i for i in files if i['name'].endswith('.parquet'))
 
-    def get_staging_cds_file_paths(self, staging_name, connector_id, file_pattern=None):
+    def get_staging_cds_file_paths(self, staging_name, connector_id, file_pattern=None, start_offset=None):
 
-        bucket = self.carolina.get_client().bucket(
-            self.carolina.get_bucket_name('staging_cds'))
         path = self.carolina.get_path(
             'staging_cds', {'connector_id': connector_id, 'staging_type': staging_name})
         if file_pattern is not None:
             path = path + file_pattern
 
-        blobs = bucket.list_blobs(prefix=path, delimiter=None)
-        return ({'storage_space': 'staging_cds', 'name': i.name} for i in blobs if i.name.endswith('.parquet'))
+        files = self._list_files([('staging_cds', path, start_offset)])
+        return (i for i in files if i['name'].endswith('.parquet'))
 
     def get_staging_file_paths(self, staging_name, connector_id):
-        bucket_staging = self.carolina.get_client().bucket(
-            self.carolina.get_bucket_name('staging'))
-        path_staging = self.carolina.get_path(
-            "staging", {'connector_id': connector_id, 'staging_type': staging_name})
-        blobs_staging = list(bucket_staging.list_blobs(prefix=path_staging))
-
-        bucket_master = self.carolina.get_client().bucket(
-            self.carolina.get_bucket_name('staging_master'))
-        path_master = self.carolina.get_path("staging_master",
-                                             {'connector_id': connector_id, 'staging_type': staging_name})
-        blobs_master = list(bucket_master.list_blobs(prefix=path_master))
-
-        bucket_rejected = self.carolina.get_client().bucket(
-            self.carolina.get_bucket_name('staging_rejected'))
-        path_rejected = self.carolina.get_path("staging_rejected",
-                                               {'connector_id': connector_id, 'staging_type': staging_name})
-        blobs_rejected = list(bucket_rejected.list_blobs(prefix=path_rejected))
-
-        bs = [{'storage_space': 'staging', 'name': i.name}
-              for i in blobs_staging if i.name.endswith('.parquet')]
-        bm = [{'storage_space': 'staging_master', 'name': i.name}
-              for i in blobs_master if i.name.endswith('.parquet')]
-        br = [{'storage_space': 'staging_rejected', 'name': i.name} for i in blobs_rejected if
-              i.name.endswith('.parquet')]
-
-        ball = bs + bm + br
-        return ball
+        params = {'connector_id': connector_id, 'staging_type': staging_name}
+        # the three storage spaces are listed concurrently.
+        files = self._list_files([(storage_space, self.carolina.get_path(storage_space, params), None)
+                                  for storage_space in ('staging', 'staging_master', 'staging_rejected')])
+        return [i for i in files if i['name'].endswith('.parquet')]
 
     def get_golden_rejected_cds_file_paths(self, dm_name, file_pattern=None):
-        bucket_rejected = self.carolina.get_client().bucket(
-            self.carolina.get_bucket_name('golden_rejected'))
         path_rejected = self.carolina.get_path(
             "golden_rejected", {'dm_name': dm_name, })
         if file_pattern is not None:
             path_rejected = path_rejected + file_pattern
 
-        blobs_rejected = list(bucket_rejected.list_blobs(prefix=path_rejected))
-
-        br = [{'storage_space': 'golden_rejected', 'name': i.name} for i in blobs_rejected if
-              i.name.endswith('.parquet')]
-        return br
+        files = self._list_files([('golden_rejected', path_rejected, None)])
+        return [i for i in files if i['name'].endswith('.parquet')]
 
     def files_storage_list(self, prefix='pipeline/', print_paths=False):
-        bucket_staging = self.carolina.get_client().bucket(
-            self.carolina.get_bucket_name('app'))
         path_app = self.carolina.get_path('app', {})
 
-        files = list(bucket_staging.list_blobs(prefix=path_app + prefix))
-        files = [i.name.split(path_app)[-1] for i in files]
+        files = self._list_files([('app', path_app + prefix, None)])
+        files = [i['name'].split(path_app)[-1] for i in files]
         if print_paths:
             main_dict = defaultdict(dict, ((_FILE_MARKER, []),))
             for line in files:
@@ -16,7 +16,7 @@ min_requires = [
     "google-cloud-bigquery>=2.26.0",
     "google-cloud-bigquery-storage",
     "google-cloud-core>=1.4.1",
-    "google-cloud-storage",
+    "google-cloud-storage>=1.42.0",
     "python-dotenv",
     "requests",
     "retry",
@@ -28,12 +28,14 @@ dataframe_requires = [
     "pandas>=0.23.4,!=1.0.4",
     "numpy>=1.16.3",
     "joblib>=0.11",
-    "pyarrow>=0.15.1,<1.0.0",
+    "pyarrow>=3.0.0",
 ]
 dev_requirements = [
     "black",
+    "dask[dataframe]",
     "flake8",
     "mypy",
+    "polars",
     "pydocstyle",
     "pylint",
     "pytest",
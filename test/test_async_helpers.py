@@ -0,0 +1,71 @@
+import asyncio
+import json
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from pycarol.utils import async_helpers
+
+
+def test_send_data_asynchronous_bounded_queue() -> None:
+    """Test send_data_asynchronous sending all batches with a bounded queue."""
+    sent = []
+    produced = []
+    lock = threading.Lock()
+
+    def call_api(url, data, **kwargs):
+        time.sleep(0.01)
+        with lock:
+            sent.extend(json.loads(data))
+
+    carol_mock = mock.MagicMock()
+    carol_mock.call_api.side_effect = call_api
+    data = [{"id": i} for i in range(100)]
+
+    real_stream_data = async_helpers.stream_data
+
+    def stream_data(**kwargs):
+        for batch in real_stream_data(**kwargs):
+            produced.append(len(sent))
+            yield batch
+
+    with mock.patch.object(async_helpers, "stream_data", stream_data), \
+            mock.patch.object(async_helpers, "_retry_session"):
+        stats = asyncio.run(async_helpers.send_data_asynchronous(
+            carol=carol_mock, data=data, step_size=5, url="url", extra_headers={},
+            content_type=None, max_workers=2, compress_gzip=False, queue_size=2,
+            print_stats=False,
+        ))
+
+    assert sorted(r["id"] for r in sent) == list(range(100))
+    assert stats.value == 100 and stats.in_flight == 0
+    # the producer can't be more than queue + senders batches ahead of the sent ones.
+    assert all(count >= 5 * (i - 5) for i, count in enumerate(produced))
+
+
+def test_send_data_asynchronous_closes_batches_on_error() -> None:
+    """Test send_data_asynchronous closing the batch generator when a send fails."""
+    closed = []
+
+    carol_mock = mock.MagicMock()
+    carol_mock.call_api.side_effect = RuntimeError("send failed")
+    real_stream_data = async_helpers.stream_data
+
+    def stream_data(**kwargs):
+        try:
+            yield from real_stream_data(**kwargs)
+        finally:
+            closed.append(True)
+
+    with mock.patch.object(async_helpers, "stream_data", stream_data), \
+            mock.patch.object(async_helpers, "_retry_session"):
+        with pytest.raises(RuntimeError, match="send failed"):
+            asyncio.run(async_helpers.send_data_asynchronous(
+                carol=carol_mock, data=[{"id": i} for i in range(1000)], step_size=5, url="url",
+                extra_headers={}, content_type=None, max_workers=2, compress_gzip=False, queue_size=2,
+                print_stats=False,
+            ))
+
+    assert closed == [True]
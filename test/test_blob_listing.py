@@ -0,0 +1,59 @@
+import time
+from types import SimpleNamespace
+
+from pycarol.utils.blob_listing import ListingCache, list_blobs
+
+
+class _FakeBucket:
+    def __init__(self, names):
+        self.names = sorted(names)
+        self.calls = 0
+
+    def list_blobs(self, prefix, start_offset, end_offset, max_results):
+        self.calls += 1
+        names = [n for n in self.names if n.startswith(prefix) and start_offset <= n < end_offset]
+        return [SimpleNamespace(name=n) for n in names[:max_results]]
+
+
+def test_list_blobs_ranges() -> None:
+    """Test list_blobs splitting the listings in ranges and yielding the blobs in order."""
+    dates = [f"cds/2021-{m:02d}-{d:02d}T{h:02d}.parquet" for m in range(1, 13) for d in range(1, 29) for h in range(24)]
+    bucket = _FakeBucket(dates + ["cds/é.parquet", "other/1.parquet"])
+    master = _FakeBucket([f"master/{i:05d}" for i in range(0, 3000, 7)])
+
+    listed = list(list_blobs([(bucket, "cds/", None), (master, "master/", None)], page_size=100))
+    assert [i for i, _ in listed] == [0] * (len(dates) + 1) + [1] * len(master.names)
+    assert [b.name for _, b in listed] == sorted(dates + ["cds/é.parquet"]) + master.names
+    assert bucket.calls > len(dates) // 100
+
+    listed = [b.name for _, b in list_blobs([(bucket, "cds/", "cds/2021-12")], page_size=100)]
+    assert listed == [n for n in sorted(dates + ["cds/é.parquet"]) if n >= "cds/2021-12"]
+
+
+def test_list_blobs_stop() -> None:
+    """Test list_blobs not listing more ranges after the consumer stops."""
+    bucket = _FakeBucket([f"cds/{i:06d}" for i in range(100000)])
+    listed = list_blobs([(bucket, "cds/", None)], workers=2, page_size=10)
+    next(listed)
+    listed.close()
+    time.sleep(0.1)
+    calls = bucket.calls
+    time.sleep(0.1)
+    assert bucket.calls == calls < 100
+
+
+def test_listing_cache() -> None:
+    """Test ListingCache keeping the listings and invalidating them on writes."""
+    cache = ListingCache(ttl=60)
+    cache.put("bucket", "cds/a/", None, [{"name": "cds/a/1.parquet"}])
+    cache.put("bucket", "cds/b/", None, [])
+    assert cache.get("bucket", "cds/a/") == [{"name": "cds/a/1.parquet"}]
+    assert cache.get("bucket", "cds/a/", "cds/a/1") is None
+
+    cache.invalidate("bucket", "cds/a/2.parquet")
+    assert cache.get("bucket", "cds/a/") is None
+    assert cache.get("bucket", "cds/b/") == []
+
+    disabled = ListingCache(ttl=0)
+    disabled.put("bucket", "cds/b/", None, [])
+    assert disabled.get("bucket", "cds/b/") is None
@@ -0,0 +1,42 @@
+import os
+import time
+
+from pycarol.utils.file_cache import FileCache
+
+
+def test_file_cache_lru(tmp_path) -> None:
+    """Test FileCache hits, misses and the eviction of the least recently used files."""
+    cache = FileCache(path=str(tmp_path), max_size=25)
+    keys = [cache.key("bucket", f"{i}.parquet", 1) for i in range(3)]
+    assert cache.key("bucket", "0.parquet", 2) != keys[0]
+
+    assert cache.get(keys[0]) is None
+    cache.put(keys[0], b"0" * 10)
+    cache.put(keys[1], b"1" * 10)
+    old = time.time() - 60
+    os.utime(os.path.join(str(tmp_path), keys[1]), (old, old))
+    cache.put(keys[2], b"2" * 10)
+
+    assert cache.get(keys[1]) is None
+    with open(cache.get(keys[0]), "rb") as file:
+        assert file.read() == b"0" * 10
+    assert cache.stats() == {"hits": 1, "misses": 2, "bytes_saved": 10, "size": 20}
+
+
+def test_file_cache_open_evicted(tmp_path) -> None:
+    """Test FileCache.open with files evicted before and after they are opened."""
+    cache = FileCache(path=str(tmp_path), max_size=15)
+    keys = [cache.key("bucket", f"{i}.parquet", 1) for i in range(3)]
+    cache.put(keys[0], b"0" * 10)
+
+    with cache.open(keys[0]) as file:
+        old = time.time() - 60
+        os.utime(os.path.join(str(tmp_path), keys[0]), (old, old))
+        cache.put(keys[1], b"1" * 10)
+        assert cache.open(keys[0]) is None
+        # the evicted file is still read.
+        assert file.read() == b"0" * 10
+
+    cache.put(keys[2], b"2" * 10)
+    assert cache._size == 10
+    assert cache.stats()["size"] == 10
@@ -0,0 +1,153 @@
+import io
+from unittest import mock
+
+import pandas as pd
+
+from pycarol.utils.importers import _import_pandas
+
+
+def _fake_storage(frames, row_group_size=None) -> mock.MagicMock:
+    files = {f"{i}.parquet": df for i, df in enumerate(frames)}
+
+    def load(name, **kwargs):
+        buffer = io.BytesIO()
+        files[name].to_parquet(buffer, index=False, row_group_size=row_group_size)
+        return buffer
+
+    storage = mock.MagicMock()
+    storage.get_staging_cds_file_paths.side_effect = lambda **kwargs: (
+        {"storage_space": "staging_cds", "name": name, "bucket": "b", "generation": 1} for name in files
+    )
+    storage.load.side_effect = load
+    storage.open.side_effect = load
+    return storage
+
+
+def test_import_pandas_threads() -> None:
+    """Test _import_pandas reading files in threads and concatenating them as Arrow tables."""
+    frames = [
+        pd.DataFrame({"mdmId": [f"{i}a", f"{i}b"], "mdmCounterForEntity": [i, i], "value_x": [i, i]})
+        for i in range(5)
+    ]
+    frames[3] = frames[3].drop(columns="value_x")
+    storage = _fake_storage(frames)
+
+    d = _import_pandas(storage, import_type="staging_cds", max_workers=3,
+                       mapping_columns={"value_x": "value-x"})
+    assert list(d.columns) == ["mdmCounterForEntity", "mdmId", "value-x"]
+    assert d["mdmId"].tolist() == [f"{i}{c}" for i in range(5) for c in "ab"]
+    assert d["value-x"].isna().sum() == 2
+
+
+def test_import_pandas_max_hits_callback() -> None:
+    """Test _import_pandas stopping at max_hits and calling the callback with DataFrames."""
+    frames = [pd.DataFrame({"mdmId": range(i * 3, i * 3 + 3)}) for i in range(4)]
+    storage = _fake_storage(frames)
+
+    d = _import_pandas(storage, import_type="staging_cds", max_workers=2, max_hits=5,
+                       callback=lambda df: df.assign(double=df["mdmId"] * 2))
+    assert d["double"].tolist() == [0, 2, 4, 6, 8]
+
+
+def test_import_pandas_max_hits_footers() -> None:
+    """Test _import_pandas downloading only the files and row groups with the first max_hits rows."""
+    frames = [pd.DataFrame({"mdmId": range(i * 10, i * 10 + 10)}) for i in range(6)]
+    storage = _fake_storage(frames, row_group_size=4)
+
+    d = _import_pandas(storage, import_type="staging_cds", max_workers=2, max_hits=13)
+    assert d["mdmId"].tolist() == list(range(13))
+    assert [c.args[0] for c in storage.load.call_args_list] == ["0.parquet"]
+    # the row group of the second file is read with a ranged request.
+    assert any(c.args[0] == "1.parquet" and "chunk_size" not in c.kwargs for c in storage.open.call_args_list)
+
+
+def test_import_pandas_merge_records() -> None:
+    """Test _import_pandas merging the records by mdmId while reading the files."""
+    frames = [
+        pd.DataFrame({"mdmId": ["a", "b"], "mdmCounterForEntity": [1, 2], "mdmDeleted": [False, False]}),
+        pd.DataFrame({"mdmId": ["a", "b"], "mdmCounterForEntity": [3, 4], "mdmDeleted": [False, True]}),
+    ]
+    d = _import_pandas(_fake_storage(frames), import_type="staging_cds", max_workers=2, merge_records=True)
+    assert d["mdmId"].tolist() == ["a"]
+    assert d["mdmCounterForEntity"].tolist() == [3]
+
+    table = _import_pandas(_fake_storage(frames), import_type="staging_cds", merge_records=True, to_pandas=False)
+    assert table.column("mdmCounterForEntity").to_pylist() == [3]
+
+
+def test_import_pandas_filters() -> None:
+    """Test _import_pandas pushing the filters down to the parquet reader."""
+    frames = [pd.DataFrame({"mdmId": [f"{i}a", f"{i}b"], "branch_id": [i, i + 1]}) for i in range(3)]
+    storage = _fake_storage(frames)
+
+    d = _import_pandas(storage, import_type="staging_cds", filters=[("branch-id", ">=", 2)])
+    assert d["mdmId"].tolist() == ["1b", "2a", "2b"]
+    storage.load.assert_not_called()
+
+
+def test_import_pandas_cache(tmp_path) -> None:
+    """Test _import_pandas downloading only the files not in the cache."""
+    from pycarol.utils.file_cache import FileCache
+
+    frames = [pd.DataFrame({"mdmId": [i]}) for i in range(3)]
+    storage = _fake_storage(frames)
+    cache = FileCache(path=str(tmp_path))
+
+    first = _import_pandas(storage, import_type="staging_cds", max_workers=2, cache=cache)
+    second = _import_pandas(storage, import_type="staging_cds", max_workers=2, cache=cache)
+    assert storage.load.call_count == 3
+    assert first.equals(second)
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 3
+
+
+def test_import_pandas_snapshot(tmp_path) -> None:
+    """Test _import_pandas merging only the new CDS files into a local snapshot."""
+    files = {
+        "2021-01-01T00_00_00-a.parquet": pd.DataFrame({"mdmId": ["a", "b"], "mdmCounterForEntity": [1, 2]}),
+        "2021-01-02T00_00_00-a.parquet": pd.DataFrame({"mdmId": ["a"], "mdmCounterForEntity": [3]}),
+    }
+
+    def list_files(start_offset=None, **kwargs):
+        return [{"storage_space": "staging_cds", "name": name} for name in sorted(files)
+                if start_offset is None or name >= start_offset]
+
+    def load(name, **kwargs):
+        buffer = io.BytesIO()
+        files[name].to_parquet(buffer, index=False)
+        return buffer
+
+    storage = mock.MagicMock()
+    storage.get_staging_cds_file_paths.side_effect = list_files
+    storage.load.side_effect = load
+    snapshot = str(tmp_path / "stg.parquet")
+
+    d = _import_pandas(storage, import_type="staging_cds", snapshot=snapshot)
+    assert d.sort_values("mdmId")["mdmCounterForEntity"].tolist() == [3, 2]
+
+    files["2021-01-03T00_00_00-a.parquet"] = pd.DataFrame({"mdmId": ["b", "c"], "mdmCounterForEntity": [4, 5]})
+    storage.load.reset_mock()
+    d = _import_pandas(storage, import_type="staging_cds", snapshot=snapshot)
+    assert storage.get_staging_cds_file_paths.call_args[1]["start_offset"] == "2021-01-02T00_00_00"
+    assert storage.load.call_count == 1
+    assert d.sort_values("mdmId")["mdmCounterForEntity"].tolist() == [3, 4, 5]
+
+    # written in the same second as the last file merged, with a name before it.
+    files["2021-01-03T00_00_00-0.parquet"] = pd.DataFrame({"mdmId": ["d"], "mdmCounterForEntity": [6]})
+    storage.load.reset_mock()
+    d = _import_pandas(storage, import_type="staging_cds", snapshot=snapshot)
+    assert [c[0][0] for c in storage.load.call_args_list] == ["2021-01-03T00_00_00-0.parquet"]
+    assert d.sort_values("mdmId")["mdmCounterForEntity"].tolist() == [3, 4, 5, 6]
+
+
+def test_import_pandas_iter() -> None:
+    """Test _import_pandas_iter yielding files and row groups."""
+    from pycarol.utils.importers import _import_pandas_iter
+
+    frames = [pd.DataFrame({"mdmId": range(i * 4, i * 4 + 4)}) for i in range(3)]
+
+    files = list(_import_pandas_iter(_fake_storage(frames), "staging_cds", prefetch=2))
+    assert [df["mdmId"].tolist() for df in files] == [f["mdmId"].tolist() for f in frames]
+
+    storage = _fake_storage(frames, row_group_size=3)
+    tables = list(_import_pandas_iter(storage, "staging_cds", by_row_group=True, to_pandas=False))
+    assert [t.num_rows for t in tables] == [3, 1] * 3
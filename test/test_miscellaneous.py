@@ -0,0 +1,252 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pycarol.utils.miscellaneous import stream_data
+
+
+def test_stream_data_batch_bytes() -> None:
+    """Test stream_data packing records up to a byte budget."""
+    data = [{"id": i, "text": "x" * 100} for i in range(50)]
+    batches = list(stream_data(data, step_size=500, compress_gzip=False, batch_bytes=1000))
+
+    assert batches[-1][1] == 50
+    assert all(len(batch) <= 1000 for batch, _ in batches)
+    assert [r for batch, _ in batches for r in json.loads(batch)] == data
+
+
+@pytest.mark.parametrize("compress_workers", [None, 4])
+def test_stream_data_batch_bytes_compressed(compress_workers) -> None:
+    """Test stream_data limiting the compressed size of DataFrame batches."""
+    df = pd.DataFrame({"id": range(2000), "text": ["abc" * 20] * 2000})
+    batches = list(
+        stream_data(df, step_size=500, compress_gzip=True, batch_bytes=4000,
+                    batch_bytes_compressed=True, compress_workers=compress_workers)
+    )
+
+    assert batches[-1][1] == 2000
+    assert all(len(payload) <= 4000 for payload, _ in batches)
+    records = [r for payload, _ in batches for r in json.loads(gzip.decompress(payload))]
+    assert [r["id"] for r in records] == list(range(2000))
+
+
+def test_stream_data_compress_workers() -> None:
+    """Test stream_data compressing batches in a thread pool, keeping the order."""
+    data = [{"id": i} for i in range(1000)]
+    batches = list(
+        stream_data(data, step_size=100, compress_gzip=True, compresslevel=1, compress_workers=4)
+    )
+
+    assert [cont for _, cont in batches] == list(range(100, 1001, 100))
+    records = [r for payload, _ in batches for r in json.loads(gzip.decompress(payload))]
+    assert records == data
+
+
+def test_stream_data_encodes_once() -> None:
+    """Test stream_data encoding NaN, NaT and numpy types straight to json bytes."""
+    df = pd.DataFrame({
+        "a": [1.5, np.nan],
+        "b": pd.to_datetime(["2020-01-01", None]),
+        "c": np.array([1, 2], dtype="int32"),
+    })
+    (payload, cont), = stream_data(df, step_size=10, compress_gzip=False)
+    assert isinstance(payload, bytes) and cont == 2
+    records = json.loads(payload)
+    assert records[1] == {"a": None, "b": None, "c": 2}
+
+    data = [{"a": np.float32(1.5), "b": pd.NaT, "c": np.int64(2), "d": np.bool_(True)}]
+    (payload, _), = stream_data(data, step_size=10, compress_gzip=False)
+    assert json.loads(payload) == [{"a": 1.5, "b": None, "c": 2, "d": True}]
+
+
+@pytest.mark.parametrize("batch_bytes", [None, 1000])
+def test_stream_data_nan_in_records(batch_bytes) -> None:
+    """Test stream_data writing NaN and infinities of lists of dicts as null."""
+    data = [{"a": float("nan"), "b": np.float64("inf"), "c": [np.nan, 1.0], "d": np.array([np.nan])}, {"a": 1.0}]
+    (payload, _), = stream_data(data, step_size=10, compress_gzip=False, batch_bytes=batch_bytes)
+
+    assert b"NaN" not in payload and b"Infinity" not in payload
+    assert json.loads(payload) == [{"a": None, "b": None, "c": [None, 1.0], "d": [None]}, {"a": 1.0}]
+
+
+def test_crosswalk_index() -> None:
+    """Test CrosswalkIndex checking and dropping duplicated crosswalks across chunks."""
+    from pycarol.utils.miscellaneous import CrosswalkIndex
+
+    index = CrosswalkIndex(['id'])
+    index.filter([{'id': 1}, {'id': 2}])
+    with pytest.raises(Exception, match='crosswalk is not unique'):
+        index.filter(pd.DataFrame({'id': [2, 3]}))
+
+    index = CrosswalkIndex(['id', 'branch'], drop_duplicates=True)
+    df = pd.DataFrame({'id': [1, 1, 2], 'branch': ['a', 'a', 'a'], 'v': [1, 2, 3]})
+    assert index.filter(df)['v'].tolist() == [2, 3]
+    chunks = list(index.filter_chunks([[{'id': 3, 'branch': 'a', 'v': 4}, {'id': 3, 'branch': 'a', 'v': 5}]]))
+    assert chunks == [[{'id': 3, 'branch': 'a', 'v': 5}]]
+    assert index.dropped == 2
+
+
+def test_crosswalk_index_dtypes_and_window() -> None:
+    """Test CrosswalkIndex matching crosswalks across dtypes and forgetting the oldest hashes."""
+    from pycarol.utils.miscellaneous import CrosswalkIndex
+
+    index = CrosswalkIndex(['id'])
+    index.filter(pd.DataFrame({'id': [1, 2]}))
+    for chunk in [pd.DataFrame({'id': [1.0, np.nan]}), [{'id': '2'}], pd.DataFrame({'id': ['x', 2.0]}, dtype=object)]:
+        with pytest.raises(Exception, match='crosswalk is not unique'):
+            index.filter(chunk)
+
+    index = CrosswalkIndex(['id'], max_seen=2)
+    for i in range(4):
+        index.filter([{'id': i}])
+    index.filter([{'id': 0}])
+    with pytest.raises(Exception, match='crosswalk is not unique'):
+        index.filter([{'id': 3}])
+    assert len(index._seen) == 2
+
+    # '01' is not the integer 1, 1.5 is the same as '1.5'.
+    index = CrosswalkIndex(['id'])
+    index.filter(pd.DataFrame({'id': [1.5, 1.0]}))
+    index.filter(pd.DataFrame({'id': ['01']}))
+    with pytest.raises(Exception, match='crosswalk is not unique'):
+        index.filter(pd.DataFrame({'id': ['1.5']}))
+
+    index = CrosswalkIndex(['id'], max_seen=0)
+    index.filter([{'id': 1}])
+    index.filter([{'id': 1}])
+    assert not index._seen
+
+
+def test_record_merger() -> None:
+    """Test RecordMerger keeping the last record of each mdmId across files."""
+    import pyarrow as pa
+    from pycarol.utils.miscellaneous import RecordMerger
+
+    frames = [
+        pd.DataFrame({'mdmId': ['a', 'b', 'c'], 'mdmCounterForEntity': [1, 2, 3], 'v': [1, 2, 3],
+                      'mdmDeleted': [None, None, None]}),
+        pd.DataFrame({'mdmId': ['a', 'c'], 'mdmCounterForEntity': [5, 6], 'v': [10, 30],
+                      'mdmDeleted': [False, True]}),
+        pd.DataFrame({'mdmId': ['a', 'd', 'd'], 'mdmCounterForEntity': [4, 7, 8], 'v': [-1, 4, 40],
+                      'mdmDeleted': [False, False, False]}),
+    ]
+    merger = RecordMerger(min_rows=2)
+    for df in frames:
+        merger.add(pa.Table.from_pandas(df, preserve_index=False))
+    result = merger.result().to_pandas()
+
+    assert result['mdmId'].tolist() == ['b', 'a', 'd']
+    assert result['v'].tolist() == [2, 10, 40]
+
+
+@pytest.mark.parametrize("untie_field", ["mdmCounterForEntity", "mdmStagingCounter"])
+def test_record_merger_against_pandas(untie_field) -> None:
+    """Test RecordMerger merging the files as the pandas merge of all of them, ties won by the last file."""
+    import pyarrow as pa
+    from pycarol.utils.miscellaneous import RecordMerger, drop_duplicated_parquet
+
+    d = _records_to_merge()
+    merger = RecordMerger(untie_field=untie_field, min_rows=3)
+    for i in range(0, 12, 3):
+        merger.add(pa.Table.from_pandas(d.iloc[i:i + 3], preserve_index=False))
+    result = merger.result().to_pandas()
+
+    expected = drop_duplicated_parquet(d, untie_field=untie_field)
+    assert sorted(result["mdmId"]) == sorted(expected["mdmId"])
+    assert result[untie_field].is_monotonic_increasing
+    if untie_field == "mdmStagingCounter":
+        assert sorted(result["v"]) == [4, 6, 7, 9, 10]
+
+
+def _records_to_merge() -> pd.DataFrame:
+    # unsorted, with ties in the untie fields and a deleted record.
+    return pd.DataFrame({
+        "mdmStagingCounter": [3, 1, 2, 2, 5, 4, 5, 0, 7, 7, 6, 1],
+        "mdmCounterForEntity": range(12),
+        "mdmId": ["a", "b", "a", "c", "b", "d", "a", "e", "c", "c", "d", "f"],
+        "mdmDeleted": [False] * 11 + [True],
+        "v": range(12),
+    })
+
+
+@pytest.mark.parametrize("untie_field", ["mdmCounterForEntity", "mdmStagingCounter"])
+def test_drop_duplicated_parquet_dask(untie_field) -> None:
+    """Test merging a dask DataFrame with a shuffle by mdmId against the pandas merge."""
+    dd = pytest.importorskip("dask.dataframe")
+    from pycarol.utils.miscellaneous import drop_duplicated_parquet, drop_duplicated_parquet_dask
+
+    d = _records_to_merge()
+    expected = drop_duplicated_parquet(d, untie_field=untie_field)
+    for ddf in [dd.from_pandas(d, npartitions=4), dd.from_pandas(d.set_index(untie_field), npartitions=3)]:
+        merged = drop_duplicated_parquet_dask(ddf, untie_field=untie_field, npartitions=2).compute()
+        assert sorted(merged["mdmId"]) == sorted(expected["mdmId"])
+        assert "_partition" not in merged.columns
+    # ties are won by the record that comes last.
+    merged = drop_duplicated_parquet_dask(dd.from_pandas(d, npartitions=4), untie_field="mdmStagingCounter")
+    assert sorted(merged["v"].compute()) == [4, 6, 7, 9, 10]
+
+
+def test_drop_duplicated_parquet_dask_partitions() -> None:
+    """Test the per partition steps of drop_duplicated_parquet_dask with pandas."""
+    from pycarol.utils.miscellaneous import _keep_last_versions, _tag_positions
+
+    d = _records_to_merge()
+    partitions = [_tag_positions(d.iloc[i:i + 3], {"number": i // 3}) for i in range(0, 12, 3)]
+    # a shuffle by mdmId, that does not keep the order of the records.
+    shuffled = pd.concat(partitions).sample(frac=1, random_state=1)
+    merged = pd.concat([_keep_last_versions(part, "mdmStagingCounter")
+                        for _, part in shuffled.groupby(shuffled["mdmId"].isin(["a", "c"]))])
+    assert sorted(merged["v"]) == [4, 6, 7, 9, 10, 11]
+    assert list(merged.columns) == list(d.columns)
+
+
+def test_drop_duplicated_parquet_polars() -> None:
+    """Test merging the records of a polars DataFrame by mdmId."""
+    pl = pytest.importorskip("polars")
+    from pycarol.utils.miscellaneous import drop_duplicated_parquet, drop_duplicated_parquet_polars
+
+    d = pl.DataFrame({
+        "mdmId": ["a", "b", "a", "b", "c"],
+        "mdmCounterForEntity": [3, 2, 1, 4, 5],
+        "mdmDeleted": [False, False, False, True, None],
+    })
+    merged = drop_duplicated_parquet_polars(d)
+    assert merged.sort("mdmId")["mdmCounterForEntity"].to_list() == [3, 5]
+    assert isinstance(drop_duplicated_parquet_polars(d.lazy()), pl.LazyFrame)
+
+    records = _records_to_merge()
+    for untie_field in ["mdmCounterForEntity", "mdmStagingCounter"]:
+        expected = drop_duplicated_parquet(records, untie_field=untie_field)
+        merged = drop_duplicated_parquet_polars(pl.from_pandas(records).lazy(), untie_field=untie_field).collect()
+        assert sorted(merged["mdmId"].to_list()) == sorted(expected["mdmId"])
+    # ties are won by the record that comes last.
+    assert sorted(merged["v"].to_list()) == [4, 6, 7, 9, 10]
+
+
+def test_compact_frame() -> None:
+    """Test compact_frame picking categoricals, downcasting numbers and keeping nested fields."""
+    from pycarol.utils.miscellaneous import compact_frame
+
+    n = 1000
+    d = pd.DataFrame({
+        "branch": pd.Series(["north", "south"] * (n // 2), dtype=object),
+        "id": pd.Series([f"id-{i}" for i in range(n)], dtype=object),
+        "quantity": np.arange(n, dtype="int64"),
+        "price": np.linspace(0, 1, n),
+        "code": pd.Series(["7"] * n, dtype=object),
+        "nested": [{"a": 1}] * n,
+    })
+    c = compact_frame(d, types={"code": int, "price": float})
+
+    assert isinstance(c["branch"].dtype, pd.CategoricalDtype)
+    assert c["id"].dtype == "string[pyarrow]"
+    assert c["quantity"].dtype == np.int16
+    assert (c["quantity"] - c["quantity"][::-1].values).tolist() == list(range(1 - n, n, 2))
+    assert c["price"].dtype == np.float64
+    assert c["code"].tolist() == [7] * n
+    assert c["nested"].dtype == object
+    assert c.attrs["memory_usage"]["after"] < c.attrs["memory_usage"]["before"]
+    pd.testing.assert_frame_equal(c.astype(object), d.astype({"code": "int64"}).astype(object), check_dtype=False)
@@ -0,0 +1,227 @@
+from unittest import mock
+
+import pytest
+
+import pycarol
+from pycarol.filter import DATE_HISTOGRAM, STATS, TERMS, Filter
+
+
+def _aggs_query() -> dict:
+    return (
+        Filter.Builder()
+        .type("invoiceGolden")
+        .aggregation(
+            TERMS(
+                name="branch",
+                params=["mdmGoldenFieldAndValues.branch.raw"],
+                sub_aggregations=[
+                    STATS(name="total", params=["mdmGoldenFieldAndValues.total"])
+                ],
+            )
+        )
+        .build()
+        .to_json()
+    )
+
+
+def test_aggs_to_frame_fetch() -> None:
+    """Test Query.aggs_to_frame() flattening a bucket aggregation with metrics."""
+    carol_mock = mock.MagicMock()
+    carol_mock.call_api.return_value = {
+        "totalHits": 3,
+        "aggs": {
+            "branch": {
+                "buckets": [
+                    {"key": "a", "docCount": 2, "total": {"min": 1, "max": 3}},
+                    {"key": "b", "docCount": 1, "total": {"min": 5, "max": 5}},
+                ]
+            }
+        },
+    }
+    df = pycarol.Query(carol_mock).query(_aggs_query()).aggs_to_frame()
+
+    assert carol_mock.call_api.call_args[1]["params"]["pageSize"] == 0
+    assert list(df.columns) == ["branch", "branch_doc_count", "total_min", "total_max"]
+    assert df["branch"].tolist() == ["a", "b"]
+    assert df["total_max"].tolist() == [3, 5]
+
+
+def test_aggs_to_frame_siblings() -> None:
+    """Test Query.aggs_to_frame() stacking sibling bucket aggregations in long format."""
+    query = pycarol.Query(mock.MagicMock()).query(_aggs_query())
+    query.results = [
+        {
+            "aggs": {
+                "branch": {"buckets": [{"key": "a", "docCount": 2}, {"key": "b", "docCount": 1}]},
+                "status": {
+                    "buckets": [
+                        {"key": "ok", "docCount": 3, "year": {"buckets": [{"key": 2020, "docCount": 3}]}}
+                    ]
+                },
+                "total": {"value": 9},
+            }
+        }
+    ]
+    df = query.aggs_to_frame(fetch=False)
+
+    assert len(df) == 3
+    assert df["agg_name"].tolist() == ["branch", "branch", "status"]
+    assert df["key"].tolist() == ["a", "b", "ok"]
+    assert df["doc_count"].tolist() == [2, 1, 3]
+    assert df["year"].tolist()[2] == 2020
+    assert df["total"].tolist() == [9, 9, 9]
+
+
+def test_aggs_to_frame_date_histogram() -> None:
+    """Test Query.aggs_to_frame() with keyed buckets and date conversion."""
+    json_query = (
+        Filter.Builder()
+        .aggregation(DATE_HISTOGRAM(name="day", params=["mdmLastUpdated", "1d"]))
+        .build()
+        .to_json()
+    )
+    query = pycarol.Query(mock.MagicMock()).query(json_query)
+    query.results = [
+        {"aggs": {"day": {"buckets": {0: {"docCount": 4}, 86400000: {"docCount": 1}}}}}
+    ]
+    df = query.aggs_to_frame(fetch=False)
+    assert str(df["day"].iloc[1].date()) == "1970-01-02"
+    assert df["day_doc_count"].tolist() == [4, 1]
+
+    table = query.aggs_to_frame(fetch=False, backend="arrow")
+    assert table.num_rows == 2
+
+
+def test_go_offset_pages() -> None:
+    """Test Query.go() fetching the offset pages of a non scrollable query."""
+
+    def call_api(url, params, **kwargs):
+        offset = params["offset"]
+        hits = [
+            {"mdmGoldenFieldAndValues": {"i": i}}
+            for i in range(offset, min(offset + params["pageSize"], 25))
+        ]
+        return {"totalHits": 25, "count": len(hits), "hits": hits}
+
+    carol_mock = mock.MagicMock()
+    carol_mock.call_api.side_effect = call_api
+    query = pycarol.Query(
+        carol_mock, scrollable=False, page_size=10, print_status=False
+    )
+    query.query(Filter.Builder().type("invoiceGolden").build().to_json()).go()
+
+    offsets = sorted(c[1]["params"]["offset"] for c in carol_mock.call_api.call_args_list)
+    assert offsets == [0, 10, 20]
+    assert [r["i"] for r in query.results] == list(range(25))
+
+
+def test_go_offset_pages_result_window() -> None:
+    """Test Query.go() keeping the last offset page inside the result window, one session per thread."""
+
+    def call_api(url, params, **kwargs):
+        assert params["offset"] + params["pageSize"] <= 10000
+        count = params["pageSize"]
+        return {"totalHits": 25000, "count": count, "hits": [{"mdmGoldenFieldAndValues": {"i": 0}}] * count}
+
+    carol_mock = mock.MagicMock()
+    carol_mock.call_api.side_effect = call_api
+    query = pycarol.Query(
+        carol_mock, scrollable=False, page_size=3000, print_status=False, max_workers=2
+    )
+    with pytest.warns(UserWarning, match="scroll"):
+        query.query(Filter.Builder().type("invoiceGolden").build().to_json()).go()
+
+    calls = sorted((c[1]["params"]["offset"], c[1]["params"]["pageSize"])
+                   for c in carol_mock.call_api.call_args_list)
+    assert calls == [(0, 3000), (3000, 3000), (6000, 3000), (9000, 1000)]
+    assert len(query.results) == 10000
+    sessions = {id(c[1]["session"]) for c in carol_mock.call_api.call_args_list if "session" in c[1]}
+    assert 1 <= len(sessions) <= 2
+
+
+def test_to_frame() -> None:
+    """Test Query.to_frame() converting the hits to pandas and arrow."""
+    query = pycarol.Query(mock.MagicMock())
+    query.results = [{"i": 1, "name": "a"}, {"i": 2}]
+
+    assert query.to_frame()["i"].tolist() == [1, 2]
+    table = query.to_frame(backend="arrow")
+    assert table.column_names == ["i", "name"]
+    assert table.column("name").to_pylist() == ["a", None]
+
+
+def test_to_frame_compact() -> None:
+    """Test Query.to_frame(compact=True) using the field types of the data model."""
+    carol_mock = mock.MagicMock()
+    carol_mock.call_api.return_value = {
+        "mdmName": "invoice",
+        "mdmFields": [
+            {"mdmName": "code", "mdmMappingDataType": "LONG"},
+            {"mdmName": "total", "mdmMappingDataType": "DOUBLE"},
+        ],
+    }
+    query = pycarol.Query(carol_mock).all("invoice")
+    query.results = [{"code": "7", "total": 1}, {"code": "9", "total": 2}]
+
+    df = query.to_frame(compact=True)
+    assert carol_mock.call_api.call_args[0][0] == "v1/entities/templates/name/invoice"
+    assert df["code"].tolist() == [7, 9]
+    assert df["code"].dtype == "int8"
+    assert (df["code"] - df["code"][::-1].values).tolist() == [-2, 2]
+
+
+def test_sample() -> None:
+    """Test Query.sample() drawing records from random counter slices."""
+
+    def call_api(url, data, params, **kwargs):
+        if params["pageSize"] == 0:
+            return {
+                "totalHits": 1000,
+                "aggs": {"MINIMUM": {"value": 1.0}, "MAXIMUM": {"value": 1000.0}},
+            }
+        start, end = data["mustList"][-1]["mdmValue"]
+        slices.append((start, end))
+        sessions.add(kwargs["session"])
+        hits = [
+            {"mdmGoldenFieldAndValues": {"i": i}} for i in range(start, min(end, 1000) + 1)
+        ]
+        return {"totalHits": len(hits), "count": len(hits), "hits": hits}
+
+    slices, sessions = [], set()
+    carol_mock = mock.MagicMock()
+    carol_mock.call_api.side_effect = call_api
+    query = pycarol.Query(carol_mock, page_size=50, max_workers=4, print_status=False)
+    results = query.all("invoice").sample(120, seed=1).results
+    assert len(results) == 120
+    assert len({r["i"] for r in results}) == 120
+    # many small slices, not a few contiguous pages, each thread with its session.
+    assert len(slices) == 120 and all(start == end for start, end in slices)
+    assert 1 <= len(sessions) <= 4
+
+    again = pycarol.Query(carol_mock, page_size=50, print_status=False)
+    assert again.all("invoice").sample(120, seed=1).results == results
+
+
+def test_sample_dense_slice() -> None:
+    """Test Query.sample() paginating the slices with more records than a page."""
+    values = list(range(1, 101)) + [500] * 200
+
+    def call_api(url, data, params, **kwargs):
+        if params["pageSize"] == 0:
+            return {
+                "totalHits": len(values),
+                "aggs": {"MINIMUM": {"value": 1.0}, "MAXIMUM": {"value": 500.0}},
+            }
+        start, end = data["mustList"][-1]["mdmValue"]
+        matches = [
+            {"mdmGoldenFieldAndValues": {"i": i, "v": v}}
+            for i, v in enumerate(values) if start <= v <= end
+        ]
+        hits = matches[params["offset"]:params["offset"] + params["pageSize"]]
+        return {"totalHits": len(matches), "count": len(hits), "hits": hits}
+
+    carol_mock = mock.MagicMock()
+    carol_mock.call_api.side_effect = call_api
+    query = pycarol.Query(carol_mock, page_size=50, print_status=False)
+    results = query.all("invoice").sample(len(values), seed=1).results
+    assert sorted(r["i"] for r in results) == list(range(len(values)))
@@ -42,6 +42,24 @@ class SchemaTestCase(unittest.TestCase):
         self.assertTrue('id' in schema['mdmStagingMapping']['properties'])
         self.assertTrue('id' in schema['mdmStagingMapping']['properties']['user']['properties'])
 
+    def test_from_data(self):
+        import pandas as pd
+
+        df = pd.DataFrame({'id': [1, 2], 'value': [None, 1.5], 'name': [None, 'a'],
+                           'user': [{'id': 1}, {'name': 'b', 'tags': ['x']}]})
+        schema = carolSchemaGenerator.from_data(df).to_dict(mdmStagingType='stg', crosswalkList=['id'])
+        properties = schema['mdmStagingMapping']['properties']
+
+        self.assertEqual('integer', properties['id']['type'])
+        self.assertEqual('double', properties['value']['type'])
+        self.assertEqual('string', properties['name']['type'])
+        self.assertEqual({'id', 'name', 'tags'}, set(properties['user']['properties']))
+
+        records = df.to_dict('records')
+        from_records = carolSchemaGenerator.from_data(records, sample_size=1)
+        self.assertNotIn('properties', from_records.properties['value'])
+        self.assertEqual({'id'}, set(from_records.properties['user']['properties']))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from pycarol.utils import sliced_transfer
+
+
+class _FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.generation = None
+
+    def upload_from_string(self, data, if_generation_match=None, retry=None):
+        assert if_generation_match == 0 and retry is not None
+        if self.name.endswith(self.bucket.fail_suffix):
+            # the part is written, but the request fails.
+            self.bucket.objects[self.name] = b""
+            raise ConnectionError("upload failed")
+        self.bucket.objects[self.name] = bytes(data)
+
+    def compose(self, sources):
+        self.bucket.objects[self.name] = b"".join(self.bucket.objects[s.name] for s in sources)
+        self.generation = len(self.bucket.objects)
+
+    def download_as_bytes(self, start, end, if_generation_match=None):
+        return self.bucket.objects[self.name][start:end + 1]
+
+    def delete(self):
+        del self.bucket.objects[self.name]
+
+
+class _FakeBucket:
+    def __init__(self, fail_suffix=None):
+        self.objects = {}
+        self.fail_suffix = fail_suffix or "<none>"
+
+    def blob(self, name):
+        return _FakeBlob(self, name)
+
+
+def test_sliced_upload_download(tmp_path, monkeypatch) -> None:
+    """Test a composite upload, composed in a tree, and a sliced download of the same file."""
+    monkeypatch.setattr(sliced_transfer, "_MIN_SLICE_SIZE", 100)
+    monkeypatch.setattr(sliced_transfer, "_MAX_SLICE_SIZE", 100)
+    monkeypatch.setattr(sliced_transfer, "_MAX_COMPOSE", 3)
+    data = os.urandom(1234)
+    source = tmp_path / "model.bin"
+    source.write_bytes(data)
+
+    bucket = _FakeBucket()
+    blob = bucket.blob("app/model.bin")
+    sliced_transfer.upload_composite(bucket, blob, str(source), workers=4)
+    assert list(bucket.objects) == ["app/model.bin"]
+    assert bucket.objects["app/model.bin"] == data
+
+    target = tmp_path / "copy.bin"
+    sliced_transfer.download_sliced(blob, str(target), len(data), workers=4)
+    assert target.read_bytes() == data
+    assert sorted(os.listdir(tmp_path)) == ["copy.bin", "model.bin"]
+
+
+def test_composite_upload_failed_part(tmp_path, monkeypatch) -> None:
+    """Test a composite upload deleting all its parts, including the failed one, when a part upload fails."""
+    monkeypatch.setattr(sliced_transfer, "_MIN_SLICE_SIZE", 100)
+    monkeypatch.setattr(sliced_transfer, "_MAX_SLICE_SIZE", 100)
+    source = tmp_path / "model.bin"
+    source.write_bytes(os.urandom(1234))
+
+    bucket = _FakeBucket(fail_suffix="-00003")
+    with pytest.raises(ConnectionError):
+        sliced_transfer.upload_composite(bucket, bucket.blob("app/model.bin"), str(source), workers=4)
+    assert bucket.objects == {}
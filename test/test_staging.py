@@ -0,0 +1,119 @@
+import gzip
+import json
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+import pycarol
+
+
+def test_send_data_raw_json_body() -> None:
+    """Test Staging.send_data sending each batch as a json encoded body."""
+    carol_mock = mock.MagicMock()
+    df = pd.DataFrame({"id": range(5), "value": [0.5] * 5})
+    pycarol.Staging(carol_mock).send_data(
+        "stg", data=df, connector_id="c1", gzip=False, force=True, step_size=2,
+        print_stats=False,
+    )
+
+    calls = carol_mock.call_api.call_args_list
+    assert len(calls) == 3
+    assert calls[0][1]["content_type"] is None
+    assert calls[0][1]["extra_headers"] == {"content-type": "application/json"}
+    assert json.loads(calls[2][1]["data"]) == [{"id": 4, "value": 0.5}]
+
+
+def test_send_data_journal_resume(tmp_path) -> None:
+    """Test Staging.send_data skipping acknowledged batches and replaying dead letters."""
+    journal = str(tmp_path / "stg.journal")
+    df = pd.DataFrame({"id": range(6)})
+    kwargs = dict(
+        connector_id="c1", gzip=True, force=True, step_size=2, print_stats=False,
+        journal=journal,
+    )
+
+    failing = mock.MagicMock()
+    failing.call_api.side_effect = [None, RuntimeError("boom"), None]
+    with pytest.warns(UserWarning, match="2 records could not be sent"):
+        pycarol.Staging(failing).send_data("stg", data=df, **kwargs)
+
+    carol_mock = mock.MagicMock()
+    pycarol.Staging(carol_mock).send_data("stg", data=df, **kwargs)
+    assert carol_mock.call_api.call_count == 1
+    sent = gzip.decompress(carol_mock.call_api.call_args[1]["data"])
+    assert json.loads(sent) == [{"id": 2}, {"id": 3}]
+
+    replayed = pycarol.Staging(carol_mock).replay_dead_letters(journal)
+    assert carol_mock.call_api.call_count == 1
+    assert replayed.failed == 0
+
+
+@pytest.mark.parametrize("source", ["generator", "reader", "csv", "parquet"])
+def test_send_data_streaming_sources(tmp_path, source) -> None:
+    """Test Staging.send_data reading iterables, record batch readers and files in chunks."""
+    import pyarrow as pa
+
+    df = pd.DataFrame({"id": range(5), "name": list("abcde")})
+    if source == "generator":
+        data = ({"id": i, "name": n} for i, n in zip(df["id"], df["name"]))
+    elif source == "reader":
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        data = pa.RecordBatchReader.from_batches(table.schema, table.to_batches(max_chunksize=3))
+    elif source == "csv":
+        data = str(tmp_path / "data.csv")
+        df.to_csv(data, index=False)
+    else:
+        data = str(tmp_path / "data.parquet")
+        df.to_parquet(data, index=False)
+
+    carol_mock = mock.MagicMock()
+    pycarol.Staging(carol_mock).send_data(
+        "stg", data=data, connector_id="c1", gzip=False, force=True, step_size=2, print_stats=False,
+    )
+
+    sent = [json.loads(c[1]["data"]) for c in carol_mock.call_api.call_args_list]
+    assert [r["id"] for batch in sent for r in batch] == list(range(5))
+    assert max(len(batch) for batch in sent) == 2
+
+
+def test_send_data_cds_parquet(tmp_path) -> None:
+    """Test Staging.send_data writing parquet files in the staging intake."""
+    saved = {}
+
+    def save(name, obj, **kwargs):
+        assert kwargs["storage_space"] == "staging_cds"
+        assert kwargs["storage_space_params"] == {"connector_id": "c1", "staging_type": "stg"}
+        saved[name] = pd.read_parquet(obj)
+
+    carol_mock = mock.MagicMock()
+    df = pd.DataFrame({"id": range(5)})
+    with mock.patch("pycarol.staging.Storage") as storage_mock, \
+            mock.patch("pycarol.cds.CDSStaging.process_data") as process_mock:
+        storage_mock.return_value.save.side_effect = save
+        pycarol.Staging(carol_mock).send_data(
+            "stg", data=df, connector_id="c1", force=True, mode="cds_parquet",
+            file_rows=2, print_stats=False, process_cds=True,
+        )
+
+    carol_mock.call_api.assert_not_called()
+    names = sorted(saved)
+    assert len(names) == 3 and all(n.endswith(".parquet") for n in names)
+    assert pd.concat([saved[n] for n in names])["id"].tolist() == list(range(5))
+    pattern = process_mock.call_args[1]["file_pattern"]
+    assert names[0].startswith(pattern[:-1])
+
+
+def test_send_data_drop_duplicates() -> None:
+    """Test Staging.send_data dropping duplicated crosswalks of a list of dicts."""
+    carol_mock = mock.MagicMock()
+    data = [{"id": 1, "v": 1}, {"id": 2, "v": 2}, {"id": 1, "v": 3}]
+    with mock.patch.object(pycarol.Staging, "get_schema") as get_schema:
+        get_schema.return_value = {"mdmCrosswalkTemplate": {"mdmCrossreference": {"stg": ["id"]}}}
+        staging = pycarol.Staging(carol_mock)
+        with pytest.raises(Exception, match="crosswalk is not unique"):
+            staging.send_data("stg", data=data, connector_id="c1", print_stats=False)
+        staging.send_data("stg", data=data, connector_id="c1", gzip=False, print_stats=False,
+                          drop_duplicates=True)
+
+    assert json.loads(carol_mock.call_api.call_args[1]["data"]) == [{"id": 2, "v": 2}, {"id": 1, "v": 3}]
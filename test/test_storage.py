@@ -78,5 +78,79 @@ def test_save_other():
     raise Exception("Saving with unexistant format should raise exception.")
 
 
+def test_load_blob_metadata_cache() -> None:
+    """Test StorageGCPCS.load getting the blob metadata once and downloading only new generations."""
+    import datetime
+    import gzip
+    import pickle
+    import uuid
+    from unittest import mock
+
+    from pycarol.utils.storage_gcpcs import StorageGCPCS
+
+    generation = {"value": 1}
+
+    def download_to_filename(file_name, if_generation_match=None):
+        assert if_generation_match == generation["value"]
+        with gzip.open(file_name, "wb") as file:
+            pickle.dump(generation["value"], file)
+
+    bucket = mock.MagicMock()
+    bucket.name = "bucket"
+    bucket.get_blob.side_effect = lambda name: mock.MagicMock(
+        size=1, generation=generation["value"], updated=datetime.datetime.now(datetime.timezone.utc)
+    )
+    bucket.blob.return_value.download_to_filename.side_effect = download_to_filename
+    carolina = mock.MagicMock()
+    carolina.get_client.return_value.bucket.return_value = bucket
+    carolina.get_path.return_value = f"tests/{uuid.uuid4().hex}/"
+    storage = StorageGCPCS(mock.MagicMock(), carolina)
+
+    assert storage.exists("model.pkl")
+    assert storage.load("model.pkl") == 1
+    assert storage.load("model.pkl") == 1
+    assert bucket.get_blob.call_count == 1
+    assert bucket.blob.return_value.download_to_filename.call_count == 1
+
+    # the local copy of a saved file is used, it has the generation uploaded.
+    generation["value"] = 2
+    bucket.blob.return_value.generation = 2
+    storage.save("model.pkl", 2)
+    assert storage.load("model.pkl") == 2
+    assert bucket.get_blob.call_count == 2
+    assert bucket.blob.return_value.download_to_filename.call_count == 1
+
+
+def test_load_replaced_blob() -> None:
+    """Test StorageGCPCS.load giving up on a blob replaced on every download, and not caching missing blobs."""
+    import datetime
+    import uuid
+    from unittest import mock
+
+    import pytest
+    from google.api_core.exceptions import PreconditionFailed
+
+    from pycarol.utils.storage_gcpcs import StorageGCPCS
+
+    bucket = mock.MagicMock()
+    bucket.name = "bucket"
+    bucket.get_blob.return_value = None
+    bucket.blob.return_value.download_to_filename.side_effect = PreconditionFailed("replaced")
+    carolina = mock.MagicMock()
+    carolina.get_client.return_value.bucket.return_value = bucket
+    carolina.get_path.return_value = f"tests/{uuid.uuid4().hex}/"
+    storage = StorageGCPCS(mock.MagicMock(), carolina)
+
+    assert not storage.exists("model.pkl")
+    bucket.get_blob.return_value = mock.MagicMock(
+        size=1, generation=1, updated=datetime.datetime.now(datetime.timezone.utc)
+    )
+    assert storage.exists("model.pkl")
+
+    with pytest.raises(PreconditionFailed):
+        storage.load("model.pkl")
+    assert bucket.blob.return_value.download_to_filename.call_count == 3
+
+
 if __name__ == "__main__":
     test_save_parquet()